@@ -16,6 +16,8 @@ from nlp.speech_recognizer import transcribe_audio
 from nlp.instruction_parser import chat_with_deepseek
 from control.carla_controller import run_autonomous_navigation, setup_environment, cleanup_actors
 from nlp.instruction_parser import alias_map, normalize_place_name
+from nlp.parse_cascade import get_cascade, parse_instruction
+from nlp.instruction_parser import preconnect_llm
 from utils.connect_to_carla import connect_to_carla
 from utils.landmark_location import define_landmarks
 
@@ -25,13 +27,26 @@ from PyQt5.QtCore import Qt
 from agents.navigation.global_route_planner import GlobalRoutePlanner
 
 from nlp.instruction_parser import normalize_place_name,chat_with_deepseek,speak
-from nlp.speech_recognizer import record_voice
+from nlp.speech_recognizer import record_voice, get_asr_backend
+from nlp.audio_capture import get_audio_capture
+from nlp.tts_cache import expand_phrases, get_tts_cache
+from nlp.tts_engines import get_engine_selector
+from nlp.tts_service import get_tts_service
+from nlp.landmark_catalog import get_catalog
+from nlp.streaming_asr import ASR_STREAMING, get_streaming_transcriber
 import threading
 
 import asyncio
 import threading
 
 TEST_MODE = globals().get("TEST_MODE", False)
+
+# 固定播报语：启动时按全部地名对预渲染进 TTS 缓存，重复播报不再走网络
+TTS_RECOGNIZED = "已识别到/Starting recognition: {start} -> {end}。需要我显示路线吗？/ Do you need me to show the route?"
+TTS_NAVIGATING = "开始导航/Starting navigation: {start} -> {end}。祝您一路顺风。/ Wish you a smooth journey."
+TTS_RETRY = "抱歉，起点或终点不在支持范围内，请重试/sorry, please try again。"
+TTS_NOT_SUPPORTED = "抱歉，起点或终点不在支持范围内，请重试。"
+TTS_PHRASES = (TTS_RECOGNIZED, TTS_NAVIGATING, TTS_RETRY, TTS_NOT_SUPPORTED)
 MAP_ORIGIN = (-270, 210)  
 SCALE = 2.2
 
@@ -70,6 +85,20 @@ class VoiceInputDialog(QDialog):
         self.route = []
         self.landmarks = {} 
 
+        # 对话框一打开就在后台握手，并预热本地 LLM 的提示词前缀缓存
+        if not TEST_MODE:
+            preconnect_llm()
+            # 麦克风流常驻并提前标定底噪，第一次按键就不用再等
+            try:
+                get_audio_capture().start()
+            except Exception as e:
+                print(f"[WARN] 麦克风打开失败，按键时再试: {e}")
+            # 本地识别后端在后台加载模型（google 后端无需预热）
+            get_asr_backend().warm_up()
+            # edge 连不上就不预渲染，免得每句都等到超时
+            get_tts_cache().prerender(expand_phrases(TTS_PHRASES, get_catalog().ids),
+                                      gate=lambda: get_engine_selector().available("edge"))
+
         self.map_label = QLabel()
         self.pixmap = QPixmap("Town05.png").scaled(1024, 1024, Qt.KeepAspectRatio)
         self.map_label.setPixmap(self.pixmap)
@@ -116,34 +145,45 @@ class VoiceInputDialog(QDialog):
 
         self.map_label.setPixmap(self.pixmap)
 
-        import os
-        if os.path.exists("input.wav"):
-            os.remove("input.wav")
-
         self.info_label.setText("录音中，请说出起点和终点.../Recording, please state the start and end points...")
         self.record_button.setEnabled(False)
         self.show_route_button.setEnabled(False)
         self.start_nav_button.setEnabled(False)
 
         try:
-   
-            audio_text = transcribe_audio()
-            self.info_label.setText("识别中... / Recognizing...")
-
-            parsed_result = chat_with_deepseek(audio_text)
+            # 录音期间后台预先握手，解析时直接复用连接
+            if not TEST_MODE:
+                preconnect_llm()
+
+            if ASR_STREAMING and not TEST_MODE:
+                # 边说边识别，稳定的部分结果提前投机解析
+                streamed = get_streaming_transcriber().run()
+                audio_text, parsed_result = streamed.text, streamed.parsed
+            else:
+                audio_text = transcribe_audio()
+                self.info_label.setText("识别中... / Recognizing...")
+
+                # 先走规则解析，置信度不够才升级到 LLM
+                parsed_result = parse_instruction(audio_text)
             start = parsed_result.get("start")
             end = parsed_result.get("end")
 
-            if not start or not end:
+            # 级联全部不达标时也会返回最高分候选，低于阈值或不在白名单里的一律不采纳
+            confident = parsed_result.get("confidence", 0.0) >= get_cascade().threshold
+            if not confident or not get_catalog().is_valid_route(start, end):
                 self.info_label.setText("未能识别有效的起点或终点。\nPlease speak clearly the start and end places.")
                 return
+            if not get_catalog().routable(start, end):
+                self.info_label.setText(f"地图上没有 {start} 或 {end} 的位置，无法导航。\n"
+                                        f"No drivable location for {start} or {end} on this map.")
+                return
 
             self.start_landmark = start
             self.end_landmark = end
 
             self.info_label.setText(f"识别成功 / Recognition Successful:\n从 {start} 到 {end}")
 
-            self.tts(f"已识别到/Starting recognition: {start} -> {end}。需要我显示路线吗？/ Do you need me to show the route?")
+            self.tts(TTS_RECOGNIZED.format(start=start, end=end))
 
             self.show_route_button.setEnabled(True)
 
@@ -159,12 +199,8 @@ class VoiceInputDialog(QDialog):
         if TEST_MODE:
             print(f"[TTS] {text}")
             return
-        def _run():
-            try:
-                asyncio.run(speak(text, voice=voice))
-            except Exception as e:
-                print(f"[TTS ERROR] {e}")
-        threading.Thread(target=_run, daemon=True).start()
+        # 交给常驻播报服务排队：新提示顶替旧提示，边合成边播放
+        get_tts_service().say(text, voice=voice)
 
 
     # def tts(self, text: str, voice: str = "zh-CN-XiaoxiaoNeural"):
@@ -272,7 +308,7 @@ class VoiceInputDialog(QDialog):
 
         except Exception as e:
             self.info_label.setText(f"显示路线失败 / Failed to show route: {e}")
-            self.tts("抱歉，起点或终点不在支持范围内，请重试/sorry, please try again。")
+            self.tts(TTS_RETRY)
 
     def start_navigation(self):
         if not self.start_landmark or not self.end_landmark:
@@ -301,7 +337,7 @@ class VoiceInputDialog(QDialog):
                 valid_names = ", ".join(landmarks.keys())
                 self.warn("无效地点/Invalid",
                                     f"起点或终点不在支持范围内/Not in supported range.\n可选地点有:\n{valid_names}")
-                self.tts("抱歉，起点或终点不在支持范围内，请重试。")
+                self.tts(TTS_NOT_SUPPORTED)
                 return
 
             start_point = landmarks[start_name]
@@ -320,7 +356,7 @@ class VoiceInputDialog(QDialog):
 
             # 语音播报 & 启动自动驾驶（你的 run_autonomous_navigation 接受字符串）
             self.info_label.setText(f"导航/Navigation: {start_name} -> {end_name}")
-            self.tts(f"开始导航/Starting navigation: {start_name} -> {end_name}。祝您一路顺风。/ Wish you a smooth journey.")
+            self.tts(TTS_NAVIGATING.format(start=start_name, end=end_name))
             run_autonomous_navigation(start_name, end_name)
 
         except Exception as e:
@@ -0,0 +1,79 @@
+# behaviour.py
+#
+# 停车 / 限速 / 恢复行驶的状态机，按仿真 tick 计时（fixed_delta_seconds），不用 time.sleep。
+# 同步模式下 sleep 会把整个仿真和其他客户端一起冻住，停车时间也不是仿真里的真实时长；
+# 这里每个 tick 调一次 step()，停车状态下由调用方踩刹车，仿真照常全速推进。
+#
+#   DRIVE --停车标志--> BRAKE --车速降到 STOPPED_SPEED_MPS 以下--> HOLD --STOP_HOLD_S 仿真秒--> DRIVE
+# 限速标志也由状态机下发：构造时给了 agent（BehaviorAgent）就调 agent.set_target_speed，
+# 停车恢复行驶时再下发一次当前限速。
+
+import math
+
+FIXED_DELTA_S = 0.05        # 与 setup_environment 里的 fixed_delta_seconds 一致
+STOP_HOLD_S = 3.0           # 停车标志前停留的仿真秒数
+STOPPED_SPEED_MPS = 0.3
+
+DRIVE, BRAKE, HOLD = "drive", "brake", "hold"
+
+
+def vehicle_speed(vehicle) -> float:
+    v = vehicle.get_velocity()
+    return math.sqrt(v.x ** 2 + v.y ** 2 + v.z ** 2)
+
+
+class BehaviourStateMachine:
+    def __init__(self, dt: float = FIXED_DELTA_S, stop_hold_s: float = STOP_HOLD_S,
+                 stopped_speed: float = STOPPED_SPEED_MPS, agent=None):
+        self.dt = dt or FIXED_DELTA_S
+        self.agent = agent
+        self.hold_ticks = max(1, round(stop_hold_s / self.dt))
+        self.stopped_speed = stopped_speed
+        self.state = DRIVE
+        self.ticks = 0              # 总 tick 数
+        self.state_ticks = 0        # 当前状态已持续的 tick 数
+        self.target_speed = None
+        self._handled = set()
+
+    @property
+    def sim_time(self) -> float:
+        return self.ticks * self.dt
+
+    def on_signal(self, sign) -> bool:
+        """
+        sign 有 id / kind / value（control.signal_index.Signal）。
+        每个标志只处理一次，返回是否是新触发的；停车恢复后标志仍在半径内也不会再停。
+        """
+        if sign.id in self._handled:
+            return False
+        if sign.kind == "stop":
+            self._handled.add(sign.id)
+            if self.state == DRIVE:
+                self._enter(BRAKE)
+            return True
+        if sign.kind == "speed" and sign.value:
+            self._handled.add(sign.id)
+            self.target_speed = sign.value
+            self._apply_speed()
+            return True
+        return False
+
+    def step(self, speed_mps: float) -> str:
+        """每个仿真 tick 调一次（world.tick() 之前），返回本 tick 的动作：DRIVE 交给 agent，其余踩刹车。"""
+        self.ticks += 1
+        self.state_ticks += 1
+        if self.state == BRAKE and speed_mps <= self.stopped_speed:
+            self._enter(HOLD)
+        elif self.state == HOLD and self.state_ticks >= self.hold_ticks:
+            self._enter(DRIVE)
+            self._apply_speed()
+        return self.state
+
+    def _apply_speed(self):
+        if self.agent is not None and self.target_speed:
+            self.agent.set_target_speed(self.target_speed)
+
+    def _enter(self, state: str):
+        print(f"[BEHAVIOUR] {self.state} -> {state} at t={self.sim_time:.2f}s (sim)")
+        self.state = state
+        self.state_ticks = 0
@@ -0,0 +1,150 @@
+# camera_recorder.py
+#
+# 相机录制：CARLA 回调线程里只做一次内存拷贝，编码和写盘交给后台工作线程。
+# - 预分配 slots 个 H×W×4（BGRA）的环形缓冲槽，回调把 raw_data 拷进空闲槽就返回
+# - 工作线程按格式编码：png（默认，无损，和原来的 _out/*.png 一致）/ jpg / npy（原始 BGR，最快）
+# - keep_every=N 只留每 N 帧；没有空闲槽（编码跟不上）时直接丢帧并计数，绝不阻塞回调
+# - sensor_tick / 分辨率由 RecorderConfig 配置，在 setup_camera 里设置到蓝图上
+
+import os
+import queue
+import threading
+from typing import NamedTuple
+
+import numpy as np
+
+FORMATS = ("npy", "jpg", "png")
+
+
+class RecorderConfig(NamedTuple):
+    enabled: bool = True
+    out_dir: str = "_out"
+    fmt: str = "png"
+    width: int = 800
+    height: int = 600
+    sensor_tick: float = 0.0        # 0 表示每个仿真 tick 都出一帧
+    keep_every: int = 1
+    slots: int = 8
+    workers: int = 2
+    jpeg_quality: int = 90
+
+    @classmethod
+    def from_env(cls) -> "RecorderConfig":
+        return cls(
+            enabled=os.getenv("CAMERA_RECORD", "1") != "0",
+            out_dir=os.getenv("CAMERA_OUT_DIR", "_out"),
+            fmt=os.getenv("CAMERA_FORMAT", "png"),
+            width=int(os.getenv("CAMERA_WIDTH", "800")),
+            height=int(os.getenv("CAMERA_HEIGHT", "600")),
+            sensor_tick=float(os.getenv("CAMERA_SENSOR_TICK", "0.0")),
+            keep_every=int(os.getenv("CAMERA_KEEP_EVERY", "1")),
+            slots=int(os.getenv("CAMERA_SLOTS", "8")),
+            workers=int(os.getenv("CAMERA_WORKERS", "2")),
+        )
+
+
+def _image_writer(fmt: str, quality: int):
+    """jpg/png 编码：有 OpenCV 用 OpenCV（直接吃 BGR），否则用 Pillow。"""
+    try:
+        import cv2
+        params = [cv2.IMWRITE_JPEG_QUALITY, quality] if fmt == "jpg" else [cv2.IMWRITE_PNG_COMPRESSION, 1]
+
+        def write(path, bgr):
+            # cv2.imwrite 失败时只返回 False，不抛异常
+            if not cv2.imwrite(path, bgr, params):
+                raise OSError(f"cv2.imwrite failed: {path}")
+        return write
+    except ImportError:
+        from PIL import Image
+
+        def write(path, bgr):
+            img = Image.fromarray(bgr[..., ::-1])
+            if fmt == "jpg":
+                img.save(path, quality=quality)
+            else:
+                img.save(path, compress_level=1)
+        return write
+
+
+class CameraRecorder:
+    def __init__(self, config: RecorderConfig = RecorderConfig()):
+        if config.fmt not in FORMATS:
+            raise ValueError(f"unknown camera format {config.fmt!r}, choose from {FORMATS}")
+        for field in ("keep_every", "slots", "workers"):
+            if getattr(config, field) < 1:
+                raise ValueError(f"camera {field} must be >= 1, got {getattr(config, field)}")
+        self.config = config
+        os.makedirs(config.out_dir, exist_ok=True)
+        self._ring = np.empty((config.slots, config.height, config.width, 4), dtype=np.uint8)
+        self._free = queue.Queue()
+        for i in range(config.slots):
+            self._free.put(i)
+        self._ready = queue.Queue()
+        self._write = None if config.fmt == "npy" else _image_writer(config.fmt, config.jpeg_quality)
+        self._lock = threading.Lock()
+        self.seen = self.skipped = self.dropped = self.written = self.errors = 0
+        self._workers = [threading.Thread(target=self._work, name=f"camera-writer-{i}", daemon=True)
+                         for i in range(config.workers)]
+        for t in self._workers:
+            t.start()
+
+    # ---------- CARLA 回调线程 ----------
+    def on_image(self, image):
+        """camera.listen 的回调：只拷贝一次，拿不到空闲槽就丢帧。"""
+        with self._lock:
+            self.seen += 1
+            if (self.seen - 1) % self.config.keep_every:
+                self.skipped += 1
+                return
+        try:
+            slot = self._free.get_nowait()
+        except queue.Empty:
+            with self._lock:
+                self.dropped += 1
+            return
+        frame = np.frombuffer(image.raw_data, dtype=np.uint8)
+        try:
+            np.copyto(self._ring[slot], frame.reshape(image.height, image.width, 4))
+        except ValueError:
+            # 分辨率和预分配的槽不一致
+            self._free.put(slot)
+            with self._lock:
+                self.errors += 1
+            return
+        self._ready.put((slot, image.frame))
+
+    # ---------- 工作线程 ----------
+    def _work(self):
+        while True:
+            item = self._ready.get()
+            if item is None:
+                return
+            slot, frame = item
+            try:
+                bgr = self._ring[slot][..., :3]
+                path = os.path.join(self.config.out_dir, f"{frame:06d}.{self.config.fmt}")
+                if self._write is None:
+                    np.save(path, bgr)
+                else:
+                    self._write(path, np.ascontiguousarray(bgr))
+                with self._lock:
+                    self.written += 1
+            except Exception as e:
+                print(f"[CAMERA] failed to write frame {frame}: {e}")
+                with self._lock:
+                    self.errors += 1
+            finally:
+                self._free.put(slot)
+
+    def close(self, timeout: float = 5.0):
+        """等已入队的帧写完再退出。"""
+        for _ in self._workers:
+            self._ready.put(None)
+        for t in self._workers:
+            t.join(timeout)
+        print(f"[CAMERA] {self.stats()}")
+
+    def stats(self):
+        with self._lock:
+            return {"seen": self.seen, "skipped": self.skipped, "dropped": self.dropped,
+                    "written": self.written, "errors": self.errors}
@@ -15,8 +15,13 @@ sys.path.append(os.path.join(carla_path, 'carla'))
 sys.path.append(os.path.join(carla_path, 'agents'))
 
 from agents.navigation.behavior_agent import BehaviorAgent
+from agents.navigation.global_route_planner import GlobalRoutePlanner
 from utils.landmark_location import define_landmarks
 from utils.connect_to_carla import connect_to_carla
+from control.camera_recorder import CameraRecorder, RecorderConfig
+from control.radar_processing import RadarConfig, RadarProcessor, sensor_to_world
+from control.signal_index import TRIGGER_RADIUS_M, get_signal_index
+from control.behaviour import DRIVE, BehaviourStateMachine, vehicle_speed
 from PyQt5.QtWidgets import QMessageBox
 
 
@@ -51,23 +56,19 @@ def set_traffic_lights_time(world, red_time=3.0, yellow_time=1.0, green_time=3.0
         light.set_green_time(green_time)
     print(f"All traffic lights set: red={red_time}s, yellow={yellow_time}s, green={green_time}s")
 
-def detect_and_react_to_landmarks(vehicle, landmarks):
+def detect_and_react_to_landmarks(vehicle, signal_index, behaviour, radius=TRIGGER_RADIUS_M):
+    # signal_index: control.signal_index.SignalIndex，只查车辆附近格子里的标志
+    # 停车/限速都交给状态机：刹车和停留由调用方按 behaviour.step() 逐 tick 执行，限速由状态机下发给 agent
     vehicle_loc = vehicle.get_location()
-    world = vehicle.get_world()
 
-    for lm in landmarks:
-        lm_loc = lm.transform.location
-        dist = lm_loc.distance(vehicle_loc)
-        if dist < 8.0:
-            lm_name = lm.name.lower()
-            if "stop" in lm_name:
-                print(f"[SIGNAL DETECTED] Stop sign within {dist:.2f}m. Applying brake.")
-                vehicle.apply_control(carla.VehicleControl(throttle=0.0, brake=1.0))
-                world.tick()
-                time.sleep(3)
-            elif "speed" in lm_name:
-                # 示例：检测限速标志并打印出速度限制
-                print(f"[SIGNAL DETECTED] Speed sign: {lm.name}, distance {dist:.2f}m")
+    for sig, dist in signal_index.query(vehicle_loc.x, vehicle_loc.y, vehicle_loc.z, radius):
+        if not behaviour.on_signal(sig):
+            continue
+        if sig.kind == "stop":
+            print(f"[SIGNAL DETECTED] Stop sign within {dist:.2f}m. Applying brake.")
+        elif sig.kind == "speed":
+            # 示例：检测限速标志并打印出速度限制
+            print(f"[SIGNAL DETECTED] Speed sign: {sig.name}, distance {dist:.2f}m")
 
 
 def setup_vehicle(world, blueprint_library, start_point):
@@ -93,20 +94,23 @@ def setup_vehicle(world, blueprint_library, start_point):
         print(f"FFFFFFFFFFF-------Failed to spawn vehicle: {e}--------------FFFFFFFFFFF")
         return None
 
-def setup_camera(world, vehicle, blueprint_library):
+def setup_camera(world, vehicle, blueprint_library, recorder=None):
+    # 回调线程里只把 BGRA 拷进环形缓冲，编码写盘由 CameraRecorder 的工作线程完成
+    recorder = recorder or CameraRecorder(RecorderConfig.from_env())
+    cfg = recorder.config
     camera_bp = blueprint_library.find('sensor.camera.rgb')
-    camera_bp.set_attribute('image_size_x', '800')
-    camera_bp.set_attribute('image_size_y', '600')
+    camera_bp.set_attribute('image_size_x', str(cfg.width))
+    camera_bp.set_attribute('image_size_y', str(cfg.height))
+    camera_bp.set_attribute('sensor_tick', str(cfg.sensor_tick))
     camera_transform = carla.Transform(carla.Location(x=1.5, z=2.4))
     camera = world.spawn_actor(camera_bp, camera_transform, attach_to=vehicle)
 
-    def process_image(image):
-        image.save_to_disk('_out/%06d.png' % image.frame)
-
-    camera.listen(process_image)
+    camera.listen(recorder.on_image)
     return camera
 
-def setup_radar(world, vehicle, blueprint_library):
+def setup_radar(world, vehicle, blueprint_library, processor=None):
+    # 整帧向量化处理；返回 (radar, processor)，最新点云通过 processor.latest() 读取
+    processor = processor or RadarProcessor(RadarConfig.from_env())
     radar_bp = blueprint_library.find('sensor.other.radar')
     radar_bp.set_attribute('horizontal_fov', '45.0')
     radar_bp.set_attribute('vertical_fov', '20.0')
@@ -115,30 +119,25 @@ def setup_radar(world, vehicle, blueprint_library):
     radar = world.spawn_actor(radar_bp, radar_transform, attach_to=vehicle)
 
     def process_radar(data):
-        points = []
-        for detection in data:
-            azi = detection.azimuth
-            alt = detection.altitude
-            depth = detection.depth
-            pos = carla.Vector3D(depth * math.cos(alt) * math.cos(azi), 
-                                 depth * math.cos(alt) * math.sin(azi),
-                                 depth * math.sin(alt))
-            points.append(pos)
-        draw_radar(world, vehicle, points)
+        frame = processor.process(data)
+        if processor.should_draw():
+            draw_radar(world, vehicle, processor.draw_points(frame))
 
     radar.listen(process_radar)
-    return radar
+    return radar, processor
 
 def draw_radar(world, vehicle, points):
+    # points: (N, >=3) 传感器坐标；车辆 transform 每帧只取一次，点数已由 RadarConfig.max_draw 限制
+    if len(points) == 0:
+        return
     debug = world.debug
-    base_loc = vehicle.get_location()
-    base_rot = vehicle.get_transform().rotation
-    forward_vec = base_rot.get_forward_vector()
-    right_vec = base_rot.get_right_vector()
-    up_vec = base_rot.get_up_vector()
-    for p in points:
-        loc = base_loc + forward_vec*p.x + right_vec*p.y + up_vec*p.z
-        debug.draw_point(loc, size=0.05, life_time=0.06, color=carla.Color(255, 0, 0))
+    transform = vehicle.get_transform()
+    rot = transform.rotation
+    basis = [(v.x, v.y, v.z) for v in (rot.get_forward_vector(), rot.get_right_vector(), rot.get_up_vector())]
+    base = transform.location
+    color = carla.Color(255, 0, 0)
+    for x, y, z in sensor_to_world(points, (base.x, base.y, base.z), *basis).tolist():
+        debug.draw_point(carla.Location(x, y, z), size=0.05, life_time=0.06, color=color)
 
 def follow_vehicle_spectator(world, vehicle):
     spectator = world.get_spectator()
@@ -196,7 +195,7 @@ def setup_collision_sensor(world, vehicle):
     collision_sensor.listen(lambda event: on_collision(event))
     return collision_sensor
 
-def run_navigation(agent, vehicle, end_location, timeout=300):
+def run_navigation(agent, vehicle, end_location, timeout=300, route=None):
     world = vehicle.get_world()
     last_location = vehicle.get_location()
     stuck_counter = 0
@@ -206,32 +205,24 @@ def run_navigation(agent, vehicle, end_location, timeout=300):
     {"name": "Stop", "location": carla.Location(x=123, y=45, z=0.5)},
     {"name": "SpeedLimit30", "location": carla.Location(x=200, y=78, z=0.5)}
 ]
-    triggered_signals = set()
+    # 自定义标志（NAV_MAP_SIGNALS=1 时再加上地图自带标志）的网格索引，按本次路线筛出走廊内的标志
+    if route is None:
+        route = GlobalRoutePlanner(world.get_map(), 2.0).trace_route(last_location, end_location)
+    signals = get_signal_index(world.get_map(), custom_signals).corridor(route)
+    # 停车/限速按仿真 tick 计时；timeout 也是仿真秒
+    behaviour = BehaviourStateMachine(world.get_settings().fixed_delta_seconds, agent=agent)
 
     try:
-        start_time = time.time()
-
         while True:
              
             current_location = vehicle.get_location()
            
-            for idx, sign in enumerate(custom_signals):
-                dist = sign["location"].distance(current_location)
-
-                if dist < 8.0 and idx not in triggered_signals:
-                    if "Stop" in sign["name"]:
-                        print(f"==> STOP sign detected at {dist:.2f}m. Braking.")
-                        vehicle.apply_control(carla.VehicleControl(throttle=0.0, brake=1.0))
-                        world.tick()
-                        time.sleep(3)
-                        triggered_signals.add(idx)
-
-                    elif "SpeedLimit30" in sign["name"]:
-                        print("==> Speed limit 30 detected. Reducing speed.")
-                        agent.set_target_speed(30)
-                        triggered_signals.add(idx)
-
-            control = agent.run_step()
+            detect_and_react_to_landmarks(vehicle, signals, behaviour)
+
+            if behaviour.step(vehicle_speed(vehicle)) == DRIVE:
+                control = agent.run_step()
+            else:
+                control = carla.VehicleControl(throttle=0.0, brake=1.0)
             vehicle.apply_control(control)
             follow_vehicle_spectator(world, vehicle)
 
@@ -253,7 +244,7 @@ def run_navigation(agent, vehicle, end_location, timeout=300):
                 break
 
             moved = current_location.distance(last_location)
-            if moved < 0.1:
+            if moved < 0.1 and behaviour.state == DRIVE:
                 stuck_counter += 1
             else:
                 stuck_counter = 0
@@ -270,7 +261,7 @@ def run_navigation(agent, vehicle, end_location, timeout=300):
 
                 break
 
-            if time.time() - start_time > timeout:
+            if behaviour.sim_time > timeout:
                 print("**********----Timeout reached. Ending navigation.----------**********")
 
                 msg = QMessageBox()
@@ -285,7 +276,6 @@ def run_navigation(agent, vehicle, end_location, timeout=300):
             last_location = current_location
 
             world.tick()
-            time.sleep(0.1)
     finally:
         vehicle.destroy()
         print("Navigation completed and resources cleaned up.")
@@ -344,8 +334,12 @@ def run_autonomous_navigation(start_name: str, end_name: str):
     set_traffic_lights_time(world)
 
     sensors = []
-    cam = setup_camera(world, vehicle, blueprint_library);      sensors.append(cam)
-    radar = setup_radar(world, vehicle, blueprint_library);     sensors.append(radar)
+    cam_cfg = RecorderConfig.from_env()
+    recorder = CameraRecorder(cam_cfg) if cam_cfg.enabled else None
+    if recorder:
+        cam = setup_camera(world, vehicle, blueprint_library, recorder);    sensors.append(cam)
+    radar_proc = RadarProcessor(RadarConfig.from_env())
+    radar, _ = setup_radar(world, vehicle, blueprint_library, radar_proc);    sensors.append(radar)
     col = setup_collision_sensor(world, vehicle);               sensors.append(col)
 
 
@@ -361,6 +355,8 @@ def run_autonomous_navigation(start_name: str, end_name: str):
             except: pass
             try: s.destroy()
             except: pass
+        if recorder:
+            recorder.close()
         try: vehicle.destroy()
         except: pass
         return
@@ -371,7 +367,7 @@ def run_autonomous_navigation(start_name: str, end_name: str):
     # run_navigation(agent, vehicle, end_location, timeout=300)
     # world.tick()
     try:
-        run_navigation(agent, vehicle, end_location, timeout=300)
+        run_navigation(agent, vehicle, end_location, timeout=300, route=route)
         world.tick()
     finally:
         for s in sensors:
@@ -380,6 +376,9 @@ def run_autonomous_navigation(start_name: str, end_name: str):
             except: pass
             try: s.destroy()
             except: pass
+        if recorder:
+            recorder.close()
+        print(f"[RADAR] {radar_proc.stats()}")
         try: vehicle.destroy()
         except: pass
         print("Navigation completed and resources cleaned up.")
@@ -0,0 +1,122 @@
+# radar_processing.py
+#
+# 雷达点云处理：整帧向量化，不在回调里逐个 detection 建 carla.Vector3D。
+# - raw_data 是 float32 行 [velocity, azimuth, altitude, depth]，np.frombuffer 零拷贝读出
+# - 极坐标 -> 传感器坐标系 xyz 一次性三角函数
+# - 可选体素降采样（每个体素留一个点），绘制时再按上限等间隔抽稀
+# - 最新一帧 (N, 4) 数组 [x, y, z, velocity] 通过 RadarProcessor.latest() 给其他模块读
+
+import os
+import threading
+from typing import NamedTuple, Optional
+
+import numpy as np
+
+# raw_data 每个 detection 的列顺序
+VELOCITY, AZIMUTH, ALTITUDE, DEPTH = range(4)
+
+
+class RadarConfig(NamedTuple):
+    voxel_size: float = 0.0         # 米；0 表示不降采样
+    draw: bool = True
+    max_draw: int = 200             # 每帧最多画多少个点
+    draw_every: int = 1             # 每 N 帧画一次
+
+    @classmethod
+    def from_env(cls) -> "RadarConfig":
+        return cls(
+            voxel_size=float(os.getenv("RADAR_VOXEL", "0.0")),
+            draw=os.getenv("RADAR_DRAW", "1") != "0",
+            max_draw=int(os.getenv("RADAR_MAX_DRAW", "200")),
+            draw_every=int(os.getenv("RADAR_DRAW_EVERY", "1")),
+        )
+
+
+class RadarFrame(NamedTuple):
+    frame: int
+    timestamp: float
+    points: np.ndarray              # (N, 4) float32: x, y, z（传感器坐标系）, velocity
+
+
+def radar_to_numpy(raw_data, count: Optional[int] = None) -> np.ndarray:
+    """carla.RadarMeasurement.raw_data -> (N, 4) float32 视图，不拷贝。"""
+    det = np.frombuffer(raw_data, dtype=np.float32)
+    return det.reshape(-1 if count is None else count, 4)
+
+
+def polar_to_xyz(det: np.ndarray) -> np.ndarray:
+    """(N, 4) detection -> (N, 4) [x, y, z, velocity]，x 朝前、y 朝右、z 朝上。"""
+    azi, alt, depth = det[:, AZIMUTH], det[:, ALTITUDE], det[:, DEPTH]
+    cos_alt = np.cos(alt)
+    out = np.empty((len(det), 4), dtype=np.float32)
+    out[:, 0] = depth * cos_alt * np.cos(azi)
+    out[:, 1] = depth * cos_alt * np.sin(azi)
+    out[:, 2] = depth * np.sin(alt)
+    out[:, 3] = det[:, VELOCITY]
+    return out
+
+
+def voxel_downsample(points: np.ndarray, voxel_size: float) -> np.ndarray:
+    """每个体素只留第一个点（保持原顺序）；voxel_size<=0 原样返回。"""
+    if voxel_size <= 0 or len(points) == 0:
+        return points
+    keys = np.floor(points[:, :3] / voxel_size).astype(np.int64)
+    _, first = np.unique(keys, axis=0, return_index=True)
+    return points[np.sort(first)]
+
+
+def decimate(points: np.ndarray, max_points: int) -> np.ndarray:
+    """超过上限时等步长抽稀，保证覆盖整个视场而不是只画前几个点。"""
+    n = len(points)
+    if max_points <= 0:
+        return points[:0]
+    if n <= max_points:
+        return points
+    step = -(-n // max_points)
+    return points[::step]
+
+
+def sensor_to_world(xyz: np.ndarray, origin, forward, right, up) -> np.ndarray:
+    """
+    传感器坐标 -> 世界坐标：origin + x*forward + y*right + z*up。
+    origin / forward / right / up 为长度 3 的序列，每帧只取一次车辆 transform。
+    """
+    basis = np.array([forward, right, up], dtype=np.float64)
+    return np.asarray(origin, dtype=np.float64) + xyz[:, :3].astype(np.float64) @ basis
+
+
+class RadarProcessor:
+    def __init__(self, config: RadarConfig = RadarConfig()):
+        self.config = config
+        self._lock = threading.Lock()
+        self._latest: Optional[RadarFrame] = None
+        self.frames = 0
+        self.detections = 0
+
+    def process(self, data) -> RadarFrame:
+        """雷达回调里调用：整帧转换并替换 latest（数组不原地修改，读方无需拷贝）。"""
+        det = radar_to_numpy(data.raw_data)
+        points = voxel_downsample(polar_to_xyz(det), self.config.voxel_size)
+        result = RadarFrame(data.frame, data.timestamp, points)
+        with self._lock:
+            self._latest = result
+            self.frames += 1
+            self.detections += len(det)
+        return result
+
+    def latest(self) -> Optional[RadarFrame]:
+        with self._lock:
+            return self._latest
+
+    def should_draw(self) -> bool:
+        cfg = self.config
+        with self._lock:
+            return cfg.draw and (self.frames - 1) % max(cfg.draw_every, 1) == 0
+
+    def draw_points(self, frame: RadarFrame) -> np.ndarray:
+        return decimate(frame.points, self.config.max_draw)
+
+    def stats(self):
+        with self._lock:
+            return {"frames": self.frames, "detections": self.detections,
+                    "points": 0 if self._latest is None else len(self._latest.points)}
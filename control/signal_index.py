@@ -0,0 +1,163 @@
+# signal_index.py
+#
+# 交通标志空间索引：OpenDRIVE 信号（carla_map.get_all_landmarks()）+ 自定义触发标志，
+# 每张地图只建一次。
+# - 坐标存成 NumPy 数组，按 CELL_M 米的均匀网格分桶，半径查询只看附近几个格子
+# - corridor() 按规划路线预筛出走廊内的标志，控制循环每 tick 只查这一小部分
+# - 距离与 carla.Location.distance 一致（三维欧氏距离）
+# - 地图自带的停车/限速标志默认不参与（NAV_MAP_SIGNALS=1 开启），否则车辆会在每个 OpenDRIVE
+#   停车标志前刹停、按每块限速牌改目标车速，和原来只认自定义标志的行为不同
+
+import os
+import re
+import threading
+from typing import Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+import numpy as np
+
+CELL_M = 16.0               # 网格边长；取触发半径的两倍，一次查询最多落在 2x2 个格子
+TRIGGER_RADIUS_M = 8.0
+CORRIDOR_M = 12.0           # 路线走廊半宽：触发半径 + 车道偏移余量
+MAP_SIGNALS = os.getenv("NAV_MAP_SIGNALS", "0") == "1"
+
+# OpenDRIVE 标志类型码（德标 StVO，CARLA 地图沿用）
+STOP_TYPES = {"206"}
+SPEED_TYPES = {"274"}
+
+
+class Signal(NamedTuple):
+    id: int
+    name: str
+    kind: str               # "stop" / "speed" / "other"
+    value: Optional[float]  # 限速值；其他标志为 None
+    x: float
+    y: float
+    z: float
+    source: str             # "opendrive" / "custom"
+
+
+def signal_kind(name: str, type_code: str = "") -> str:
+    n = (name or "").lower()
+    if type_code in STOP_TYPES or "stop" in n:
+        return "stop"
+    if type_code in SPEED_TYPES or "speed" in n:
+        return "speed"
+    return "other"
+
+
+def _speed_value(name: str, value) -> Optional[float]:
+    if value:
+        return float(value)
+    m = re.search(r"\d+", name or "")
+    return float(m.group()) if m else None
+
+
+def make_signals(map_signals: Iterable[Tuple] = (), custom_signs: Iterable[dict] = ()) -> List[Signal]:
+    """
+    map_signals: utils.signal_location.get_map_signals() 的 (name, type, value, x, y, z)
+    custom_signs: [{"name": ..., "location": carla.Location}]，和 run_navigation 里的写法一致
+    """
+    out = []
+    for name, type_code, value, x, y, z in map_signals:
+        kind = signal_kind(name, str(type_code))
+        out.append(Signal(len(out), name, kind, _speed_value(name, value) if kind == "speed" else None,
+                          float(x), float(y), float(z), "opendrive"))
+    for sign in custom_signs:
+        name, loc = sign["name"], sign["location"]
+        kind = signal_kind(name)
+        out.append(Signal(len(out), name, kind, _speed_value(name, None) if kind == "speed" else None,
+                          float(loc.x), float(loc.y), float(loc.z), "custom"))
+    return out
+
+
+def _route_xy(route) -> np.ndarray:
+    """trace_route 的 [(waypoint, option)] 或 (M, 2/3) 坐标 -> (M, 2)。"""
+    if len(route) and isinstance(route[0], tuple) and hasattr(route[0][0], "transform"):
+        return np.array([(wp.transform.location.x, wp.transform.location.y) for wp, _ in route], dtype=np.float64)
+    return np.asarray(route, dtype=np.float64).reshape(len(route), -1)[:, :2]
+
+
+class SignalIndex:
+    def __init__(self, signals: Iterable[Signal], cell_m: float = CELL_M):
+        self.signals = list(signals)
+        self.cell_m = cell_m
+        self.xyz = np.array([(s.x, s.y, s.z) for s in self.signals], dtype=np.float64).reshape(-1, 3)
+        buckets: Dict[Tuple[int, int], List[int]] = {}
+        cells = np.floor(self.xyz[:, :2] / cell_m).astype(np.int64)
+        for i, key in enumerate(map(tuple, cells.tolist())):
+            buckets.setdefault(key, []).append(i)
+        self._grid = {k: np.array(v, dtype=np.int64) for k, v in buckets.items()}
+
+    def __len__(self):
+        return len(self.signals)
+
+    def _cells(self, x0, y0, x1, y1):
+        c = self.cell_m
+        for cx in range(int(np.floor(x0 / c)), int(np.floor(x1 / c)) + 1):
+            for cy in range(int(np.floor(y0 / c)), int(np.floor(y1 / c)) + 1):
+                idx = self._grid.get((cx, cy))
+                if idx is not None:
+                    yield idx
+
+    def _candidates(self, x0, y0, x1, y1) -> np.ndarray:
+        parts = list(self._cells(x0, y0, x1, y1))
+        if not parts:
+            return np.empty(0, dtype=np.int64)
+        return np.concatenate(parts)
+
+    def query(self, x: float, y: float, z: float, radius: float = TRIGGER_RADIUS_M) -> List[Tuple[Signal, float]]:
+        """半径内的标志，按距离从近到远。"""
+        idx = self._candidates(x - radius, y - radius, x + radius, y + radius)
+        if len(idx) == 0:
+            return []
+        d = np.linalg.norm(self.xyz[idx] - (x, y, z), axis=1)
+        hit = d <= radius
+        idx, d = idx[hit], d[hit]
+        order = np.argsort(d, kind="stable")
+        return [(self.signals[i], float(dist)) for i, dist in zip(idx[order].tolist(), d[order].tolist())]
+
+    def corridor(self, route, width: float = CORRIDOR_M) -> "SignalIndex":
+        """只保留离路线折线 width 米以内的标志（平面距离），Signal.id 不变。"""
+        pts = _route_xy(route)
+        if len(pts) == 0:
+            return SignalIndex([], self.cell_m)
+        a, b = (pts[:-1], pts[1:]) if len(pts) > 1 else (pts, pts)
+        keep = np.zeros(len(self.signals), dtype=bool)
+        for p, q in zip(a, b):
+            lo, hi = np.minimum(p, q) - width, np.maximum(p, q) + width
+            idx = self._candidates(lo[0], lo[1], hi[0], hi[1])
+            idx = idx[~keep[idx]]
+            if len(idx) == 0:
+                continue
+            seg = q - p
+            seg_len2 = float(seg @ seg)
+            rel = self.xyz[idx, :2] - p
+            t = np.clip(rel @ seg / seg_len2, 0.0, 1.0) if seg_len2 > 0 else np.zeros(len(idx))
+            d = np.linalg.norm(rel - t[:, None] * seg, axis=1)
+            keep[idx[d <= width]] = True
+        return SignalIndex([s for s, k in zip(self.signals, keep) if k], self.cell_m)
+
+
+_indexes: Dict[tuple, SignalIndex] = {}
+_indexes_lock = threading.Lock()
+
+
+def get_signal_index(carla_map, custom_signs: Iterable[dict] = (), include_map: bool = MAP_SIGNALS) -> SignalIndex:
+    """
+    按地图缓存：同一张地图 + 同一组自定义标志只建一次索引。
+    include_map=True 时把 get_all_landmarks() 的 OpenDRIVE 标志也加进来（每张地图只读一次）。
+    """
+    custom_signs = list(custom_signs)
+    key = (carla_map.name, include_map, tuple((s["name"], s["location"].x, s["location"].y, s["location"].z)
+                                              for s in custom_signs))
+    with _indexes_lock:
+        index = _indexes.get(key)
+        if index is None:
+            map_signals = ()
+            if include_map:
+                from utils.signal_location import get_map_signals
+                map_signals = get_map_signals(carla_map)
+            index = SignalIndex(make_signals(map_signals, custom_signs))
+            _indexes[key] = index
+            print(f"[SIGNAL] indexed {len(index)} signals on {carla_map.name}")
+        return index
@@ -2,10 +2,18 @@ import carla
 import random
 import time
 import math
+import os
 import sys
 
 sys.path.append('/home/estherlevi/carla/PythonAPI/carla')
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from agents.navigation.behavior_agent import BehaviorAgent
+from agents.navigation.global_route_planner import GlobalRoutePlanner
+from nlp.landmark_catalog import get_catalog
+from control.camera_recorder import CameraRecorder, RecorderConfig
+from control.radar_processing import RadarConfig, RadarProcessor, sensor_to_world
+from control.signal_index import TRIGGER_RADIUS_M, get_signal_index
+from control.behaviour import DRIVE, BehaviourStateMachine, vehicle_speed
 
 def cleanup_actors(world):
     for actor in world.get_actors().filter('*vehicle*'):
@@ -21,21 +29,8 @@ def setup_environment(world):
     world.apply_settings(settings)
 
 def define_landmarks(world):
-    map = world.get_map()
-    spawn_points = map.get_spawn_points()
-
-    landmarks = {
-        "home": spawn_points[109],
-        "cottageArea": spawn_points[72],
-        "hospital": spawn_points[235],
-        "school": spawn_points[51],
-        "market": spawn_points[283],
-        "officeParking": spawn_points[219],
-        "shoppingMall": spawn_points[27],
-        "Office": spawn_points[258],
-        "parking": spawn_points[21],
-        "railway": spawn_points[138],
-    }
+    # spawn 点不够时 transforms() 会抛 ValueError（地名与下标见 nlp/landmarks.json）
+    landmarks = get_catalog().transforms(world)
 
     #visualize the landmarks with their transforms
     for name, transform in landmarks.items():
@@ -43,9 +38,6 @@ def define_landmarks(world):
         world.debug.draw_string(loc + carla.Location(z=2), name, draw_shadow=False, color=carla.Color(0, 255, 0), life_time=100.0)
         world.debug.draw_arrow(loc, loc + transform.get_forward_vector() * 2, life_time=100.0)
 
-    if len(spawn_points) < 284:  # 最大用了 index 283
-        raise ValueError("the number of spawn_points is insufficient,please switch to Town05 or check the map content.")
-
     return landmarks
 
 def select_landmark_points(landmarks):
@@ -80,23 +72,19 @@ def set_traffic_lights_time(world, red_time=3.0, yellow_time=1.0, green_time=3.0
         light.set_green_time(green_time)
     print(f"All traffic lights set: red={red_time}s, yellow={yellow_time}s, green={green_time}s")
 
-def detect_and_react_to_landmarks(vehicle, landmarks):
+def detect_and_react_to_landmarks(vehicle, signal_index, behaviour, radius=TRIGGER_RADIUS_M):
+    # signal_index: control.signal_index.SignalIndex，只查车辆附近格子里的标志
+    # 停车/限速都交给状态机：刹车和停留由调用方按 behaviour.step() 逐 tick 执行，限速由状态机下发给 agent
     vehicle_loc = vehicle.get_location()
-    world = vehicle.get_world()
 
-    for lm in landmarks:
-        lm_loc = lm.transform.location
-        dist = lm_loc.distance(vehicle_loc)
-        if dist < 8.0:
-            lm_name = lm.name.lower()
-            if "stop" in lm_name:
-                print(f"[SIGNAL DETECTED] Stop sign within {dist:.2f}m. Applying brake.")
-                vehicle.apply_control(carla.VehicleControl(throttle=0.0, brake=1.0))
-                world.tick()
-                time.sleep(3)
-            elif "speed" in lm_name:
-                #检测限速标志并打印出速度限制
-                print(f"[SIGNAL DETECTED] Speed sign: {lm.name}, distance {dist:.2f}m")
+    for sig, dist in signal_index.query(vehicle_loc.x, vehicle_loc.y, vehicle_loc.z, radius):
+        if not behaviour.on_signal(sig):
+            continue
+        if sig.kind == "stop":
+            print(f"[SIGNAL DETECTED] Stop sign within {dist:.2f}m. Applying brake.")
+        elif sig.kind == "speed":
+            #检测限速标志并打印出速度限制
+            print(f"[SIGNAL DETECTED] Speed sign: {sig.name}, distance {dist:.2f}m")
 
 
 def setup_vehicle(world, blueprint_library, start_point):
@@ -122,20 +110,33 @@ def setup_vehicle(world, blueprint_library, start_point):
         print(f"FFFFFFFFFFF-------Failed to spawn vehicle: {e}--------------FFFFFFFFFFF")
         return None
 
-def setup_camera(world, vehicle, blueprint_library):
+def setup_camera(world, vehicle, blueprint_library, recorder=None):
+    # 回调线程里只把 BGRA 拷进环形缓冲，编码写盘由 CameraRecorder 的工作线程完成
+    recorder = recorder or CameraRecorder(RecorderConfig.from_env())
+    cfg = recorder.config
     camera_bp = blueprint_library.find('sensor.camera.rgb')
-    camera_bp.set_attribute('image_size_x', '800')
-    camera_bp.set_attribute('image_size_y', '600')
+    camera_bp.set_attribute('image_size_x', str(cfg.width))
+    camera_bp.set_attribute('image_size_y', str(cfg.height))
+    camera_bp.set_attribute('sensor_tick', str(cfg.sensor_tick))
     camera_transform = carla.Transform(carla.Location(x=1.5, z=2.4))
     camera = world.spawn_actor(camera_bp, camera_transform, attach_to=vehicle)
 
-    def process_image(image):
-        image.save_to_disk('_out/%06d.png' % image.frame)
-
-    camera.listen(process_image)
+    camera.listen(recorder.on_image)
     return camera
 
-def setup_radar(world, vehicle, blueprint_library):
+def close_camera(camera, recorder):
+    # 先停传感器再关录制器，否则之后的回调会把帧塞进已经没人消费的队列
+    if camera is not None:
+        try: camera.stop()
+        except: pass
+        try: camera.destroy()
+        except: pass
+    if recorder is not None:
+        recorder.close()
+
+def setup_radar(world, vehicle, blueprint_library, processor=None):
+    # 整帧向量化处理；返回 (radar, processor)，最新点云通过 processor.latest() 读取
+    processor = processor or RadarProcessor(RadarConfig.from_env())
     radar_bp = blueprint_library.find('sensor.other.radar')
     radar_bp.set_attribute('horizontal_fov', '45.0')
     radar_bp.set_attribute('vertical_fov', '20.0')
@@ -144,30 +145,25 @@ def setup_radar(world, vehicle, blueprint_library):
     radar = world.spawn_actor(radar_bp, radar_transform, attach_to=vehicle)
 
     def process_radar(data):
-        points = []
-        for detection in data:
-            azi = detection.azimuth
-            alt = detection.altitude
-            depth = detection.depth
-            pos = carla.Vector3D(depth * math.cos(alt) * math.cos(azi), 
-                                 depth * math.cos(alt) * math.sin(azi),
-                                 depth * math.sin(alt))
-            points.append(pos)
-        draw_radar(world, vehicle, points)
+        frame = processor.process(data)
+        if processor.should_draw():
+            draw_radar(world, vehicle, processor.draw_points(frame))
 
     radar.listen(process_radar)
-    return radar
+    return radar, processor
 
 def draw_radar(world, vehicle, points):
+    # points: (N, >=3) 传感器坐标；车辆 transform 每帧只取一次，点数已由 RadarConfig.max_draw 限制
+    if len(points) == 0:
+        return
     debug = world.debug
-    base_loc = vehicle.get_location()
-    base_rot = vehicle.get_transform().rotation
-    forward_vec = base_rot.get_forward_vector()
-    right_vec = base_rot.get_right_vector()
-    up_vec = base_rot.get_up_vector()
-    for p in points:
-        loc = base_loc + forward_vec*p.x + right_vec*p.y + up_vec*p.z
-        debug.draw_point(loc, size=0.05, life_time=0.06, color=carla.Color(255, 0, 0))
+    transform = vehicle.get_transform()
+    rot = transform.rotation
+    basis = [(v.x, v.y, v.z) for v in (rot.get_forward_vector(), rot.get_right_vector(), rot.get_up_vector())]
+    base = transform.location
+    color = carla.Color(255, 0, 0)
+    for x, y, z in sensor_to_world(points, (base.x, base.y, base.z), *basis).tolist():
+        debug.draw_point(carla.Location(x, y, z), size=0.05, life_time=0.06, color=color)
 
 def follow_vehicle_spectator(world, vehicle):
     spectator = world.get_spectator()
@@ -226,7 +222,7 @@ def setup_collision_sensor(world, vehicle):
     return collision_sensor
 
 
-def run_navigation(agent, vehicle, end_location, timeout=300):
+def run_navigation(agent, vehicle, end_location, timeout=300, route=None):
     world = vehicle.get_world()
     last_location = vehicle.get_location()
     stuck_counter = 0
@@ -236,32 +232,24 @@ def run_navigation(agent, vehicle, end_location, timeout=300):
     {"name": "Stop", "location": carla.Location(x=123, y=45, z=0.5)},
     {"name": "SpeedLimit30", "location": carla.Location(x=200, y=78, z=0.5)}
 ]
-    triggered_signals = set()
+    # 自定义标志（NAV_MAP_SIGNALS=1 时再加上地图自带标志）的网格索引，按本次路线筛出走廊内的标志
+    if route is None:
+        route = GlobalRoutePlanner(world.get_map(), 2.0).trace_route(last_location, end_location)
+    signals = get_signal_index(world.get_map(), custom_signals).corridor(route)
+    # 停车/限速按仿真 tick 计时；timeout 也是仿真秒
+    behaviour = BehaviourStateMachine(world.get_settings().fixed_delta_seconds, agent=agent)
 
     try:
-        start_time = time.time()
-
         while True:
              
             current_location = vehicle.get_location()
            
-            for idx, sign in enumerate(custom_signals):
-                dist = sign["location"].distance(current_location)
-
-                if dist < 8.0 and idx not in triggered_signals:
-                    if "Stop" in sign["name"]:
-                        print(f"==> STOP sign detected at {dist:.2f}m. Braking.")
-                        vehicle.apply_control(carla.VehicleControl(throttle=0.0, brake=1.0))
-                        world.tick()
-                        time.sleep(3)
-                        triggered_signals.add(idx)
-
-                    elif "SpeedLimit30" in sign["name"]:
-                        print("==> Speed limit 30 detected. Reducing speed.")
-                        agent.set_target_speed(30)
-                        triggered_signals.add(idx)
-
-            control = agent.run_step()
+            detect_and_react_to_landmarks(vehicle, signals, behaviour)
+
+            if behaviour.step(vehicle_speed(vehicle)) == DRIVE:
+                control = agent.run_step()
+            else:
+                control = carla.VehicleControl(throttle=0.0, brake=1.0)
             vehicle.apply_control(control)
             follow_vehicle_spectator(world, vehicle)
 
@@ -275,7 +263,7 @@ def run_navigation(agent, vehicle, end_location, timeout=300):
                 break
 
             moved = current_location.distance(last_location)
-            if moved < 0.1:
+            if moved < 0.1 and behaviour.state == DRIVE:
                 stuck_counter += 1
             else:
                 stuck_counter = 0
@@ -284,14 +272,13 @@ def run_navigation(agent, vehicle, end_location, timeout=300):
                 print("!!!!!!!!!!!---------Vehicle seems to be stuck. Ending navigation.----------!!!!!!!!!!!")
                 break
 
-            if time.time() - start_time > timeout:
+            if behaviour.sim_time > timeout:
                 print("**********----Timeout reached. Ending navigation.----------**********")
                 break
 
             last_location = current_location
 
             world.tick()
-            time.sleep(0.1)
     finally:
         vehicle.destroy()
         print("Navigation completed and resources cleaned up.")
@@ -346,8 +333,10 @@ def main():
     
     set_traffic_lights_time(world, red_time=3.0, yellow_time=1.0, green_time=3.0)
 
-    setup_camera(world, vehicle, blueprint_library)
-    setup_radar(world, vehicle, blueprint_library)
+    cam_cfg = RecorderConfig.from_env()
+    recorder = CameraRecorder(cam_cfg) if cam_cfg.enabled else None
+    camera = setup_camera(world, vehicle, blueprint_library, recorder) if recorder else None
+    radar, radar_proc = setup_radar(world, vehicle, blueprint_library)
     setup_collision_sensor(world, vehicle)
     setup_traffic_vehicle(client,world, vehicle)
 
@@ -357,6 +346,7 @@ def main():
     route = agent._global_planner.trace_route(vehicle.get_location(), end_location)
     if len(route) == 0:
         print("path planning failed, destination unreachable.")
+        close_camera(camera, recorder)
         vehicle.destroy()
         return
     else:
@@ -368,8 +358,12 @@ def main():
 #         {"name": "Stop", "location": start_point.location + carla.Location(x=8, y=0, z=0)},
 #         {"name": "SpeedLimit30", "location": start_point.location + carla.Location(x=15, y=0, z=0)}
 # ]
-    run_navigation(agent, vehicle, end_location, timeout=300)
-    world.tick()
+    try:
+        run_navigation(agent, vehicle, end_location, timeout=300, route=route)
+        world.tick()
+    finally:
+        close_camera(camera, recorder)
+        print(f"[RADAR] {radar_proc.stats()}")
 
 if __name__ == '__main__':
     main()
@@ -0,0 +1,213 @@
+# Project/evaluation/eval_asr.py
+#
+# ASR 基准：把每个识别后端跑一遍 WAV 夹具集，输出
+#   实时率 RTF、单条延迟 p50/p95、进程峰值 RSS、识别文本经 normalize_place_name 后的地名级准确率。
+# 夹具目录两种格式：
+#   A) transcripts.jsonl：{"wav": "001.wav", "text": "从学校去医院", "gold_start": "school", "gold_end": "hospital"}
+#      （gold_* 可省略，省略时用规则解析参考文本得到）
+#   B) 每个 xxx.wav 旁边放同名 xxx.txt 作为参考文本
+# 全程离线：google 后端默认换成桩（按音频内容返回参考文本并模拟网络延迟），--real_cloud 才真的联网。
+# --workers N 时按条切片、多进程并行，每个进程分到 cpu_count/N 个推理线程。
+import os, sys, json, csv, time, wave, hashlib, argparse, resource
+import multiprocessing as mp
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+# 确保能 import 项目内模块（把 Project 根目录加入 sys.path）
+sys.path.append(os.path.dirname(os.path.dirname(__file__)))
+
+import speech_recognition as sr
+
+from nlp.instruction_parser import normalize_place_name
+from nlp.rule_parser import rule_parse
+
+
+# ---------- 夹具 ----------
+def read_wav(path: str) -> sr.AudioData:
+    with wave.open(path, "rb") as w:
+        if w.getnchannels() != 1:
+            raise ValueError(f"{path}: only mono WAV is supported")
+        return sr.AudioData(w.readframes(w.getnframes()), w.getframerate(), w.getsampwidth())
+
+
+def audio_key(audio: sr.AudioData) -> str:
+    return hashlib.sha1(audio.frame_data).hexdigest()
+
+
+def load_corpus(wav_dir: str) -> List[Dict[str, Any]]:
+    manifest = os.path.join(wav_dir, "transcripts.jsonl")
+    items = []
+    if os.path.exists(manifest):
+        with open(manifest, "r", encoding="utf-8") as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                obj = json.loads(line)
+                items.append({"wav": obj["wav"], "text": obj["text"],
+                              "gold_start": obj.get("gold_start"), "gold_end": obj.get("gold_end")})
+    else:
+        for name in sorted(os.listdir(wav_dir)):
+            stem, ext = os.path.splitext(name)
+            txt = os.path.join(wav_dir, stem + ".txt")
+            if ext.lower() == ".wav" and os.path.exists(txt):
+                with open(txt, "r", encoding="utf-8") as f:
+                    items.append({"wav": name, "text": f.read().strip(), "gold_start": None, "gold_end": None})
+
+    for it in items:
+        it["wav"] = os.path.join(wav_dir, it["wav"])
+        if not it["gold_start"] or not it["gold_end"]:
+            ref = rule_parse(it["text"])
+            it["gold_start"] = it["gold_start"] or ref.start
+            it["gold_end"] = it["gold_end"] or ref.end
+        if not it["gold_start"] or not it["gold_end"]:
+            print(f"[WARN] no gold start/end for {os.path.basename(it['wav'])}, excluded from accuracy")
+    return items
+
+
+NO_GOLD = "no_gold"
+
+
+def norm_place(x: Optional[str]) -> Optional[str]:
+    if x is None:
+        return None
+    return normalize_place_name(x)
+
+
+# ---------- 后端 ----------
+def make_backend(name: str, refs: Dict[str, str], real_cloud: bool, stub_latency: float):
+    from nlp.speech_recognizer import AsrBackend, get_asr_backend
+
+    if name == "google" and not real_cloud:
+        class StubCloudBackend(AsrBackend):
+            """离线桩：按音频哈希返回参考文本，并睡 stub_latency 模拟一次往返。"""
+            def _transcribe(self, audio):
+                time.sleep(stub_latency)
+                return refs.get(audio_key(audio), "")
+        backend = StubCloudBackend()
+        backend.name = "google-stub"
+        return backend
+    return get_asr_backend(name)
+
+
+def run_shard(job) -> Dict[str, Any]:
+    """子进程入口：一个后端 + 一片样本 -> 行 + 本进程峰值 RSS。"""
+    name, items, opts = job
+    refs = {}
+    for it in items:
+        it["audio"] = read_wav(it["wav"])
+        refs[audio_key(it["audio"])] = it["text"]
+    backend = make_backend(name, refs, opts["real_cloud"], opts["stub_latency"])
+
+    # 模型加载单独计时，不算进逐条延迟
+    load_s, load_err = 0.0, None
+    holder = getattr(backend, "holder", None)
+    if holder is not None:
+        try:
+            holder.get()
+            load_s = holder.load_time_s or 0.0
+        except Exception as e:
+            load_err = e
+
+    rows = []
+    for it in items:
+        # 参考文本解析不出起终点的样本没有金标：照常计时，但不参与准确率（correct 留空）
+        has_gold = bool(it["gold_start"] and it["gold_end"])
+        try:
+            if load_err is not None:
+                raise load_err
+            res = backend.transcribe(it["audio"])
+        except Exception as e:
+            tags = [f"ERR:{str(e) or type(e).__name__}"] + ([] if has_gold else [NO_GOLD])
+            rows.append([backend.name, os.path.basename(it["wav"]), it["text"], None, None, None, None,
+                         it["gold_start"], it["gold_end"], None, None, False if has_gold else None, ",".join(tags)])
+            continue
+        pred = rule_parse(res.text)
+        ps, pe = norm_place(pred.start), norm_place(pred.end)
+        ok = (ps == it["gold_start"] and pe == it["gold_end"]) if has_gold else None
+        rows.append([backend.name, os.path.basename(it["wav"]), it["text"], res.text,
+                     round(res.audio_s, 3), round(res.elapsed_s, 3), round(res.rtf, 3),
+                     it["gold_start"], it["gold_end"], ps, pe, ok, "" if has_gold else NO_GOLD])
+    # Linux 上 ru_maxrss 单位是 KB
+    peak_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    return {"rows": rows, "peak_rss_mb": round(peak_mb, 1), "load_s": round(load_s, 3)}
+
+
+def run_backend(name: str, items: List[Dict[str, Any]], workers: int, opts: Dict[str, Any]) -> List[Dict[str, Any]]:
+    workers = max(1, min(workers, len(items)))
+    if workers == 1:
+        return [run_shard((name, [dict(it) for it in items], opts))]
+    shards = [(name, [dict(it) for it in items[i::workers]], opts) for i in range(workers)]
+    # spawn：每个分片独立加载模型，RSS 互不叠加
+    with mp.get_context("spawn").Pool(workers) as pool:
+        return pool.map(run_shard, shards)
+
+
+def summarize(name: str, rows: List[List[Any]], shards: List[Dict[str, Any]]):
+    lat = [r[5] for r in rows if isinstance(r[5], (int, float))]
+    audio = sum(r[4] for r in rows if isinstance(r[4], (int, float)))
+    scored = [r for r in rows if r[11] is not None]
+    correct = sum(1 for r in scored if r[11])
+    total = len(scored)
+    return (
+        name, total, correct,
+        round(correct / total * 100, 1) if total else None,
+        round(sum(lat) / audio, 3) if audio else None,
+        round(float(np.percentile(lat, 50)), 3) if lat else None,
+        round(float(np.percentile(lat, 95)), 3) if lat else None,
+        max(s["peak_rss_mb"] for s in shards),
+        max(s["load_s"] for s in shards),
+    )
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--wav_dir", default="evaluation/dataset/asr", help="WAV 夹具目录（transcripts.jsonl 或同名 .txt）")
+    ap.add_argument("--backends", default="faster-whisper,google", help="逗号分隔：google,whisper,faster-whisper")
+    ap.add_argument("--workers", type=int, default=1, help="每个后端的并行进程数（按条切片）")
+    ap.add_argument("--threads", type=int, default=0, help="每个进程的推理线程数（默认 cpu_count/workers）")
+    ap.add_argument("--real_cloud", action="store_true", help="google 后端真的联网，而不是用离线桩")
+    ap.add_argument("--stub_latency", type=float, default=0.3, help="云端桩模拟的单次往返（秒）")
+    ap.add_argument("--out_csv", default="evaluation/asr_results.csv")
+    ap.add_argument("--out_txt", default="evaluation/asr_summary.txt")
+    args = ap.parse_args(argv)
+
+    items = load_corpus(args.wav_dir)
+    if not items:
+        raise SystemExit(f"no WAV fixtures with transcripts under {args.wav_dir}")
+    print(f"[INFO] {len(items)} fixture(s) from {args.wav_dir}")
+
+    # 子进程导入 speech_recognizer 时读取 WHISPER_THREADS
+    threads = args.threads or max(1, (os.cpu_count() or 1) // max(args.workers, 1))
+    os.environ["WHISPER_THREADS"] = str(threads)
+    opts = {"real_cloud": args.real_cloud, "stub_latency": args.stub_latency}
+
+    rows, summary = [], []
+    for name in filter(None, (b.strip() for b in args.backends.split(","))):
+        print(f"[INFO] backend={name} workers={args.workers} threads={threads}")
+        shards = run_backend(name, items, args.workers, opts)
+        backend_rows = [r for s in shards for r in s["rows"]]
+        rows.extend(backend_rows)
+        summary.append(summarize(backend_rows[0][0] if backend_rows else name, backend_rows, shards))
+
+    for p in (args.out_csv, args.out_txt):
+        os.makedirs(os.path.dirname(p) or ".", exist_ok=True)
+    with open(args.out_csv, "w", newline="", encoding="utf-8") as f:
+        w = csv.writer(f)
+        w.writerow(["backend", "wav", "ref_text", "hyp_text", "audio_s", "latency_s", "rtf",
+                    "gold_start", "gold_end", "pred_start", "pred_end", "correct", "tags"])
+        w.writerows(rows)
+
+    with open(args.out_txt, "w", encoding="utf-8") as f:
+        f.write("Backend, Total, Correct, Accuracy(%), RTF, P50(s), P95(s), PeakRSS(MB), Load(s)\n")
+        for s in summary:
+            f.write(", ".join(str(x) for x in s) + "\n")
+            print("[SUMMARY]", ", ".join(str(x) for x in s))
+
+    print("✓ Saved:", args.out_csv, "and", args.out_txt)
+    return summary
+
+
+if __name__ == "__main__":
+    main()
@@ -1,5 +1,5 @@
 # Project/evaluation/eval_parsing.py
-import os, sys, re, json, time, argparse
+import os, sys, re, json, time, argparse, asyncio
 from typing import Dict, Tuple, Any, List, Optional
 import csv
 from pathlib import Path
@@ -8,8 +8,14 @@ from pathlib import Path
 sys.path.append(os.path.dirname(os.path.dirname(__file__)))
 
 # === 项目内依赖 ===
-# nlp.instruction_parser 中已有 alias_map / normalize_place_name / chat_with_deepseek
-from nlp.instruction_parser import alias_map, normalize_place_name, chat_with_deepseek
+# nlp.instruction_parser 中已有 normalize_place_name / chat_with_deepseek / chat_with_local_llm
+from nlp.instruction_parser import normalize_place_name, chat_with_deepseek, chat_with_local_llm, parse_many
+from nlp.instruction_parser import warm_local_llm, local_prefix_stats, local_client, cloud_client
+from nlp.packed_parse import PackedParser, client_chat_fn
+from nlp.ngram_classifier import get_ngram_classifier
+from nlp.rule_parser import rule_parse
+from nlp.constrained import CONSTRAIN_MODES
+from nlp.hedged_parse import HedgedParser, HedgePolicy
 
 
 # ---------- 路径解析 ----------
@@ -74,96 +80,83 @@ def norm_place(x: Optional[str]) -> Optional[str]:
 # ---------- 解析器实现 ----------
 def rule_based_parser(text: str) -> Tuple[Optional[str], Optional[str]]:
     """
-    规则基线：利用 alias_map 全词匹配，简单抽取 start/end。
-    支持模式：
-      - "从X去Y" / "X到Y"
-      - "go to Y from X" / "Y from X"
+    规则基线：复用 nlp.rule_parser（与线上解析级联的第一层相同），只取 start/end。
     """
-    t = text.strip().lower()
-    # 映射词表（键统一为小写，按长度降序，避免短词抢先匹配）
-    keys = sorted(set([k.lower() for k in alias_map.keys()]), key=len, reverse=True)
-
-    # 先尝试中式：“从X去Y” / “X到Y”
-    m = re.search(r"从(.*?)[去到到](.*)", t)
-    if m:
-        cand_start = m.group(1).strip()
-        cand_end = m.group(2).strip()
-        start = next((alias_map[k] for k in keys if k in cand_start), cand_start)
-        end = next((alias_map[k] for k in keys if k in cand_end), cand_end)
-        return norm_place(start), norm_place(end)
-
-    # 再尝试英式：“go to Y from X”
-    m = re.search(r"go\s+to\s+(.*?)\s+from\s+(.*)", t)
-    if m:
-        end = m.group(1).strip()
-        start = m.group(2).strip()
-        start = next((alias_map[k] for k in keys if k in start), start)
-        end = next((alias_map[k] for k in keys if k in end), end)
-        return norm_place(start), norm_place(end)
-
-    # “Y from X”
-    m = re.search(r"(.*?)\s+from\s+(.*)", t)
-    if m:
-        end = m.group(1).strip()
-        start = m.group(2).strip()
-        start = next((alias_map[k] for k in keys if k in start), start)
-        end = next((alias_map[k] for k in keys if k in end), end)
-        return norm_place(start), norm_place(end)
-
-    # fallback：在句中按出现顺序找两个地名
-    found = []
-    for k in keys:
-        if k in t:
-            found.append(alias_map[k])
-    found = [normalize_place_name(x) for x in found if x]
-    if len(found) >= 2:
-        return found[0], found[1]
-    return None, None
-
-
-def local_llm_parser(text: str, endpoint: str, model: str) -> Tuple[Optional[str], Optional[str], float]:
+    res = rule_parse(text)
+    return res.start, res.end
+
+
+def ngram_parser(text: str, model_path: Optional[str] = None) -> Tuple[Optional[str], Optional[str], float]:
     """
-    调本地 LLM（OpenAI 格式兼容接口，如 llama.cpp/ollama/oobabooga 的 /v1/chat/completions）
-    通过环境变量配置：LOCAL_LLM_ENDPOINT, LOCAL_LLM_MODEL
+    离线字符 n-gram 分类器（nlp.ngram_classifier）：进程内打分，不需要任何服务。
+    """
+    clf = get_ngram_classifier(model_path)
+    t0 = time.perf_counter()
+    res = clf.predict(text)
+    return res.start, res.end, time.perf_counter() - t0
+
+
+def local_llm_parser(text: str, endpoint: str, model: str,
+                     constrain: Optional[str] = None) -> Tuple[Optional[str], Optional[str], float]:
+    """
+    调本地 LLM（复用 nlp.instruction_parser.chat_with_local_llm）
+    通过环境变量配置：LOCAL_LLM_ENDPOINT, LOCAL_LLM_MODEL, LOCAL_LLM_CONSTRAIN
     """
-    try:
-        import requests
-    except Exception as e:
-        raise RuntimeError("requests not installed for local LLM parser") from e
-
-    system = (
-        'You extract start and end landmarks from user navigation commands. '
-        'Return strict JSON: {"start":"...", "end":"..."} using ONLY these tokens: '
-        'home, school, hospital, market, shoppingMall, office, officeParking, parking, railway, cottageArea, highspeed.'
-    )
-    payload = {
-        "model": model,
-        "messages": [
-            {"role": "system", "content": system},
-            {"role": "user", "content": text},
-        ],
-        "temperature": 0.2,
-        "max_tokens": 64,
-    }
     t0 = time.time()
-    r = requests.post(endpoint.rstrip("/") + "/v1/chat/completions", json=payload, timeout=60)
+    obj = chat_with_local_llm(text, endpoint=endpoint, model=model, constrain=constrain)
     latency = time.time() - t0
-    r.raise_for_status()
-    msg = r.json()["choices"][0]["message"]["content"]
-    obj = robust_extract_json(msg)
     return norm_place(obj.get("start")), norm_place(obj.get("end")), latency
 
 
-def cloud_llm_parser(text: str) -> Tuple[Optional[str], Optional[str], float]:
+def cloud_llm_parser(text: str, use_cache: bool = True) -> Tuple[Optional[str], Optional[str], float]:
     """
-    复用项目里的 chat_with_deepseek()。
+    复用项目里的 chat_with_deepseek()（默认走解析缓存，重复评测不会重复计费）。
     """
     t0 = time.time()
-    obj = chat_with_deepseek(text) or {}
+    obj = chat_with_deepseek(text, use_cache=use_cache) or {}
     latency = time.time() - t0
     return norm_place(obj.get("start")), norm_place(obj.get("end")), latency
 
 
+def run_llm_batch(parser, texts: List[str], concurrency: int, timeout: float) -> List[Any]:
+    """
+    对整批样本跑一个 LLM 解析器，返回与 texts 对齐的 (start, end, latency) 或异常对象。
+    concurrency <= 1 时保持原来的逐条串行调用。
+    """
+    if concurrency <= 1:
+        out = []
+        for text in texts:
+            try:
+                out.append(parser(text))
+            except Exception as ex:
+                out.append(ex)
+        return out
+    return asyncio.run(parse_many(texts, parse_fn=parser, concurrency=concurrency, timeout=timeout))
+
+
+def run_llm_packed(kind: str, texts: List[str], args) -> List[Any]:
+    """
+    打包模式：每 args.pack 条指令合成一次请求（JSON 数组返回），拆不出来的条目自动单条重做。
+    返回与 texts 对齐的 (start, end, latency)，latency 为打包请求按条数均摊后的耗时。
+    """
+    if kind == "local":
+        chat_fn = client_chat_fn(local_client(args.local_endpoint), args.local_model, temperature=0.2,
+                                 cache_prompt=True)
+        single = lambda t: (chat_with_local_llm(t, endpoint=args.local_endpoint, model=args.local_model,
+                                                constrain=args.local_constrain), "")
+    else:
+        chat_fn = client_chat_fn(cloud_client(), "deepseek-chat")
+        single = lambda t: (chat_with_deepseek(t, use_cache=not args.no_cache), "")
+    packer = PackedParser(chat_fn, single, pack_size=args.pack)
+    items = packer.parse_all(texts, concurrency=args.concurrency, timeout=args.timeout)
+    print(f"[INFO] {kind} packed:", json.dumps(packer.stats(), ensure_ascii=False))
+    out = []
+    for it in items:
+        obj = it.obj or {}
+        out.append((norm_place(obj.get("start")), norm_place(obj.get("end")), it.latency_s))
+    return out
+
+
 # ---------- 主评测 ----------
 def main():
     ap = argparse.ArgumentParser()
@@ -171,11 +164,28 @@ def main():
     ap.add_argument("--out_csv", default="evaluation/parsing_results.csv")
     ap.add_argument("--out_txt", default="evaluation/parsing_summary.txt")
     ap.add_argument("--run_rule", action="store_true")
+    ap.add_argument("--run_ngram", action="store_true", help="离线字符 n-gram 分类器")
+    ap.add_argument("--ngram_model", default=None,
+                    help="n-gram 模型 .npz 路径（默认 out/ngram_classifier.npz，不存在则现训）；必须没用评测集训练过")
     ap.add_argument("--run_local", action="store_true")
     ap.add_argument("--run_cloud", action="store_true")
+    ap.add_argument("--run_hedged", action="store_true", help="规则/本地/云端并行对冲，先到的白名单答案获胜")
+    ap.add_argument("--hedge_tiers", default="rule,local,cloud", help="参与对冲的层，逗号分隔")
+    ap.add_argument("--hedge_delays", default="", help="各层派发延迟，如 'cloud:0.3,local:0'")
     ap.add_argument("--local_endpoint", default=os.getenv("LOCAL_LLM_ENDPOINT", ""))
     ap.add_argument("--local_model", default=os.getenv("LOCAL_LLM_MODEL", ""))
+    ap.add_argument("--pack", type=int, default=0, help="LLM 解析每次请求打包的条数（>1 时开启打包模式）")
+    ap.add_argument("--no_warmup", action="store_true", help="跳过本地 LLM 的前缀缓存预热（测冷启动延迟时使用）")
+    ap.add_argument("--local_constrain", choices=CONSTRAIN_MODES, default=os.getenv("LOCAL_LLM_CONSTRAIN", "grammar"),
+                    help="本地解析的约束解码：none / grammar(GBNF) / schema(JSON Schema)")
+    ap.add_argument("--no_cache", action="store_true", help="云端解析不读写缓存（测真实延迟时使用）")
+    ap.add_argument("--concurrency", type=int, default=1, help="LLM 解析并发数（>1 时走 parse_many）")
+    ap.add_argument("--timeout", type=float, default=60.0, help="并发模式下单条请求超时（秒）")
     args = ap.parse_args()
+    if args.run_ngram and get_ngram_classifier(args.ngram_model).trained_on_dataset:
+        # 在评测集上训练过的模型，在评测集上的准确率没有意义
+        ap.error("n-gram model was trained on evaluation/dataset/prompts.jsonl; "
+                 "retrain without --include_dataset (python -m nlp.ngram_classifier) or pass another --ngram_model")
 
     # 解析并显示最终使用的数据集路径
     data_path = resolve_data_path(args.data)
@@ -208,8 +218,47 @@ def main():
     rows = []
     summary = []
 
-    # 逐条样本测试
-    for item in data:
+    # LLM 解析整批提交（可并发），结果与样本顺序对齐
+    texts = [item["text"] for item in data]
+    local_results = cloud_results = None
+    if args.run_local and args.local_endpoint and args.local_model:
+        if not args.no_warmup:
+            print(f"[INFO] warmed {warm_local_llm(args.local_endpoint, args.local_model)} local slot(s)")
+        if args.pack > 1:
+            local_results = run_llm_packed("local", texts, args)
+        else:
+            local_results = run_llm_batch(
+                lambda t: local_llm_parser(t, args.local_endpoint, args.local_model, args.local_constrain),
+                texts, args.concurrency, args.timeout)
+        print("[INFO] local prefill reuse:", json.dumps(local_prefix_stats.summary(), ensure_ascii=False))
+    if args.run_cloud and args.pack > 1:
+        cloud_results = run_llm_packed("cloud", texts, args)
+    elif args.run_cloud:
+        cloud_results = run_llm_batch(
+            lambda t: cloud_llm_parser(t, use_cache=not args.no_cache),
+            texts, args.concurrency, args.timeout)
+
+    hedged_results = None
+    if args.run_hedged:
+        delays = {}
+        for seg in filter(None, args.hedge_delays.split(",")):
+            tier, sec = seg.split(":")
+            delays[tier.strip()] = float(sec)
+        local_backend = lambda t, _c: local_llm_parser(t, args.local_endpoint, args.local_model, args.local_constrain)[:2]
+        cloud_backend = lambda t, _c: cloud_llm_parser(t, use_cache=not args.no_cache)[:2]
+        hedger = HedgedParser(HedgePolicy([x.strip() for x in args.hedge_tiers.split(",") if x.strip()], delays,
+                                          timeout=args.timeout),
+                              backends={"local": local_backend, "cloud": cloud_backend})
+
+        def hedged_parser(t):
+            out = hedger.parse(t)
+            return out["start"], out["end"], out["latency_s"]
+
+        hedged_results = run_llm_batch(hedged_parser, texts, args.concurrency, args.timeout)
+        print("[INFO] hedged stats:", json.dumps(hedger.stats(), ensure_ascii=False))
+
+    # 逐条样本汇总
+    for i, item in enumerate(data):
         text = item["text"]
         gold_s = item["gold_start"]
         gold_e = item["gold_end"]
@@ -220,21 +269,21 @@ def main():
             ok = (s == gold_s and e == gold_e)
             rows.append(["rule", text, gold_s, gold_e, s, e, ok, None, tag])
 
-        if args.run_local and args.local_endpoint and args.local_model:
-            try:
-                s, e, lat = local_llm_parser(text, args.local_endpoint, args.local_model)
-                ok = (s == gold_s and e == gold_e)
-                rows.append(["local", text, gold_s, gold_e, s, e, ok, round(lat, 3), tag])
-            except Exception as ex:
-                rows.append(["local", text, gold_s, gold_e, None, None, False, None, f"ERR:{ex}"])
+        if args.run_ngram:
+            s, e, lat = ngram_parser(text, args.ngram_model)
+            ok = (s == gold_s and e == gold_e)
+            rows.append(["ngram", text, gold_s, gold_e, s, e, ok, round(lat, 6), tag])
 
-        if args.run_cloud:
-            try:
-                s, e, lat = cloud_llm_parser(text)
-                ok = (s == gold_s and e == gold_e)
-                rows.append(["cloud", text, gold_s, gold_e, s, e, ok, round(lat, 3), tag])
-            except Exception as ex:
-                rows.append(["cloud", text, gold_s, gold_e, None, None, False, None, f"ERR:{ex}"])
+        for kind, results in (("local", local_results), ("cloud", cloud_results), ("hedged", hedged_results)):
+            if results is None:
+                continue
+            res = results[i]
+            if isinstance(res, Exception):
+                rows.append([kind, text, gold_s, gold_e, None, None, False, None, f"ERR:{str(res) or type(res).__name__}"])
+                continue
+            s, e, lat = res
+            ok = (s == gold_s and e == gold_e)
+            rows.append([kind, text, gold_s, gold_e, s, e, ok, round(lat, 3), tag])
 
     # 写 CSV
     os.makedirs(os.path.dirname(args.out_csv), exist_ok=True)
@@ -254,7 +303,7 @@ def main():
         avg_lat = round(sum(latencies) / len(latencies), 3) if latencies else None
         return kind, total, correct, round(correct / total * 100, 1), avg_lat
 
-    for m in ["rule", "local", "cloud"]:
+    for m in ["rule", "ngram", "local", "cloud", "hedged"]:
         s = summarize(m)
         if s:
             summary.append(s)
@@ -1,5 +1,9 @@
-import os, time, json, argparse, statistics
-from openai import OpenAI
+import os, sys, json, argparse, statistics
+
+# 与线上 UI 共用 nlp.llm_client 的流式接口（连接池 + TTFT/JSON 计时）
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+from nlp.llm_client import get_client
+from nlp.landmark_catalog import get_catalog
 
 parser = argparse.ArgumentParser()
 parser.add_argument("--base_url", type=str, default=os.getenv("OPENAI_API_BASE"))
@@ -10,43 +14,44 @@ parser.add_argument("--concurrency", type=int, default=8)
 parser.add_argument("--n_requests", type=int, default=100)
 parser.add_argument("--max_new_tokens", type=int, default=128)
 parser.add_argument("--temperature", type=float, default=0.0)
+parser.add_argument("--early_exit", action="store_true", help="收到合格 JSON 即断开（与线上 chat_with_deepseek 一致）")
 args = parser.parse_args()
 
-client = OpenAI(api_key=args.api_key, base_url=args.base_url)
+client = get_client(args.base_url or "https://api.deepseek.com/v1", args.api_key, pool_size=max(args.concurrency, 8))
+CATALOG = get_catalog()
+SYSTEM = CATALOG.system_prompt("bench")
+
+def is_valid(obj):
+    return CATALOG.mask((obj.get("start"), obj.get("end"))) != 0
 
 def one_call():
-    t0 = time.time()
-    stream = client.chat.completions.create(
-        model=args.model,
-        messages=[{"role":"system","content":"Output JSON only: {\"start\":\"...\",\"end\":\"...\"} Allowed: home,school,hospital,market,shoppingMall,office,officeParking,parking,railway,highspeed."},
-                  {"role":"user","content":f"从{args.prompt}出发"}],
-        temperature=args.temperature,
-        stream=True,
-        max_tokens=args.max_new_tokens
-    )
-    ttft = None
-    n_chars = 0
-    for chunk in stream:
-        if ttft is None:
-            ttft = time.time() - t0
-        delta = chunk.choices[0].delta.content or ""
-        n_chars += len(delta)
-    total = time.time() - t0
+    res = client.stream_chat({
+        "model": args.model,
+        "messages": [{"role":"system","content":SYSTEM},
+                     {"role":"user","content":f"从{args.prompt}出发"}],
+        "temperature": args.temperature,
+        "max_tokens": args.max_new_tokens
+    }, accept=is_valid, stop_on_accept=args.early_exit)
+    ttft = res.ttft_s if res.ttft_s is not None else res.total_s
+    n_chars = len(res.text)
     # 以字符近似token速率（相对比较足够）
-    tpot = (total - ttft) / max(n_chars,1)
-    return {"ttft": ttft, "tpot": tpot, "total": total, "n_chars": n_chars}
+    tpot = (res.total_s - ttft) / max(n_chars,1)
+    return {"ttft": ttft, "tpot": tpot, "total": res.total_s, "n_chars": n_chars, "json": res.json_s}
 
 import concurrent.futures as cf
-lat, tp, tot = [], [], []
+lat, tp, tot, tj = [], [], [], []
 with cf.ThreadPoolExecutor(max_workers=args.concurrency) as ex:
     futs=[ex.submit(one_call) for _ in range(args.n_requests)]
     for f in cf.as_completed(futs):
         r = f.result()
         lat.append(r["ttft"]); tp.append(r["tpot"]); tot.append(r["total"])
+        if r["json"] is not None:
+            tj.append(r["json"])
 print(json.dumps({
     "concurrency": args.concurrency,
     "n_requests": args.n_requests,
     "TTFT_avg_s": statistics.mean(lat),
     "GenCharSec_avg": 1.0/statistics.mean(tp) if statistics.mean(tp)>0 else None,
     "Latency_avg_s": statistics.mean(tot),
+    "TimeToJSON_avg_s": statistics.mean(tj) if tj else None,
 }, indent=2, ensure_ascii=False))
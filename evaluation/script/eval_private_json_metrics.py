@@ -1,6 +1,11 @@
-import json, argparse
+import os, sys, json, argparse
 
-ALLOW = {"home","school","hospital","market","shoppingMall","office","officeParking","parking","railway","highspeed"}
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+from nlp.landmark_catalog import get_catalog
+
+# 白名单与别名表统一来自 nlp/landmarks.json
+CATALOG = get_catalog()
+ALLOW = CATALOG.allowed
 
 def load_jsonl(path):
     with open(path,"r",encoding="utf-8") as f:
@@ -12,11 +17,13 @@ def load_jsonl(path):
 def main():
     ap = argparse.ArgumentParser()
     ap.add_argument("--pred", required=True)  # gen_private_json_outputs.py 的输出
-    ap.add_argument("--alias_map", default="../prompts/alias_map.json")
+    ap.add_argument("--alias_map", default=None, help="可选：额外的别名表 JSON（默认只用地名目录）")
     ap.add_argument("--refs", default=None)   # 可选：refs_optional.jsonl
     args = ap.parse_args()
 
-    alias = json.load(open(args.alias_map,"r",encoding="utf-8"))
+    alias = {}
+    if args.alias_map:
+        alias = json.load(open(args.alias_map,"r",encoding="utf-8"))
     preds = list(load_jsonl(args.pred))
     ref_map = {}
     if args.refs:
@@ -47,9 +54,9 @@ def main():
 
             # 归一化准确率（需要参考答案）
             if ref_map:
-                # 先用 alias_map 归一化
-                s_norm = alias.get(s, s)
-                e_norm = alias.get(e, e)
+                # 先用别名表归一化
+                s_norm = alias.get(s) or CATALOG.lookup(s) or s
+                e_norm = alias.get(e) or CATALOG.lookup(e) or e
                 gold = ref_map.get(r["id"])
                 if gold:
                     norm_correct += int((s_norm==gold[0]) and (e_norm==gold[1]))
@@ -1,16 +1,19 @@
-import os, json, argparse, time, re
+import os, sys, json, argparse, time, re, asyncio
 from typing import Dict, Any, Optional
 
-# 统一白名单
-ALLOW = {"home","school","hospital","market","shoppingMall","office","officeParking","parking","railway","highspeed"}
+# 把 Project 根目录加入 sys.path，复用 nlp 里的共享 LLM 客户端
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+from nlp.llm_client import get_client as get_parser_client
+from nlp.parse_cache import get_parse_cache, prompt_version
+from nlp.instruction_parser import parse_many
+from nlp.landmark_catalog import get_catalog
+from nlp.packed_parse import PackedParser, client_chat_fn
 
-R_SYSTEM = (
-    'You are an autonomous driving voice assistant. Extract ONLY start and end. '
-    'Output STRICT JSON: {"start":"...","end":"..."}. '
-    'Allowed places (MUST choose from, output in English): '
-    'home, school, hospital, market, shoppingMall, office, officeParking, parking, railway, highspeed. '
-    'Do NOT output Chinese. Do NOT add explanations.'
-)
+# 统一白名单与提示词（来自 nlp/landmarks.json）
+CATALOG = get_catalog()
+ALLOW = CATALOG.allowed
+
+R_SYSTEM = CATALOG.system_prompt("eval")
 
 def parse_args():
     ap = argparse.ArgumentParser()
@@ -22,13 +25,24 @@ def parse_args():
     ap.add_argument("--api_key", default=os.environ.get("OPENAI_API_KEY",""))
     ap.add_argument("--max_new_tokens", type=int, default=int(os.environ.get("MAX_NEW_TOKENS","128")))
     ap.add_argument("--temperature", type=float, default=float(os.environ.get("TEMP","0")))
+    ap.add_argument("--no_cache", action="store_true", help="不读写解析缓存（测真实延迟时使用）")
+    ap.add_argument("--concurrency", type=int, default=1, help="并发请求数（>1 时走 parse_many）")
+    ap.add_argument("--timeout", type=float, default=60.0, help="并发模式下单条请求超时（秒）")
+    ap.add_argument("--pack", type=int, default=0, help="每次请求打包的指令条数（>1 时开启打包模式，失败的条目自动单条重做）")
     return ap.parse_args()
 
+DEFAULT_BASE_URL = {
+    "deepseek": "https://api.deepseek.com/v1",
+    "openai": "https://api.openai.com/v1",
+    "llamacpp_http": "http://127.0.0.1:8080/v1",
+}
+
 def get_client(provider, base_url, api_key):
-    # 走 OpenAI 兼容SDK；pip install openai>=1.30
-    from openai import OpenAI
-    if provider in ["deepseek","openai","llamacpp_http"]:
-        return OpenAI(api_key=api_key, base_url=base_url if base_url else None)
+    # 与线上 UI 共用 nlp.llm_client（连接池 + keep-alive + 超时 + 重试）
+    if provider in DEFAULT_BASE_URL:
+        client = get_parser_client(base_url or DEFAULT_BASE_URL[provider], api_key or None)
+        client.preconnect(background=False)
+        return client
     raise ValueError("unknown provider")
 
 def extract_json(text: str) -> Optional[Dict[str,Any]]:
@@ -46,40 +60,101 @@ def main():
     args = parse_args()
     client = get_client(args.provider, args.base_url, args.api_key)
 
-    outs = []
+    cache = None if args.no_cache else get_parse_cache()
+    # provider/base_url 不同的服务可能回答不同，一并计入提示词版本
+    pver = prompt_version(R_SYSTEM, args.provider, args.base_url)
+
     with open(args.infile, "r", encoding="utf-8") as f:
         lines = [json.loads(x) for x in f if x.strip()]
 
-    for item in lines:
+    def run_one(item):
         pid = item["id"]; prompt = item["prompt"]
         t0 = time.time()
+        cache_key = cache.make_key(prompt, args.model, pver, args.temperature, ALLOW) if cache else None
+        cached = cache.get(cache_key) if cache else None
+        if cached is not None:
+            return {
+                "id": pid,
+                "prompt": prompt,
+                "raw": cached["raw"],
+                "parsed": extract_json(cached["raw"]),
+                "latency_s": round(time.time()-t0,3),
+                "cached": True
+            }
         try:
-            resp = client.chat.completions.create(
-                model=args.model,
-                messages=[
+            text = client.chat(
+                [
                     {"role":"system","content":R_SYSTEM},
                     {"role":"user","content":f"从{prompt}出发"}
                 ],
+                model=args.model,
                 temperature=args.temperature,
                 max_tokens=args.max_new_tokens
             )
-            text = resp.choices[0].message.content
         except Exception as e:
             text = f"__ERROR__: {e}"
 
         parsed = extract_json(text) if not text.startswith("__ERROR__") else None
-        outs.append({
+        if cache and parsed is not None:
+            cache.put(cache_key, {"raw": text})
+        return {
             "id": pid,
             "prompt": prompt,
             "raw": text,
             "parsed": parsed,
             "latency_s": round(time.time()-t0,3)
-        })
+        }
+
+    if args.pack > 1:
+        outs = run_packed(args, client, cache, lines, run_one)
+    elif args.concurrency > 1:
+        results = asyncio.run(parse_many(lines, parse_fn=run_one,
+                                         concurrency=args.concurrency, timeout=args.timeout))
+        outs = []
+        for item, res in zip(lines, results):
+            if isinstance(res, Exception):
+                res = {"id": item["id"], "prompt": item["prompt"], "raw": f"__ERROR__: {res!r}",
+                       "parsed": None, "latency_s": args.timeout}
+            outs.append(res)
+    else:
+        outs = [run_one(item) for item in lines]
 
     os.makedirs(os.path.dirname(args.outfile), exist_ok=True)
     with open(args.outfile, "w", encoding="utf-8") as w:
         for row in outs:
             w.write(json.dumps(row, ensure_ascii=False) + "\n")
 
+def run_packed(args, client, cache, lines, run_one):
+    """
+    打包模式：未命中缓存的条目每 args.pack 条合成一次请求，
+    数组里拆不出合法结果的条目退回 run_one 单条重做。
+    """
+    pver_packed = CATALOG.prompt_version("packed", args.provider, args.base_url)
+    outs = [None] * len(lines)
+    todo = []
+    for i, item in enumerate(lines):
+        key = cache.make_key(item["prompt"], args.model, pver_packed, args.temperature, ALLOW) if cache else None
+        cached = cache.get(key) if cache else None
+        if cached is not None:
+            outs[i] = {"id": item["id"], "prompt": item["prompt"], "raw": cached["raw"],
+                       "parsed": extract_json(cached["raw"]), "latency_s": 0.0, "cached": True}
+        else:
+            todo.append((i, item, key))
+
+    def single(prompt):
+        row = run_one({"id": None, "prompt": prompt})
+        return row["parsed"], row["raw"]
+
+    packer = PackedParser(client_chat_fn(client, args.model, args.temperature), single, pack_size=args.pack)
+    results = packer.parse_all([item["prompt"] for _, item, _ in todo],
+                               concurrency=args.concurrency, timeout=args.timeout)
+    for (i, item, key), res in zip(todo, results):
+        if cache and res.obj is not None:
+            cache.put(key, {"raw": res.raw})
+        outs[i] = {"id": item["id"], "prompt": item["prompt"], "raw": res.raw, "parsed": res.obj,
+                   "latency_s": round(res.latency_s, 3), "packed": res.packed}
+    print("[PACK]", json.dumps(packer.stats(), ensure_ascii=False))
+    return outs
+
 if __name__ == "__main__":
     main()
@@ -8,7 +8,14 @@ PORT="8080"
 CTX=4096
 THREADS=8
 NGL=35   # 4070上可调；不确定就删掉该参数让其自动
+SLOTS=2  # 并行槽位数；客户端不设 LOCAL_LLM_SLOTS 时会从 /props 读到这个值
 
 # server 会启动一个 OpenAI 兼容接口（/v1）
+# 约束解码不需要额外启动参数：chat_with_local_llm 每次请求都会带上由地名白名单
+# 生成的 grammar（GBNF）或 response_format（JSON Schema），见 nlp/constrained.py
+# 提示词前缀复用：客户端每次都带 cache_prompt=true 和固定的 id_slot（见 nlp/local_prefix.py），
+# 每个槽位保留同一段 system prompt 的 KV，纯 CPU 时 prefill 只需算用户那句话。
+# -np 开多个槽位（上下文按槽位平分，CTX 要相应加大）；--cache-reuse 允许按块复用被挪动的前缀。
 # 新版llama.cpp支持 --api-key，若需要可加：--api-key test
-./server -m "$MODEL_PATH" -c $CTX -t $THREADS --host $HOST --port $PORT -ngl $NGL
+./server -m "$MODEL_PATH" -c $((CTX * SLOTS)) -t $THREADS --host $HOST --port $PORT -ngl $NGL \
+    -np $SLOTS --cache-reuse 256
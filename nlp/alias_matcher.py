@@ -0,0 +1,117 @@
+# alias_matcher.py
+#
+# 把 alias_map 预编译成 Aho-Corasick 自动机：一次扫描即可找出句子里所有地名别名，
+# 耗时只和句子长度有关，与别名数量无关。
+
+from collections import deque
+from typing import Dict, List, NamedTuple, Optional
+
+
+class AliasMatch(NamedTuple):
+    begin: int        # 在文本中的起始下标（含）
+    end: int          # 结束下标（不含）
+    alias: str        # 命中的别名（小写）
+    canonical: str    # 归一化后的地名
+
+
+class AliasMatcher:
+    """
+    基于 Aho-Corasick 的多模式别名匹配器。
+    - 构建一次：O(别名总长度)
+    - 查询：O(len(text) + 命中数)
+    - 支持最长匹配、按出现顺序的不重叠匹配，并返回位置
+    """
+
+    def __init__(self, alias_map: Dict[str, str]):
+        # 小写键表，供整词精确查询；规范名本身（如 shoppingMall）也能查回自己
+        self.table: Dict[str, str] = {}
+        for k, v in alias_map.items():
+            self.table.setdefault(k.strip().lower(), v)
+        for v in set(alias_map.values()):
+            self.table.setdefault(v.lower(), v)
+
+        # goto / fail / output 三张表，节点用整数编号
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._out: List[Optional[str]] = [None]      # 以该节点结尾的最长别名
+        self._out_link: List[int] = [0]              # 沿 fail 链的下一个输出节点
+
+        for alias in self.table:
+            if alias:
+                self._insert(alias)
+        self._build_links()
+
+    def __len__(self):
+        return len(self.table)
+
+    def _insert(self, alias: str):
+        node = 0
+        for ch in alias:
+            nxt = self._goto[node].get(ch)
+            if nxt is None:
+                nxt = len(self._goto)
+                self._goto[node][ch] = nxt
+                self._goto.append({})
+                self._fail.append(0)
+                self._out.append(None)
+                self._out_link.append(0)
+            node = nxt
+        self._out[node] = alias
+
+    def _build_links(self):
+        queue = deque(self._goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for ch, nxt in self._goto[node].items():
+                queue.append(nxt)
+                f = self._fail[node]
+                while f and ch not in self._goto[f]:
+                    f = self._fail[f]
+                fallback = self._goto[f].get(ch, 0)
+                self._fail[nxt] = fallback if fallback != nxt else 0
+                # out_link 指向 fail 链上最近的“有输出”的节点
+                fl = self._fail[nxt]
+                self._out_link[nxt] = fl if self._out[fl] is not None else self._out_link[fl]
+
+    # ---------- 查询 ----------
+    def lookup(self, name: str) -> Optional[str]:
+        """整词精确查询（大小写、首尾空白不敏感），未命中返回 None。"""
+        return self.table.get(name.strip().lower())
+
+    def find_all(self, text: str) -> List[AliasMatch]:
+        """返回所有命中（可能重叠），按结束位置排序。text 需已小写。"""
+        goto, fail, out, out_link = self._goto, self._fail, self._out, self._out_link
+        table = self.table
+        matches = []
+        node = 0
+        for i, ch in enumerate(text):
+            while node and ch not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(ch, 0)
+            hit = node if out[node] is not None else out_link[node]
+            while hit:
+                alias = out[hit]
+                matches.append(AliasMatch(i + 1 - len(alias), i + 1, alias, table[alias]))
+                hit = out_link[hit]
+        return matches
+
+    def find_longest(self, text: str) -> List[AliasMatch]:
+        """按出现顺序返回不重叠的命中，同一位置优先取最长别名（leftmost-longest）。"""
+        matches = sorted(self.find_all(text), key=lambda m: (m.begin, -(m.end - m.begin)))
+        picked = []
+        cursor = 0
+        for m in matches:
+            if m.begin >= cursor:
+                picked.append(m)
+                cursor = m.end
+        return picked
+
+    def best_in(self, matches: List[AliasMatch], begin: int = 0, end: Optional[int] = None) -> Optional[AliasMatch]:
+        """在 [begin, end) 区间内挑最长的命中（同长取最靠左）。"""
+        best = None
+        for m in matches:
+            if m.begin < begin or (end is not None and m.end > end):
+                continue
+            if best is None or (m.end - m.begin) > (best.end - best.begin):
+                best = m
+        return best
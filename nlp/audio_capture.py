@@ -0,0 +1,226 @@
+# audio_capture.py
+#
+# 常驻麦克风采集：对话框打开时开一次音频流，后台线程持续读块放进环形缓冲。
+# - 噪声底噪：启动时用前 CALIBRATE_S 秒标定一次，之后只用“非语音块”做 EMA 持续刷新，
+#   每次按键不再 adjust_for_ambient_noise（那一步约 1 秒）
+# - 端点检测：能量超过 底噪 * SPEECH_RATIO 视为开口，静音 PAUSE_S 后结束，带 PRE_ROLL_S 预录
+# - 结果直接在内存里交给识别器（sr.AudioData / NumPy），不再写 input.wav
+
+import collections
+import os
+import threading
+import time
+from typing import Callable, Iterator, NamedTuple, Optional
+
+import numpy as np
+import speech_recognition as sr
+
+BUFFER_S = float(os.getenv("AUDIO_BUFFER_S", "15"))
+CALIBRATE_S = 0.5
+PRE_ROLL_S = 0.3
+PAUSE_S = 0.8
+SPEECH_RATIO = 3.0
+NOISE_ALPHA = 0.05      # 底噪 EMA 系数
+MIN_ENERGY = 100.0      # int16 RMS 下限，防止极安静环境下阈值过低
+
+
+class Chunk(NamedTuple):
+    seq: int            # 递增序号，消费方用它当游标
+    data: bytes         # 原始 PCM
+    energy: float       # RMS
+    t: float            # 读到这一块时的 perf_counter
+
+
+def rms(data: bytes, sample_width: int = 2) -> float:
+    if not data:
+        return 0.0
+    dtype = {1: np.int8, 2: np.int16, 4: np.int32}[sample_width]
+    x = np.frombuffer(data, dtype=dtype).astype(np.float32)
+    return float(np.sqrt(np.mean(x * x))) if x.size else 0.0
+
+
+def audio_to_numpy(audio: sr.AudioData, rate: int = 16000) -> np.ndarray:
+    """sr.AudioData -> float32 单声道 [-1, 1]，默认重采样到 16 kHz（whisper 的输入格式）。"""
+    raw = audio.get_raw_data(convert_rate=rate, convert_width=2)
+    return np.frombuffer(raw, dtype=np.int16).astype(np.float32) / 32768.0
+
+
+class AudioCapture:
+    """
+    source_factory: 返回一个 sr.AudioSource 风格的对象（上下文管理器，进入后有
+                    stream.read(n)、SAMPLE_RATE、SAMPLE_WIDTH、CHUNK），默认 sr.Microphone。
+    """
+
+    def __init__(self, source_factory: Callable = sr.Microphone, buffer_s: float = BUFFER_S):
+        self.source_factory = source_factory
+        self.buffer_s = buffer_s
+        self.sample_rate = None
+        self.sample_width = None
+        self.chunk_frames = None
+        self.noise_floor = None
+        self._ring = None
+        self._seq = 0
+        self._cond = threading.Condition()
+        self._listen_lock = threading.Lock()
+        self._calibrated = threading.Event()
+        self._source = None
+        self._thread = None
+        self._stop = threading.Event()
+        self.error = None
+
+    # ---------- 流的生命周期 ----------
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self):
+        """打开音频流并启动读线程；重复调用无副作用。"""
+        with self._cond:
+            if self.running:
+                return self
+            source = self.source_factory()
+            self._source = source.__enter__()
+            self.sample_rate = self._source.SAMPLE_RATE
+            self.sample_width = self._source.SAMPLE_WIDTH
+            self.chunk_frames = self._source.CHUNK
+            chunk_s = self.chunk_frames / self.sample_rate
+            self._ring = collections.deque(maxlen=max(int(self.buffer_s / chunk_s), 1))
+            self._calib_chunks = max(round(CALIBRATE_S / chunk_s), 1)
+            self._calib = []
+            self.error = None
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._reader, name="audio-capture", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=1.0)
+        with self._cond:
+            if self._source is not None:
+                try:
+                    self._source.__exit__(None, None, None)
+                except Exception:
+                    pass
+            self._source = None
+            self._thread = None
+            self._cond.notify_all()
+
+    def _reader(self):
+        try:
+            while not self._stop.is_set():
+                data = self._source.stream.read(self.chunk_frames)
+                if not data:
+                    break
+                energy = rms(data, self.sample_width)
+                with self._cond:
+                    self._seq += 1
+                    self._ring.append(Chunk(self._seq, data, energy, time.perf_counter()))
+                    self._update_noise(energy)
+                    self._cond.notify_all()
+        except Exception as e:
+            self.error = e
+            print(f"[ERROR] 音频采集中断: {e}")
+        finally:
+            with self._cond:
+                self._cond.notify_all()
+
+    def _update_noise(self, energy):
+        if not self._calibrated.is_set():
+            self._calib.append(energy)
+            if len(self._calib) >= self._calib_chunks:
+                self.noise_floor = float(np.mean(self._calib))
+                self._calibrated.set()
+            return
+        # 只用非语音块刷新底噪，说话时不会把阈值越抬越高
+        if energy < self.threshold:
+            self.noise_floor += NOISE_ALPHA * (energy - self.noise_floor)
+
+    @property
+    def threshold(self) -> float:
+        return max((self.noise_floor or 0.0) * SPEECH_RATIO, MIN_ENERGY)
+
+    # ---------- 消费 ----------
+    def chunks(self, since: Optional[int] = None, timeout: Optional[float] = None) -> Iterator[Chunk]:
+        """
+        从序号 since 之后开始逐块产出（since=None 表示从当前最新块之后）。
+        流结束或 timeout 秒内没有新数据时停止。
+        """
+        with self._cond:
+            cursor = self._seq if since is None else since
+        while True:
+            with self._cond:
+                if not self._cond.wait_for(lambda: self._seq > cursor or not self.running, timeout):
+                    return
+                if self._seq <= cursor:
+                    return
+                ready = [c for c in self._ring if c.seq > cursor]
+            for c in ready:
+                cursor = c.seq
+                yield c
+
+    def listen(self, timeout: Optional[float] = 5, phrase_time_limit: Optional[float] = 10,
+               on_chunk: Optional[Callable[[Chunk], None]] = None) -> sr.AudioData:
+        """
+        等待一句话并返回内存里的 sr.AudioData。
+        timeout 秒内没人开口抛 sr.WaitTimeoutError（和 sr.Recognizer.listen 一致）。
+        on_chunk(chunk) 在语音段的每一块到达时回调，给流式识别用。
+        """
+        self.start()
+        with self._listen_lock:
+            if not self._calibrated.wait(CALIBRATE_S * 4 + 1.0):
+                raise sr.WaitTimeoutError("audio stream produced no data")
+            chunk_s = self.chunk_frames / self.sample_rate
+            pre_roll = max(round(PRE_ROLL_S / chunk_s), 1)
+            pause_chunks = max(round(PAUSE_S / chunk_s), 1)
+
+            # 从环形缓冲里往回取 pre_roll 块，按键前半拍就开口也不会被截掉
+            with self._cond:
+                cursor = max(self._seq - pre_roll, 0)
+            t0 = time.perf_counter()
+            recent = collections.deque(maxlen=pre_roll + 1)   # 预录块 + 开口的这一块
+            phrase, silent, started = [], 0, False
+            for c in self.chunks(since=cursor, timeout=1.0):
+                loud = c.energy > self.threshold
+                if not started:
+                    recent.append(c)
+                    if not loud:
+                        if timeout is not None and time.perf_counter() - t0 > timeout:
+                            raise sr.WaitTimeoutError("listening timed out while waiting for phrase to start")
+                        continue
+                    started = True
+                    phrase = list(recent)
+                    if on_chunk:
+                        for p in phrase:
+                            on_chunk(p)
+                    continue
+                phrase.append(c)
+                silent = 0 if loud else silent + 1
+                if on_chunk:
+                    on_chunk(c)
+                if silent >= pause_chunks:
+                    break
+                if phrase_time_limit is not None and len(phrase) * chunk_s >= phrase_time_limit:
+                    break
+            if not started:
+                if self.error is not None:
+                    raise self.error
+                raise sr.WaitTimeoutError("audio stream ended before a phrase started")
+            # 去掉尾部多余静音，只留一小段
+            if silent > pre_roll:
+                phrase = phrase[:len(phrase) - silent + pre_roll]
+            return sr.AudioData(b"".join(c.data for c in phrase), self.sample_rate, self.sample_width)
+
+
+_capture = None
+_capture_lock = threading.Lock()
+
+
+def get_audio_capture() -> AudioCapture:
+    """进程内共享的采集器（不会自动打开麦克风，第一次 listen/start 时才开）。"""
+    global _capture
+    with _capture_lock:
+        if _capture is None:
+            _capture = AudioCapture()
+        return _capture
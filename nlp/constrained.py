@@ -0,0 +1,51 @@
+# constrained.py
+#
+# 本地 llama.cpp 解析的约束解码：根据地名白名单生成 GBNF 语法或 JSON Schema，
+# 让服务端只能采样出 {"start":<地名>,"end":<地名>}，不再需要正则兜底和重试。
+
+import json
+from typing import Any, Dict, Iterable, Optional
+
+CONSTRAIN_MODES = ("none", "grammar", "schema")
+
+# 受约束时输出固定是 {"start":"officeParking","end":"shoppingMall"} 这种长度，十几个 token 足够
+CONSTRAINED_MAX_TOKENS = 24
+
+
+def build_gbnf(places: Iterable[str]) -> str:
+    """紧凑写法（不允许多余空白），输出 token 数最少。"""
+    alts = " | ".join(json.dumps(json.dumps(p)) for p in sorted(places))
+    return (
+        'root ::= "{\\"start\\":" place ",\\"end\\":" place "}"\n'
+        f"place ::= {alts}\n"
+    )
+
+
+def build_json_schema(places: Iterable[str]) -> Dict[str, Any]:
+    enum = sorted(places)
+    return {
+        "type": "object",
+        "properties": {
+            "start": {"type": "string", "enum": enum},
+            "end": {"type": "string", "enum": enum},
+        },
+        "required": ["start", "end"],
+        "additionalProperties": False,
+    }
+
+
+def constraint_params(mode: Optional[str], places: Iterable[str]) -> Dict[str, Any]:
+    """返回需要合并进 chat/completions 请求体的字段；mode 为 none/None 时返回空 dict。"""
+    if not mode or mode == "none":
+        return {}
+    if mode == "grammar":
+        return {"grammar": build_gbnf(places), "max_tokens": CONSTRAINED_MAX_TOKENS}
+    if mode == "schema":
+        return {
+            "response_format": {
+                "type": "json_schema",
+                "json_schema": {"name": "route", "strict": True, "schema": build_json_schema(places)},
+            },
+            "max_tokens": CONSTRAINED_MAX_TOKENS,
+        }
+    raise ValueError(f"unknown constrain mode: {mode}")
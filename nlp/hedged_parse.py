@@ -0,0 +1,151 @@
+# hedged_parse.py
+#
+# 对冲解析：同一句话同时（或按延迟错开）发给规则解析器、本地 LLM 和云端 LLM，
+# 谁先给出白名单内的答案就用谁，其余请求取消。尾延迟由最快的健康后端决定。
+
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Callable, Dict, Iterable, Optional, Tuple
+
+from nlp import instruction_parser
+from nlp.instruction_parser import CATALOG, normalize_place_name
+from nlp.rule_parser import rule_parse
+
+# 一个后端：(text, cancel_event) -> (start, end) 或 (start, end, confidence)；给不出可信答案时返回 (None, None)
+# 只返回两项的后端，答案落在白名单里即视为置信度 1.0（与 parse_cascade 的 LLM 层一致）
+Backend = Callable[[str, threading.Event], Tuple]
+
+RULE_MIN_CONFIDENCE = 0.8
+
+
+def rule_backend(text, cancel):
+    res = rule_parse(text)
+    if res.confidence < RULE_MIN_CONFIDENCE:
+        return None, None
+    return res.start, res.end, res.confidence
+
+
+def local_backend(text, cancel):
+    # 流式请求，输掉对冲（cancel 置位）时立即断开，本地服务不再接着生成
+    obj = instruction_parser.chat_with_local_llm(text, cancel=cancel) or {}
+    return obj.get("start"), obj.get("end")
+
+
+def cloud_backend(text, cancel):
+    obj = instruction_parser.chat_with_deepseek(text, cancel=cancel) or {}
+    return obj.get("start"), obj.get("end")
+
+
+DEFAULT_BACKENDS: Dict[str, Backend] = {
+    "rule": rule_backend,
+    "local": local_backend,
+    "cloud": cloud_backend,
+}
+
+
+class HedgePolicy:
+    """
+    tiers:   参与对冲的层，按顺序派发
+    delays:  各层相对请求开始的派发延迟（秒），缺省为 0 即立刻派发；
+             例如 {"cloud": 0.3} 表示 300ms 内本地还没答出来才去打云端
+    timeout: 整体等待上限（秒）
+    """
+
+    def __init__(self, tiers: Iterable[str] = ("rule", "local", "cloud"),
+                 delays: Optional[Dict[str, float]] = None, timeout: float = 15.0):
+        self.tiers = tuple(tiers)
+        self.delays = dict(delays or {})
+        self.timeout = timeout
+
+
+class HedgedParser:
+    def __init__(self, policy: Optional[HedgePolicy] = None, backends: Optional[Dict[str, Backend]] = None):
+        self.policy = policy or HedgePolicy()
+        self.backends = dict(DEFAULT_BACKENDS)
+        self.backends.update(backends or {})
+        self._pool = ThreadPoolExecutor(max_workers=4 * max(len(self.policy.tiers), 1),
+                                        thread_name_prefix="hedge")
+        self._lock = threading.Lock()
+        self._parses = 0
+        self._no_answer = 0
+        self._wins = {t: 0 for t in self.policy.tiers}
+        self._dispatched = {t: 0 for t in self.policy.tiers}
+
+    def _run_tier(self, tier, text, cancel):
+        delay = self.policy.delays.get(tier, 0.0)
+        # 延迟派发期间若已有赢家，这一层干脆不发请求
+        if delay > 0 and cancel.wait(delay):
+            return tier, None, None, 0.0
+        if cancel.is_set():
+            return tier, None, None, 0.0
+        with self._lock:
+            self._dispatched[tier] += 1
+        start, end, *conf = self.backends[tier](text, cancel)
+        return tier, normalize_place_name(start), normalize_place_name(end), (conf[0] if conf else 1.0)
+
+    def parse(self, text: str) -> Dict[str, object]:
+        cancel = threading.Event()
+        t0 = time.perf_counter()
+        pending = {self._pool.submit(self._run_tier, tier, text, cancel) for tier in self.policy.tiers}
+        winner = None
+        deadline = t0 + self.policy.timeout
+
+        while pending and winner is None:
+            done, pending = wait(pending, timeout=max(deadline - time.perf_counter(), 0), return_when=FIRST_COMPLETED)
+            if not done:
+                break
+            for fut in done:
+                try:
+                    tier, start, end, conf = fut.result()
+                except Exception as e:
+                    print(f"[HEDGE] tier failed: {e}")
+                    continue
+                if CATALOG.is_valid_route(start, end):
+                    winner = {"start": start, "end": end, "tier": tier, "confidence": conf}
+                    break
+
+        # 取消输家：未开始的直接作废，流式请求会看到 cancel 后断开
+        cancel.set()
+        for fut in pending:
+            fut.cancel()
+
+        latency = time.perf_counter() - t0
+        with self._lock:
+            self._parses += 1
+            if winner is None:
+                self._no_answer += 1
+            else:
+                self._wins[winner["tier"]] += 1
+
+        out = winner or {"start": None, "end": None, "tier": None, "confidence": 0.0}
+        out["latency_s"] = latency
+        return out
+
+    def stats(self) -> Dict[str, object]:
+        with self._lock:
+            total = self._parses
+            return {
+                "parses": total,
+                "no_answer": self._no_answer,
+                "wins": dict(self._wins),
+                "win_rate": {t: (round(n / total, 4) if total else 0.0) for t, n in self._wins.items()},
+                "dispatched": dict(self._dispatched),
+            }
+
+
+_default_hedged = None
+_default_lock = threading.Lock()
+
+
+def get_hedged_parser() -> HedgedParser:
+    """线上共享实例：未配置本地 LLM 时只对冲规则和云端。"""
+    global _default_hedged
+    with _default_lock:
+        if _default_hedged is None:
+            tiers = ["rule"]
+            if instruction_parser.LOCAL_LLM_ENDPOINT and instruction_parser.LOCAL_LLM_MODEL:
+                tiers.append("local")
+            tiers.append("cloud")
+            _default_hedged = HedgedParser(HedgePolicy(tiers))
+        return _default_hedged
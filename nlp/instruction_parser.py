@@ -1,13 +1,20 @@
 # instruction_parser.py
 
-import edge_tts
+import asyncio
 import re, json
 import sys
 import os
+import threading
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
 
 from openai import OpenAI
+from concurrent.futures import ThreadPoolExecutor
+
+from nlp.landmark_catalog import get_catalog
+from nlp.llm_client import get_client
+from nlp.parse_cache import get_parse_cache
+from nlp.local_prefix import PrefixStats, SlotPool, prefix_params, read_prefill
 
 
 import requests
@@ -16,17 +23,86 @@ import re
 
 base_url  = "https://api.deepseek.com"  
 API_KEY = "YOUR OWN API KEY"  
+
+# 云端解析默认走 SSE 流式：收到合格的 {"start","end"} 就断开，不等模型把解释说完
+STREAM_RESPONSES = True
+
+# 本地 OpenAI 兼容服务（llama.cpp/ollama 等），未配置时不启用本地解析
+LOCAL_LLM_ENDPOINT = os.getenv("LOCAL_LLM_ENDPOINT", "")
+LOCAL_LLM_MODEL = os.getenv("LOCAL_LLM_MODEL", "")
+# 本地解析的约束解码方式：none / grammar（GBNF）/ schema（JSON Schema）
+LOCAL_LLM_CONSTRAIN = os.getenv("LOCAL_LLM_CONSTRAIN", "grammar")
+# 本地 llama.cpp 的前缀 KV 复用：cache_prompt 开关与槽位数（与 server 的 -np 一致，0 表示不指定槽位）
+# 槽位数没配置时从服务端 /props 的 total_slots 读，读不到按启动脚本的 SLOTS=2
+LOCAL_LLM_CACHE_PROMPT = os.getenv("LOCAL_LLM_CACHE_PROMPT", "1") != "0"
+LOCAL_LLM_SLOTS = int(os.environ["LOCAL_LLM_SLOTS"]) if os.getenv("LOCAL_LLM_SLOTS") else None
+DEFAULT_LOCAL_SLOTS = 2
 # -----
 
 
-def chat_with_deepseek(prompt):
-    system_prompt = (
-        "你是一个自动驾驶语音助手，请只提取起点和终点，"
-        "返回格式为严格的 JSON: {\"start\": \"...\", \"end\": \"...\"}。\n"
-        "可选地点（必须从这些中选，输出英文）:\n"
-        "home, school, hospital, market, shoppingMall, office, officeParking, parking, railway, highspeed。\n"
-        "不要输出中文，不要解释说明。"
-    )
+def cloud_client():
+    """云端 DeepSeek 共享客户端（连接池 + 超时 + 重试）。"""
+    return get_client(base_url, API_KEY)
+
+
+def local_client(endpoint=None):
+    return get_client(endpoint or LOCAL_LLM_ENDPOINT, read_timeout=60.0)
+
+
+_slot_pools = {}
+_slot_lock = threading.Lock()
+_warm_started = threading.Event()
+
+# 本地解析累计复用了多少 prompt token（评测脚本会打印）
+local_prefix_stats = PrefixStats()
+
+
+def detect_local_slots(endpoint=None):
+    """问 llama.cpp server 的 /props 开了几个槽位（-np）；不是 llama.cpp 或连不上时返回 None。"""
+    root = (endpoint or LOCAL_LLM_ENDPOINT).rstrip("/")
+    if root.endswith("/v1"):
+        root = root[:-3]
+    try:
+        resp = local_client(endpoint).session.get(root + "/props", timeout=2.0)
+        resp.raise_for_status()
+        return int(resp.json()["total_slots"])
+    except (requests.RequestException, ValueError, KeyError, TypeError):
+        return None
+
+
+def local_slots(endpoint=None):
+    """每个本地服务一个槽位池，槽位数与服务端一致。"""
+    endpoint = endpoint or LOCAL_LLM_ENDPOINT
+    with _slot_lock:
+        pool = _slot_pools.get(endpoint)
+        if pool is None:
+            n = LOCAL_LLM_SLOTS
+            if n is None:
+                n = detect_local_slots(endpoint) or DEFAULT_LOCAL_SLOTS
+            pool = _slot_pools[endpoint] = SlotPool(n)
+        return pool
+
+
+def preconnect_llm():
+    """提前与 LLM 服务握手，录音期间就把连接准备好；第一次调用时顺带预热本地前缀缓存。"""
+    cloud_client().preconnect()
+    if LOCAL_LLM_ENDPOINT:
+        local_client().preconnect()
+        if LOCAL_LLM_MODEL and not _warm_started.is_set():
+            _warm_started.set()
+            threading.Thread(target=warm_local_llm, daemon=True).start()
+
+
+def _is_whitelisted(obj):
+    """流式提前退出的判据：start/end 都能归一化到白名单里的地名。"""
+    start, end = obj.get("start"), obj.get("end")
+    if not isinstance(start, str) or not isinstance(end, str):
+        return False
+    return CATALOG.mask((normalize_place_name(start), normalize_place_name(end))) != 0
+
+
+def chat_with_deepseek(prompt, use_cache=True, stream=None, cancel=None):
+    system_prompt = CATALOG.system_prompt("cloud")
     messages = [
         {"role": "system", "content": system_prompt},
         {"role": "user", "content": f"从{prompt}出发"}
@@ -38,55 +114,205 @@ def chat_with_deepseek(prompt):
         "max_tokens": 128,
         "temperature": 0.7
     }
-    headers = {
-        "Authorization": f"Bearer {API_KEY}",
-        "Content-Type": "application/json"
-    }
-    response = requests.post(f"{base_url}/v1/chat/completions", headers=headers, json=payload)
-    if response.status_code != 200:
-        print(f"API调用失败: {response.status_code} - {response.text}")
-        return {"start": "current", "end": "home"}
 
-    result = response.json()
+    # 同一句话（归一化后）+ 同模型/提示词/温度/白名单，直接用缓存结果
+    cache = get_parse_cache() if use_cache else None
+    if cache is not None:
+        cache_key = cache.make_key(prompt, payload["model"], CATALOG.prompt_version("cloud"),
+                                   payload["temperature"], ALLOWED_PLACES)
+        cached = cache.get(cache_key)
+        if cached is not None:
+            return dict(cached)
+
+    stream = STREAM_RESPONSES if stream is None else stream
+    stream_obj = None
+    try:
+        if stream:
+            # cancel（threading.Event）被置位时提前断开，对冲解析里输掉的请求用得到
+            res = cloud_client().stream_chat(payload, accept=_is_whitelisted, cancel=cancel)
+            text_response, stream_obj = res.text, res.obj
+            print(f"DeepSeek 流式: TTFT={res.ttft_s}s, JSON={res.json_s}s, early_exit={res.early_exit}")
+        else:
+            result = cloud_client().chat_completion(payload)
+            text_response = result['choices'][0]['message']['content']
+    except requests.HTTPError as e:
+        print(f"API调用失败: {e.response.status_code} - {e.response.text}")
+        return {"start": "current", "end": "home"}
+    except requests.RequestException as e:
+        # 连接失败、超时等（重试耗尽后），和 HTTP 错误一样回退到默认值
+        print(f"API调用失败: {e}")
+        return {"start": "current", "end": "home"}
  
-    text_response = result['choices'][0]['message']['content']
     print(f"DeepSeek返回原始文本: {text_response}")
 
     try:
-        json_text = re.search(r"\{.*?\}", text_response, re.DOTALL).group()
-        location_info = json.loads(json_text.replace("'", '"'))
+        if stream_obj is not None:
+            location_info = stream_obj
+        else:
+            json_text = re.search(r"\{.*?\}", text_response, re.DOTALL).group()
+            location_info = json.loads(json_text.replace("'", '"'))
+        # 只缓存白名单内的合法路线：temperature=0.7 的一次坏采样不能在 TTL 内一直被重放
+        if (cache is not None and isinstance(location_info, dict)
+                and CATALOG.is_valid_route(normalize_place_name(location_info.get("start")),
+                                           normalize_place_name(location_info.get("end")))):
+            cache.put(cache_key, location_info)
         return location_info
     except Exception as e:
         print(f"解析JSON失败: {e}, 默认使用 start='current', end='home'")
         return {"start": "current", "end": "home"}
 
 
+def chat_with_local_llm(prompt, endpoint=None, model=None, constrain=None, cancel=None):
+    """
+    调本地 LLM（OpenAI 格式兼容接口，如 llama.cpp/ollama/oobabooga 的 /v1/chat/completions）
+    通过环境变量配置：LOCAL_LLM_ENDPOINT, LOCAL_LLM_MODEL, LOCAL_LLM_CONSTRAIN
+    constrain 为 grammar/schema 时附带由白名单生成的约束，服务端只能输出合法 JSON。
+    请求失败时抛出异常，由调用方决定如何降级。
+    cancel（threading.Event）给出时改走流式，置位即断开连接，llama.cpp 随之停止这个槽位的生成。
+    """
+    endpoint = endpoint or LOCAL_LLM_ENDPOINT
+    model = model or LOCAL_LLM_MODEL
+    constrain = constrain or LOCAL_LLM_CONSTRAIN
+    if not endpoint or not model:
+        raise RuntimeError("local LLM endpoint/model not configured")
+
+    system = CATALOG.system_prompt("local")
+    payload = {
+        "model": model,
+        "messages": [
+            {"role": "system", "content": system},
+            {"role": "user", "content": prompt},
+        ],
+        "temperature": 0.2,
+        "max_tokens": 64,
+    }
+    payload.update(CATALOG.constraint_params(constrain))
+
+    # system prompt 每次字节都一样：固定槽位 + cache_prompt，服务端只需计算用户那句话
+    pool = local_slots(endpoint)
+    slot = pool.acquire()
+    payload.update(prefix_params(slot, LOCAL_LLM_CACHE_PROMPT))
+    streamed = result = None
+    try:
+        if cancel is not None:
+            streamed = local_client(endpoint).stream_chat(payload, accept=_is_whitelisted, cancel=cancel)
+        else:
+            result = local_client(endpoint).chat_completion(payload)
+    finally:
+        pool.release(slot)
+
+    if streamed is not None:
+        if streamed.obj is not None:
+            return streamed.obj
+        text_response = streamed.text
+    else:
+        local_prefix_stats.record(read_prefill(result))
+        text_response = result["choices"][0]["message"]["content"]
+
+    m = re.search(r"\{.*?\}", text_response, re.DOTALL)
+    if not m:
+        return {}
+    try:
+        obj = json.loads(m.group().replace("'", '"'))
+    except ValueError:
+        return {}
+    return obj if isinstance(obj, dict) else {}
+
+
+def warm_local_llm(endpoint=None, model=None):
+    """
+    启动预热：给每个槽位发一次 max_tokens=1 的请求，把本地解析的 system prompt
+    算进 KV 缓存，之后的真实请求直接复用这段前缀。返回预热成功的槽位数。
+    """
+    endpoint = endpoint or LOCAL_LLM_ENDPOINT
+    model = model or LOCAL_LLM_MODEL
+    if not endpoint or not model or not LOCAL_LLM_CACHE_PROMPT:
+        return 0
+    pool = local_slots(endpoint)
+    # 一次借出全部槽位，保证每个槽位都被预热到
+    slots = [pool.acquire() for _ in range(max(pool.n_slots, 1))]
+    warmed = 0
+    try:
+        for slot in slots:
+            payload = {
+                "model": model,
+                "messages": [
+                    {"role": "system", "content": CATALOG.system_prompt("local")},
+                    {"role": "user", "content": "home"},
+                ],
+                "temperature": 0.2,
+                "max_tokens": 1,
+            }
+            payload.update(prefix_params(slot, True))
+            try:
+                local_client(endpoint).chat_completion(payload)
+                warmed += 1
+            except Exception as e:
+                print(f"本地 LLM 预热失败(slot={slot}): {e}")
+    finally:
+        for slot in slots:
+            pool.release(slot)
+    return warmed
+
+
 #  ========== 地点名称归一化 ==========
-alias_map = {
-        "家": "home", "home": "home",
-        "医院": "hospital", "hospital": "hospital",
-        "学校": "school", "school": "school",
-        "市场": "market", "超市": "market", "market": "market",
-        "商场": "shoppingMall", "shopping mall": "shoppingMall", "购物中心": "shoppingMall",
-        "办公楼": "office", "公司": "office", "office": "office",
-        "公司停车场": "officeParking", "办公楼停车场": "officeParking",
-        "停车场": "parking", "停车位": "parking",
-        "车站": "railway", "railway": "railway",
-        "高速": "highspeed", "highway": "highspeed", "highspeed": "highspeed"
-}
+# 地名词表统一来自 nlp/landmarks.json（见 landmark_catalog.py），这里只是取别名
+CATALOG = get_catalog()
+alias_map = CATALOG.alias_map
+
+# 解析结果允许出现的地名（与 define_landmarks 的键一致）
+ALLOWED_PLACES = CATALOG.allowed
+
+# 预编译的别名匹配器（模块加载时构建一次，rule_based_parser 等共用）
+alias_matcher = CATALOG.matcher
+# 同音/近音兜底索引：只给规则层处理 ASR/用户原文用（见 rule_parser.rule_parse）
+phonetic_index = CATALOG.phonetic_index
 
 def normalize_place_name(name):
+    # 只做精确别名查询：LLM 输出和评测打分不能被模糊匹配“纠正”成合法地名
     if not name:
         return None
     name = name.strip().lower() 
     
-    return alias_map.get(name, name)
+    canonical = CATALOG.table.get(name)
+    return canonical if canonical is not None else name
+
+
+# ========== 批量异步解析 ==========
+async def parse_many(texts, parse_fn=None, concurrency=8, timeout=30.0):
+    """
+    并发解析一批话语，结果顺序与 texts 一致。
+    - parse_fn: 单条解析函数，默认 chat_with_deepseek（阻塞调用，放到线程池里跑）
+    - concurrency: 同时在途的请求数上限
+    - timeout: 单条请求的超时（秒），超时/出错的位置返回对应的异常对象
+    """
+    parse_fn = parse_fn or chat_with_deepseek
+    loop = asyncio.get_running_loop()
+    sem = asyncio.Semaphore(concurrency)
+
+    pool = ThreadPoolExecutor(max_workers=concurrency)
+
+    async def one(text):
+        await sem.acquire()
+        fut = loop.run_in_executor(pool, parse_fn, text)
+        # 槽位等线程真正跑完才释放：超时的请求仍占着线程，后面的请求不能排到它身后还被计时
+        fut.add_done_callback(lambda _f: sem.release())
+        try:
+            return await asyncio.wait_for(asyncio.shield(fut), timeout)
+        except Exception as e:
+            return e
+
+    try:
+        return await asyncio.gather(*(one(t) for t in texts))
+    finally:
+        # 超时的请求仍在后台线程里跑完，不阻塞事件循环
+        pool.shutdown(wait=False)
 
 
 # ========== TTS 语音合成 ==========
 async def speak(text, voice="zh-CN-XiaoxiaoNeural"):
-    communicate = edge_tts.Communicate(text, voice)
-    await communicate.save("reply.mp3")
-    from playsound import playsound
-    playsound("reply.mp3")
+    # 交给常驻播报服务：命中缓存直接播；否则按健康与首包延迟选 edge-tts 或离线引擎（见 tts_engines.py）
+    from nlp.tts_service import get_tts_service
+    job = get_tts_service().say(text, voice=voice, supersede=False)
+    await asyncio.get_running_loop().run_in_executor(None, job.wait)
 
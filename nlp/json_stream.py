@@ -0,0 +1,60 @@
+# json_stream.py
+#
+# 增量 JSON 扫描器：边接收模型的流式输出边找完整的顶层 {...}，
+# 不必等整段生成结束再跑正则。
+
+import json
+from typing import Any, Dict, List, Optional
+
+
+class JsonObjectScanner:
+    """
+    逐块喂入文本，每当一个顶层 {...} 闭合时把它解析出来。
+    会正确跳过字符串里的花括号和转义字符；解析失败的片段直接丢弃。
+    """
+
+    def __init__(self):
+        self.text = ""          # 目前收到的全部文本
+        self._depth = 0
+        self._begin = -1
+        self._in_string = False
+        self._quote = ""
+        self._escape = False
+
+    def feed(self, chunk: str) -> List[Dict[str, Any]]:
+        found = []
+        offset = len(self.text)
+        self.text += chunk
+        for i, ch in enumerate(chunk, start=offset):
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif ch == "\\":
+                    self._escape = True
+                elif ch == self._quote:
+                    self._in_string = False
+                continue
+            if self._depth > 0 and ch in "\"'":
+                self._in_string, self._quote = True, ch
+            elif ch == "{":
+                if self._depth == 0:
+                    self._begin = i
+                self._depth += 1
+            elif ch == "}" and self._depth > 0:
+                self._depth -= 1
+                if self._depth == 0:
+                    obj = _loads(self.text[self._begin:i + 1])
+                    if obj is not None:
+                        found.append(obj)
+        return found
+
+
+def _loads(fragment: str) -> Optional[Dict[str, Any]]:
+    # 与 robust_extract_json 一致：容忍单引号
+    for cand in (fragment, fragment.replace("'", '"')):
+        try:
+            obj = json.loads(cand)
+        except ValueError:
+            continue
+        return obj if isinstance(obj, dict) else None
+    return None
@@ -0,0 +1,199 @@
+# landmark_catalog.py
+#
+# 地名词表的唯一来源：规范名、别名、CARLA spawn 下标都写在 nlp/landmarks.json 里，
+# 进程启动时加载一次，编译出解析/评测/仿真各处要用的查询结构：
+# - 小写别名表（O(1) 整词查询）、Aho-Corasick 匹配器、语音模糊索引
+# - 白名单 frozenset + 位掩码（一对地名是否合法只需一次按位与）
+# - 各场景的系统提示词、约束解码参数（按需生成后缓存）
+# - 每个 CARLA world 的 地名 -> Transform 缓存（spawn 点只取一次）
+
+import json
+import os
+import threading
+from typing import Dict, Iterable, NamedTuple, Optional
+
+from nlp.alias_matcher import AliasMatcher
+from nlp.constrained import constraint_params
+from nlp.phonetic_index import PhoneticIndex
+from nlp.parse_cache import prompt_version, whitelist_fingerprint
+
+DEFAULT_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "landmarks.json")
+
+# 各处用到的系统提示词模板，{places} 替换为白名单（按目录顺序，逗号分隔）
+PROMPT_TEMPLATES = {
+    # 线上云端解析（chat_with_deepseek）
+    "cloud": (
+        "你是一个自动驾驶语音助手，请只提取起点和终点，"
+        "返回格式为严格的 JSON: {{\"start\": \"...\", \"end\": \"...\"}}。\n"
+        "可选地点（必须从这些中选，输出英文）:\n"
+        "{places}。\n"
+        "不要输出中文，不要解释说明。"
+    ),
+    # 本地 LLM 解析（chat_with_local_llm / eval_parsing）
+    "local": (
+        'You extract start and end landmarks from user navigation commands. '
+        'Return strict JSON: {{"start":"...", "end":"..."}} using ONLY these tokens: '
+        '{places}.'
+    ),
+    # 私有数据集批量生成（gen_private_json_outputs）
+    "eval": (
+        'You are an autonomous driving voice assistant. Extract ONLY start and end. '
+        'Output STRICT JSON: {{"start":"...","end":"..."}}. '
+        'Allowed places (MUST choose from, output in English): '
+        '{places}. '
+        'Do NOT output Chinese. Do NOT add explanations.'
+    ),
+    # 多条打包解析（packed_parse）：一次请求解析 N 条编号指令
+    "packed": (
+        'You extract start and end landmarks from numbered navigation commands. '
+        'Return ONLY a JSON array with one object per command, in the same order: '
+        '[{{"id":1,"start":"...","end":"..."}}, ...]. '
+        'Use ONLY these tokens: {places}. Do NOT add explanations.'
+    ),
+    # 延迟压测（bench_latency）
+    "bench": 'Output JSON only: {{"start":"...","end":"..."}} Allowed: {places}.',
+}
+
+
+class Landmark(NamedTuple):
+    id: str
+    spawn_index: Optional[int]    # None 表示地图上没有对应 spawn 点（只用于解析）
+    aliases: tuple
+
+
+class LandmarkCatalog:
+    def __init__(self, landmarks: Iterable[Landmark], map_name: Optional[str] = None):
+        self.landmarks: Dict[str, Landmark] = {lm.id: lm for lm in landmarks}
+        self.map_name = map_name
+        self.ids = tuple(self.landmarks)
+        self.allowed = frozenset(self.ids)
+        self.whitelist_fp = whitelist_fingerprint(self.allowed)
+
+        # 别名 -> 规范名（保留原写法，供 UI/评测直接 .get）
+        self.alias_map: Dict[str, str] = {}
+        for lm in self.landmarks.values():
+            for alias in lm.aliases:
+                self.alias_map.setdefault(alias, lm.id)
+
+        self.matcher = AliasMatcher(self.alias_map)
+        self.table = self.matcher.table            # 小写别名/规范名 -> 规范名
+        for lm_id in self.ids:                     # 没有别名的地名（cottageArea）也能查回自己
+            self.table.setdefault(lm_id.lower(), lm_id)
+        self.phonetic_index = PhoneticIndex(self.alias_map)
+
+        self.bits = {lm_id: 1 << i for i, lm_id in enumerate(self.ids)}
+        self.all_mask = (1 << len(self.ids)) - 1
+        self.spawn_indices = {lm.id: lm.spawn_index for lm in self.landmarks.values()
+                              if lm.spawn_index is not None}
+
+        self._lock = threading.Lock()
+        self._prompts: Dict[str, str] = {}
+        self._constraints: Dict[str, dict] = {}
+        self._transforms: Dict[object, Dict[str, object]] = {}
+
+    @classmethod
+    def load(cls, path: str = DEFAULT_PATH) -> "LandmarkCatalog":
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        landmarks = [Landmark(x["id"], x.get("spawn_index"), tuple(x.get("aliases", ())))
+                     for x in data["landmarks"]]
+        return cls(landmarks, data.get("map"))
+
+    def __contains__(self, name):
+        return name in self.allowed
+
+    def __len__(self):
+        return len(self.ids)
+
+    # ---------- 查询 ----------
+    def lookup(self, name: Optional[str]) -> Optional[str]:
+        """别名/规范名（不区分大小写）-> 规范名；查不到返回 None。"""
+        if not name:
+            return None
+        return self.table.get(name.strip().lower())
+
+    def mask(self, names: Iterable[str]) -> int:
+        """地名集合的白名单位掩码；含有不在白名单里的名字时返回 0。"""
+        m = 0
+        for name in names:
+            bit = self.bits.get(name)
+            if bit is None:
+                return 0
+            m |= bit
+        return m
+
+    def is_valid_route(self, start: Optional[str], end: Optional[str]) -> bool:
+        """起终点都在白名单内且不相同。"""
+        a, b = self.bits.get(start, 0), self.bits.get(end, 0)
+        return bool(a and b and a != b)
+
+    def routable(self, start: Optional[str], end: Optional[str]) -> bool:
+        """合法路线且起终点在地图上都有 spawn 点（highspeed 这类只用于解析的地名不能导航）。"""
+        return (self.is_valid_route(start, end)
+                and start in self.spawn_indices and end in self.spawn_indices)
+
+    # ---------- 提示词 / 约束 ----------
+    def places_text(self, sep: str = ", ") -> str:
+        return sep.join(self.ids)
+
+    def system_prompt(self, kind: str) -> str:
+        prompt = self._prompts.get(kind)
+        if prompt is None:
+            prompt = PROMPT_TEMPLATES[kind].format(places=self.places_text())
+            self._prompts[kind] = prompt
+        return prompt
+
+    def prompt_version(self, kind: str, *extra: str) -> str:
+        return prompt_version(self.system_prompt(kind), *extra)
+
+    def constraint_params(self, mode: Optional[str]) -> dict:
+        """本地约束解码参数（GBNF/JSON Schema），每种模式只生成一次。"""
+        key = mode or "none"
+        params = self._constraints.get(key)
+        if params is None:
+            params = constraint_params(mode, self.ids)
+            self._constraints[key] = params
+        # 调用方会把结果合并进请求体，给一份浅拷贝
+        return dict(params)
+
+    # ---------- CARLA ----------
+    def transforms(self, world) -> Dict[str, object]:
+        """
+        地名 -> spawn 点 Transform。按 world 缓存：get_map()/get_spawn_points()
+        只在第一次调用时执行，之后都是字典查询。
+        """
+        key = getattr(world, "id", None) or id(world)
+        with self._lock:
+            cached = self._transforms.get(key)
+        if cached is None:
+            spawn_points = world.get_map().get_spawn_points()
+            need = max(self.spawn_indices.values()) + 1
+            if len(spawn_points) < need:
+                raise ValueError(
+                    f"the number of spawn_points is insufficient ({len(spawn_points)} < {need}), "
+                    f"please switch to {self.map_name or 'the expected map'} or check the map content.")
+            cached = {name: spawn_points[idx] for name, idx in self.spawn_indices.items()}
+            with self._lock:
+                self._transforms[key] = cached
+        return dict(cached)
+
+    def forget_world(self, world=None):
+        """切换地图/重连后清掉 Transform 缓存。"""
+        with self._lock:
+            if world is None:
+                self._transforms.clear()
+            else:
+                self._transforms.pop(getattr(world, "id", None) or id(world), None)
+
+
+_catalog = None
+_catalog_lock = threading.Lock()
+
+
+def get_catalog() -> LandmarkCatalog:
+    """进程内唯一的目录实例；路径可用环境变量 LANDMARK_CATALOG 覆盖。"""
+    global _catalog
+    with _catalog_lock:
+        if _catalog is None:
+            _catalog = LandmarkCatalog.load(os.getenv("LANDMARK_CATALOG") or DEFAULT_PATH)
+        return _catalog
@@ -0,0 +1,190 @@
+# llm_client.py
+#
+# 可复用的 OpenAI 兼容 chat/completions 客户端：
+# - requests.Session + 连接池，keep-alive 复用 TCP/TLS 连接
+# - 连接/读取分开超时，卡死的服务不会把 UI 挂住
+# - 有上限的重试 + 指数退避抖动（只针对连接错误、429、5xx）
+# - preconnect()：在真正发请求前预先握手
+# - stream_chat()：SSE 流式读取，拿到合格的 JSON 就提前断开
+# 线上 UI 与各评测脚本通过 get_client() 共享同一个实例。
+
+import json
+import random
+import threading
+import time
+from collections import deque
+from typing import Any, Callable, Dict, List, NamedTuple, Optional, Tuple
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from nlp.json_stream import JsonObjectScanner
+
+RETRY_STATUS = {429, 500, 502, 503, 504}
+
+
+class StreamResult(NamedTuple):
+    obj: Optional[Dict[str, Any]]   # 第一个被 accept 的 JSON 对象（没有则为 None）
+    text: str                       # 截至断开时收到的全部文本
+    ttft_s: Optional[float]         # 首个 token 到达时间
+    json_s: Optional[float]         # 合格 JSON 到达时间
+    total_s: float
+    early_exit: bool                # 是否在生成结束前主动断开
+
+
+class ParserClient:
+    def __init__(self, base_url: str, api_key: Optional[str] = None,
+                 connect_timeout: float = 3.05, read_timeout: float = 30.0,
+                 max_retries: int = 2, backoff: float = 0.25, pool_size: int = 8):
+        self.base_url = base_url.rstrip("/")
+        self.api_key = api_key
+        self.timeout = (connect_timeout, read_timeout)
+        self.max_retries = max_retries
+        self.backoff = backoff
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=2, pool_maxsize=pool_size, max_retries=0)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self.session.headers.update({"Content-Type": "application/json", "Connection": "keep-alive"})
+        if api_key:
+            self.session.headers["Authorization"] = f"Bearer {api_key}"
+
+        # 每次调用的耗时记录：ttft_s / json_s / total_s
+        self.timings = deque(maxlen=1000)
+
+    @property
+    def chat_url(self) -> str:
+        # 兼容 base_url 带或不带 /v1 两种写法
+        if self.base_url.endswith("/v1"):
+            return self.base_url + "/chat/completions"
+        return self.base_url + "/v1/chat/completions"
+
+    def _sleep_before_retry(self, attempt: int):
+        delay = self.backoff * (2 ** attempt)
+        time.sleep(delay * random.uniform(0.5, 1.5))
+
+    def post(self, url: str, payload: Dict[str, Any], **kwargs) -> requests.Response:
+        """带重试的 POST；重试耗尽后，状态码错误抛 HTTPError，网络错误原样抛出。"""
+        kwargs.setdefault("timeout", self.timeout)
+        for attempt in range(self.max_retries + 1):
+            last = attempt == self.max_retries
+            try:
+                resp = self.session.post(url, json=payload, **kwargs)
+            except (requests.ConnectionError, requests.Timeout):
+                if last:
+                    raise
+                self._sleep_before_retry(attempt)
+                continue
+            if resp.status_code in RETRY_STATUS and not last:
+                resp.close()
+                self._sleep_before_retry(attempt)
+                continue
+            resp.raise_for_status()
+            return resp
+
+    def chat_completion(self, payload: Dict[str, Any]) -> Dict[str, Any]:
+        t0 = time.perf_counter()
+        result = self.post(self.chat_url, payload).json()
+        # 非流式：首 token 与 JSON 都要等到整段返回
+        total = time.perf_counter() - t0
+        self.timings.append({"stream": False, "ttft_s": total, "json_s": total,
+                             "total_s": total, "early_exit": False})
+        return result
+
+    def stream_chat(self, payload: Dict[str, Any],
+                    accept: Optional[Callable[[Dict[str, Any]], bool]] = None,
+                    cancel: Optional[threading.Event] = None,
+                    stop_on_accept: bool = True) -> StreamResult:
+        """
+        以 SSE 流式请求 chat/completions，边收边用 JsonObjectScanner 找 JSON。
+        第一个满足 accept(obj) 的对象出现时立即关闭连接，后面的“解释说明”不再等待。
+        cancel 被置位时也会提前断开（obj 为 None）。
+        stop_on_accept=False 时只记录 JSON 到达时间，仍读完整段生成（用于测速）。
+        """
+        accept = accept or (lambda obj: True)
+        payload = dict(payload, stream=True)
+        scanner = JsonObjectScanner()
+        ttft = json_s = None
+        obj = None
+        early = False
+
+        t0 = time.perf_counter()
+        resp = self.post(self.chat_url, payload, stream=True)
+        try:
+            for line in resp.iter_lines(chunk_size=None):
+                if cancel is not None and cancel.is_set():
+                    early = True
+                    break
+                if not line or not line.startswith(b"data:"):
+                    continue
+                data = line[5:].strip()
+                if data == b"[DONE]":
+                    break
+                try:
+                    choice = json.loads(data)["choices"][0]
+                except (ValueError, KeyError, IndexError):
+                    continue
+                delta = (choice.get("delta") or {}).get("content") or ""
+                if not delta:
+                    continue
+                if ttft is None:
+                    ttft = time.perf_counter() - t0
+                for cand in scanner.feed(delta):
+                    if obj is None and accept(cand):
+                        obj = cand
+                        json_s = time.perf_counter() - t0
+                        break
+                if obj is not None and stop_on_accept:
+                    early = choice.get("finish_reason") is None
+                    break
+        finally:
+            resp.close()
+
+        total = time.perf_counter() - t0
+        self.timings.append({"stream": True, "ttft_s": ttft, "json_s": json_s,
+                             "total_s": total, "early_exit": early})
+        return StreamResult(obj, scanner.text, ttft, json_s, total, early)
+
+    def chat(self, messages: List[Dict[str, str]], model: str, **params) -> str:
+        payload = {"model": model, "messages": messages}
+        payload.update(params)
+        result = self.chat_completion(payload)
+        return result["choices"][0]["message"]["content"]
+
+    def preconnect(self, background: bool = True):
+        """
+        预连接钩子：提前完成 TCP/TLS 握手并把连接放回池里，
+        之后真正的解析请求可以直接复用。失败时静默忽略。
+        """
+        def _run():
+            try:
+                self.session.head(self.base_url, timeout=self.timeout[0], allow_redirects=False).close()
+            except requests.RequestException:
+                pass
+
+        if background:
+            threading.Thread(target=_run, daemon=True).start()
+        else:
+            _run()
+
+    def close(self):
+        self.session.close()
+
+
+_clients: Dict[Tuple, ParserClient] = {}
+_clients_lock = threading.Lock()
+
+
+def get_client(base_url: str, api_key: Optional[str] = None, **kwargs) -> ParserClient:
+    """
+    按 (base_url, api_key, 超时/连接池等参数) 复用客户端：同一服务同一配置只有一个连接池，
+    参数不同（如本地服务的 read_timeout、压测的 pool_size）各自一个实例，不会被先来的调用方覆盖。
+    """
+    key = (base_url.rstrip("/"), api_key, tuple(sorted(kwargs.items())))
+    with _clients_lock:
+        client = _clients.get(key)
+        if client is None:
+            client = ParserClient(base_url, api_key=api_key, **kwargs)
+            _clients[key] = client
+        return client
@@ -0,0 +1,111 @@
+# local_prefix.py
+#
+# 本地 llama.cpp 的提示词前缀 KV 复用。
+# 每次本地解析的 system prompt（白名单 + 说明）都一样，CPU 上 prefill 占了大头。
+# 做法：
+# - 提示词字节保持稳定（来自 LandmarkCatalog 的缓存字符串，消息顺序固定）
+# - 请求带 cache_prompt=true，并按“槽位池”固定 id_slot：每个槽位的 KV 里都留着同一段前缀，
+#   并发请求各占一个槽位，不会互相把前缀挤掉
+# - 启动时对每个槽位发一次 max_tokens=1 的预热请求
+# - 从响应里读出本次复用了多少 prompt token（timings.cache_n 或 usage.prompt_tokens_details）
+
+import queue
+import threading
+from typing import Any, Dict, NamedTuple, Optional
+
+
+class PrefillInfo(NamedTuple):
+    prompt_tokens: int     # 本次请求的 prompt 总 token 数
+    cached_tokens: int     # 其中直接复用 KV 缓存、没有重新计算的部分
+
+
+def read_prefill(result: Dict[str, Any]) -> Optional[PrefillInfo]:
+    """
+    从 chat/completions 响应里取 prefill 统计：
+    - llama.cpp：timings.prompt_n（实际计算的）+ timings.cache_n（复用的）
+    - OpenAI 兼容：usage.prompt_tokens + prompt_tokens_details.cached_tokens
+    - DeepSeek：usage.prompt_cache_hit_tokens
+    服务端没给时返回 None。
+    """
+    timings = result.get("timings") or {}
+    if "prompt_n" in timings:
+        cached = int(timings.get("cache_n") or 0)
+        return PrefillInfo(int(timings["prompt_n"]) + cached, cached)
+    usage = result.get("usage") or {}
+    if "prompt_tokens" in usage:
+        details = usage.get("prompt_tokens_details") or {}
+        cached = details.get("cached_tokens")
+        if cached is None:
+            cached = usage.get("prompt_cache_hit_tokens", 0)
+        return PrefillInfo(int(usage["prompt_tokens"]), int(cached or 0))
+    return None
+
+
+class PrefixStats:
+    """累计 prefill 复用情况，供评测脚本/日志汇报。"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.reported = 0          # 服务端给出了 prefill 统计的调用数
+        self.prompt_tokens = 0
+        self.cached_tokens = 0
+
+    def reset(self):
+        with self._lock:
+            self.calls = self.reported = self.prompt_tokens = self.cached_tokens = 0
+
+    def record(self, info: Optional[PrefillInfo]):
+        with self._lock:
+            self.calls += 1
+            if info is None:
+                return
+            self.reported += 1
+            self.prompt_tokens += info.prompt_tokens
+            self.cached_tokens += info.cached_tokens
+
+    def summary(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "calls": self.calls,
+                "reported": self.reported,
+                "prompt_tokens": self.prompt_tokens,
+                "cached_tokens": self.cached_tokens,
+                "saved_per_call": round(self.cached_tokens / self.reported, 1) if self.reported else None,
+                "saved_ratio": round(self.cached_tokens / self.prompt_tokens, 4) if self.prompt_tokens else 0.0,
+            }
+
+
+class SlotPool:
+    """
+    llama.cpp 的槽位池（与 server 的 -np 一致）。每个请求借一个空闲槽位，用完归还；
+    同一段前缀在每个槽位里都保留着，借到哪个都能命中。
+    n_slots <= 0 时不指定槽位，交给服务端按提示词相似度挑。
+    """
+
+    def __init__(self, n_slots: int, wait_s: float = 5.0):
+        self.n_slots = max(n_slots, 0)
+        self.wait_s = wait_s
+        self._free = queue.Queue()
+        for i in range(self.n_slots):
+            self._free.put(i)
+
+    def acquire(self) -> int:
+        if not self.n_slots:
+            return -1
+        try:
+            return self._free.get(timeout=self.wait_s)
+        except queue.Empty:
+            return -1     # 全忙：不指定槽位，服务端自己挑一个
+
+    def release(self, slot: int):
+        if slot >= 0:
+            self._free.put(slot)
+
+
+def prefix_params(slot: int, cache_prompt: bool = True) -> Dict[str, Any]:
+    """需要合并进请求体的 llama.cpp 字段。"""
+    params: Dict[str, Any] = {"cache_prompt": bool(cache_prompt)}
+    if slot >= 0:
+        params["id_slot"] = slot
+    return params
@@ -0,0 +1,275 @@
+# ngram_classifier.py
+#
+# 离线字符 n-gram 起终点分类器：不需要任何服务，进程内 NumPy 打分。
+# - 特征：小写文本加首尾标记后的 1..4 字符 n-gram，crc32 哈希到 2^14 维，IDF 加权后 L2 归一化
+# - 模型：起点、终点各一个线性分类头（平均感知机训练，权重矩阵 C × 2^14）
+# - 训练数据：别名模板扩增 + evaluation/dataset/prompts.jsonl（带标注，可选）
+#   + evaluation/prompts/mybiz_100.jsonl（规则解析高置信度的弱标注）
+# - 产物：一个 .npz（float16 权重 + idf），毫秒级加载；批量打分每秒上万条
+# 注意：prompts.jsonl 同时也是 eval_parsing 的评测集，默认不参与训练（--include_dataset 才加）；
+# 用它训练过的模型会在 .npz 里打标记，eval_parsing 拒绝拿来评测。
+
+import argparse
+import json
+import os
+import random
+import re
+import threading
+import zlib
+from typing import Dict, Iterable, List, NamedTuple, Optional, Sequence, Tuple
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_PATH = os.path.join(ROOT, "out", "ngram_classifier.npz")
+DATASET_PATH = os.path.join(ROOT, "evaluation", "dataset", "prompts.jsonl")
+MYBIZ_PATH = os.path.join(ROOT, "evaluation", "prompts", "mybiz_100.jsonl")
+
+DIM = 1 << 14
+N_MIN, N_MAX = 1, 4
+# softmax 温度：打分差 0.1 大约对应 e 倍的概率比
+TEMPERATURE = 10.0
+EPOCHS = 15
+
+ZH_TEMPLATES = (
+    "从{s}去{e}", "从{s}到{e}", "{s}到{e}", "从{s}出发去{e}", "带我去{e}，从{s}出发",
+    "去{e}，从{s}走", "我在{s}，去{e}", "嗯…去下{e}吧，我在{s}", "从{s}回{e}",
+)
+EN_TEMPLATES = (
+    "go to {e} from {s}", "{e} from {s}", "{s} to {e}", "from {s} to {e}",
+    "take me to {e}, i'm at {s}", "drive from {s} to {e}", "i am at {s}, go to {e}",
+)
+
+
+class NgramParse(NamedTuple):
+    start: Optional[str]
+    end: Optional[str]
+    confidence: float        # 起点置信度 × 终点置信度
+    start_conf: float
+    end_conf: float
+
+
+def ngram_ids(text: str, dim: int = DIM, n_min: int = N_MIN, n_max: int = N_MAX) -> np.ndarray:
+    """文本 -> 去重后的哈希 n-gram 下标（int64）。"""
+    t = "^" + " ".join((text or "").lower().split()) + "$"
+    ids = set()
+    for n in range(n_min, n_max + 1):
+        for i in range(len(t) - n + 1):
+            ids.add(zlib.crc32(t[i:i + n].encode("utf-8")) & (dim - 1))
+    return np.fromiter(ids, dtype=np.int64, count=len(ids))
+
+
+def _surface_forms(catalog) -> dict:
+    """地名 -> 可用于模板的写法：别名 + 规范名 + 驼峰拆开的英文（cottageArea -> cottage area）。"""
+    forms = {lm_id: set() for lm_id in catalog.ids}
+    for alias, lm_id in catalog.alias_map.items():
+        forms[lm_id].add(alias)
+    for lm_id in catalog.ids:
+        forms[lm_id].add(lm_id)
+        forms[lm_id].add(re.sub(r"(?<=[a-z])(?=[A-Z])", " ", lm_id).lower())
+    return {k: sorted(v) for k, v in forms.items()}
+
+
+def template_examples(catalog, per_pair: int = 12, seed: int = 0) -> List[Tuple[str, str, str]]:
+    """别名 × 模板扩增出 (text, start, end)；每个有序地名对采样 per_pair 条。"""
+    rng = random.Random(seed)
+    forms = _surface_forms(catalog)
+    is_zh = lambda w: any("一" <= ch <= "鿿" for ch in w)
+    zh_forms = {k: [w for w in v if is_zh(w)] or v for k, v in forms.items()}   # 没有中文别名时用英文名
+    en_forms = {k: [w for w in v if not is_zh(w)] for k, v in forms.items()}
+    out = []
+    for s in catalog.ids:
+        for e in catalog.ids:
+            if s == e:
+                continue
+            for i in range(per_pair):
+                # 中英文句式各占一半
+                table, templates = (zh_forms, ZH_TEMPLATES) if i % 2 == 0 else (en_forms, EN_TEMPLATES)
+                fs, fe = rng.choice(table[s]), rng.choice(table[e])
+                out.append((rng.choice(templates).format(s=fs, e=fe), s, e))
+    return out
+
+
+def dataset_examples(path: str = DATASET_PATH) -> List[Tuple[str, str, str]]:
+    if not os.path.exists(path):
+        return []
+    with open(path, "r", encoding="utf-8") as f:
+        rows = [json.loads(x) for x in f if x.strip()]
+    return [(r["text"], r["gold_start"], r["gold_end"]) for r in rows]
+
+
+def weak_examples(path: str = MYBIZ_PATH, min_conf: float = 0.8) -> List[Tuple[str, str, str]]:
+    """没有标注的数据：只收规则解析高置信度的结果作为弱标注。"""
+    from nlp.rule_parser import rule_parse
+    if not os.path.exists(path):
+        return []
+    out = []
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            if not line.strip():
+                continue
+            text = json.loads(line)["prompt"]
+            res = rule_parse(text)
+            if res.confidence >= min_conf:
+                out.append((text, res.start, res.end))
+    return out
+
+
+class NgramClassifier:
+    def __init__(self, classes: Sequence[str], w_start: np.ndarray, w_end: np.ndarray, idf: np.ndarray,
+                 n_min: int = N_MIN, n_max: int = N_MAX, trained_on_dataset: bool = False):
+        self.classes = list(classes)
+        self.w_start = np.asarray(w_start, dtype=np.float32)   # (C, DIM)
+        self.w_end = np.asarray(w_end, dtype=np.float32)
+        self.idf = np.asarray(idf, dtype=np.float32)           # (DIM,)
+        self.dim = self.idf.shape[0]
+        self.n_min, self.n_max = n_min, n_max
+        self.trained_on_dataset = trained_on_dataset
+
+    # ---------- 训练 ----------
+    @staticmethod
+    def _perceptron(feats, labels, n_classes, dim, epochs, seed):
+        """平均感知机：只在稀疏命中的列上更新，返回平均后的权重。"""
+        w = np.zeros((n_classes, dim))
+        acc = np.zeros((n_classes, dim))    # 按时间步加权的累计更新，用于求平均
+        step = 1
+        order = list(range(len(feats)))
+        rng = random.Random(seed)
+        for _ in range(epochs):
+            rng.shuffle(order)
+            for k in order:
+                ids, vals = feats[k]
+                y = labels[k]
+                pred = int((w[:, ids] @ vals).argmax())
+                if pred != y:
+                    w[y, ids] += vals
+                    w[pred, ids] -= vals
+                    acc[y, ids] += step * vals
+                    acc[pred, ids] -= step * vals
+                step += 1
+        return w - acc / step
+
+    @classmethod
+    def train(cls, examples: Iterable[Tuple[str, str, str]], classes: Sequence[str],
+              dim: int = DIM, n_min: int = N_MIN, n_max: int = N_MAX,
+              epochs: int = EPOCHS, seed: int = 0) -> "NgramClassifier":
+        examples = [(t, s, e) for t, s, e in examples if s in classes and e in classes]
+        index = {c: i for i, c in enumerate(classes)}
+        ids_list = [ngram_ids(t, dim, n_min, n_max) for t, _, _ in examples]
+
+        df = np.zeros(dim, dtype=np.float64)
+        for ids in ids_list:
+            df[ids] += 1
+        idf = np.log((1 + len(ids_list)) / (1 + df)) + 1.0
+        feats = [(ids, idf[ids] / np.linalg.norm(idf[ids])) for ids in ids_list]
+
+        w_start = cls._perceptron(feats, [index[s] for _, s, _ in examples], len(classes), dim, epochs, seed)
+        w_end = cls._perceptron(feats, [index[e] for _, _, e in examples], len(classes), dim, epochs, seed)
+        return cls(classes, w_start, w_end, idf, n_min, n_max)
+
+    # ---------- 持久化 ----------
+    def save(self, path: str = DEFAULT_PATH):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        np.savez_compressed(path, classes=np.array(self.classes), w_start=self.w_start.astype(np.float16),
+                            w_end=self.w_end.astype(np.float16), idf=self.idf.astype(np.float16),
+                            ngram=np.array([self.n_min, self.n_max]), dataset=np.array(self.trained_on_dataset))
+
+    @classmethod
+    def load(cls, path: str = DEFAULT_PATH) -> "NgramClassifier":
+        with np.load(path) as z:
+            n_min, n_max = (int(x) for x in z["ngram"])
+            # 旧产物没有标记，当时默认带评测集训练，按“用过”处理
+            dataset = bool(z["dataset"]) if "dataset" in z.files else True
+            return cls([str(c) for c in z["classes"]], z["w_start"], z["w_end"], z["idf"], n_min, n_max, dataset)
+
+    # ---------- 推理 ----------
+    def _softmax(self, scores: np.ndarray) -> np.ndarray:
+        z = (scores - scores.max(axis=0, keepdims=True)) * TEMPERATURE
+        p = np.exp(z)
+        return p / p.sum(axis=0, keepdims=True)
+
+    def scores(self, texts: Sequence[str]) -> Tuple[np.ndarray, np.ndarray]:
+        """批量打分：返回起点/终点两个 (C, len(texts)) 的线性得分矩阵。"""
+        if not texts:
+            z = np.zeros((len(self.classes), 0), dtype=np.float32)
+            return z, z
+        # 每条文本至少有首尾标记的 n-gram，不会出现空特征
+        feats = [ngram_ids(t, self.dim, self.n_min, self.n_max) for t in texts]
+        lengths = np.array([len(f) for f in feats])
+        ids = np.concatenate(feats)
+        offsets = np.concatenate(([0], np.cumsum(lengths)[:-1]))
+        vals = self.idf[ids]
+        norms = np.sqrt(np.add.reduceat(vals * vals, offsets))
+        vals = vals / np.repeat(norms, lengths)
+
+        # 稀疏向量 · 权重：取出命中的列加权求和，再按文本分段累加
+        s_start = np.add.reduceat(self.w_start[:, ids] * vals, offsets, axis=1)
+        s_end = np.add.reduceat(self.w_end[:, ids] * vals, offsets, axis=1)
+        return s_start, s_end
+
+    def predict_many(self, texts: Sequence[str]) -> List[NgramParse]:
+        s_scores, e_scores = self.scores(texts)
+        p_start, p_end = self._softmax(s_scores), self._softmax(e_scores)
+        res = []
+        for j in range(len(texts)):
+            si, ei = int(p_start[:, j].argmax()), int(p_end[:, j].argmax())
+            if si == ei:
+                # 起终点撞车：置信度较低的一头退而取次优
+                if p_start[si, j] >= p_end[ei, j]:
+                    ei = int(np.argsort(p_end[:, j])[-2])
+                else:
+                    si = int(np.argsort(p_start[:, j])[-2])
+            cs, ce = float(p_start[si, j]), float(p_end[ei, j])
+            res.append(NgramParse(self.classes[si], self.classes[ei], round(cs * ce, 4), round(cs, 4), round(ce, 4)))
+        return res
+
+    def predict(self, text: str) -> NgramParse:
+        return self.predict_many([text])[0]
+
+
+def train_default(include_dataset: bool = False, per_pair: int = 12, seed: int = 0) -> NgramClassifier:
+    from nlp.landmark_catalog import get_catalog
+    catalog = get_catalog()
+    examples = template_examples(catalog, per_pair, seed) + weak_examples()
+    if include_dataset:
+        examples += dataset_examples()
+    clf = NgramClassifier.train(examples, catalog.ids, seed=seed)
+    clf.trained_on_dataset = include_dataset
+    return clf
+
+
+_models: Dict[str, NgramClassifier] = {}
+_models_lock = threading.Lock()
+
+
+def get_ngram_classifier(path: Optional[str] = None) -> NgramClassifier:
+    """按路径缓存共享实例；产物不存在时现训一个（不含评测集）并落盘（约一秒）。"""
+    path = os.path.abspath(path or os.getenv("NGRAM_MODEL_PATH", DEFAULT_PATH))
+    with _models_lock:
+        clf = _models.get(path)
+        if clf is None:
+            if os.path.exists(path):
+                clf = NgramClassifier.load(path)
+            else:
+                clf = train_default()
+                clf.save(path)
+            _models[path] = clf
+        return clf
+
+
+def main():
+    ap = argparse.ArgumentParser(description="训练字符 n-gram 起终点分类器并保存为 .npz")
+    ap.add_argument("--out", default=DEFAULT_PATH)
+    ap.add_argument("--per_pair", type=int, default=12, help="每个有序地名对生成的模板样本数")
+    ap.add_argument("--include_dataset", action="store_true",
+                    help="把 evaluation/dataset/prompts.jsonl 也加进训练（部署用；这样的模型不能再跑 eval_parsing）")
+    ap.add_argument("--seed", type=int, default=0)
+    args = ap.parse_args()
+
+    clf = train_default(include_dataset=args.include_dataset, per_pair=args.per_pair, seed=args.seed)
+    clf.save(args.out)
+    print(f"saved {args.out} ({os.path.getsize(args.out) / 1024:.1f} KiB, {len(clf.classes)} classes)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,171 @@
+# packed_parse.py
+#
+# 打包解析：把 N 条编号指令塞进一次 chat/completions，让模型返回 JSON 数组，
+# 再按编号拆回每一条。批量评测 / 重跑历史日志时，system prompt 只发一次，
+# 请求数和 prompt token 都约降到 1/N。
+# 数组里缺失、越界、地名不在白名单的条目，自动退回单条请求重做。
+
+import asyncio
+import json
+import re
+import threading
+import time
+from typing import Any, Callable, Dict, List, NamedTuple, Optional, Sequence, Tuple
+
+from nlp.instruction_parser import CATALOG, normalize_place_name, parse_many
+
+# 打包请求：(messages, 条数) -> 模型原始输出文本
+PackedChat = Callable[[List[Dict[str, str]], int], str]
+# 单条兜底：text -> (解析结果 dict 或 None, 原始输出文本)
+SingleParse = Callable[[str], Tuple[Optional[Dict[str, Any]], str]]
+
+_ARRAY = re.compile(r"\[.*\]", re.DOTALL)
+
+# 每条结果大约需要的输出 token（{"id":12,"start":"officeParking","end":"shoppingMall"}）
+TOKENS_PER_ITEM = 32
+
+
+class PackedItem(NamedTuple):
+    obj: Optional[Dict[str, str]]   # {"start", "end"}，拿不到时为 None
+    raw: str                        # 这一条对应的原始输出（打包时为数组里的那个元素）
+    packed: bool                    # True：来自打包请求；False：走了单条兜底
+    latency_s: float                # 打包请求按条数均摊后的耗时
+
+
+def build_packed_messages(texts: Sequence[str]) -> List[Dict[str, str]]:
+    numbered = "\n".join(f"{i}. {t.strip()}" for i, t in enumerate(texts, 1))
+    return [
+        {"role": "system", "content": CATALOG.system_prompt("packed")},
+        {"role": "user", "content": numbered},
+    ]
+
+
+def _valid(obj) -> bool:
+    if not isinstance(obj, dict):
+        return False
+    start, end = obj.get("start"), obj.get("end")
+    if not isinstance(start, str) or not isinstance(end, str):
+        return False
+    return CATALOG.mask((normalize_place_name(start), normalize_place_name(end))) != 0
+
+
+def split_packed_response(text: str, n: int) -> List[Optional[Dict[str, Any]]]:
+    """
+    把模型返回的 JSON 数组拆回 n 个位置。
+    元素带 id 时按 id（从 1 开始）归位；都不带 id 且个数正好为 n 时按顺序归位。
+    解析不了或不合法的位置为 None。
+    """
+    out: List[Optional[Dict[str, Any]]] = [None] * n
+    m = _ARRAY.search(text or "")
+    if not m:
+        return out
+    try:
+        arr = json.loads(m.group())
+    except ValueError:
+        return out
+    if not isinstance(arr, list):
+        return out
+
+    with_ids = [x for x in arr if isinstance(x, dict) and "id" in x]
+    if with_ids:
+        for x in with_ids:
+            try:
+                idx = int(x["id"]) - 1
+            except (TypeError, ValueError):
+                continue
+            if 0 <= idx < n and out[idx] is None and _valid(x):
+                out[idx] = x
+    elif len(arr) == n:
+        for i, x in enumerate(arr):
+            if _valid(x):
+                out[i] = x
+    return out
+
+
+class PackedParser:
+    """
+    chat_fn:   发一次打包请求，返回原始文本
+    single_fn: 单条兜底解析
+    pack_size: 每次请求打包的条数
+    """
+
+    def __init__(self, chat_fn: PackedChat, single_fn: SingleParse, pack_size: int = 10):
+        self.chat_fn = chat_fn
+        self.single_fn = single_fn
+        self.pack_size = max(pack_size, 1)
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.packed_items = 0
+        self.fallback_items = 0
+
+    def _count(self, requests=0, packed=0, fallback=0):
+        with self._lock:
+            self.requests += requests
+            self.packed_items += packed
+            self.fallback_items += fallback
+
+    def _single(self, text) -> PackedItem:
+        t0 = time.perf_counter()
+        try:
+            obj, raw = self.single_fn(text)
+        except Exception as e:
+            obj, raw = None, f"__ERROR__: {e}"
+        self._count(requests=1, fallback=1)
+        obj = {"start": str(obj["start"]), "end": str(obj["end"])} if _valid(obj) else None
+        return PackedItem(obj, raw, False, time.perf_counter() - t0)
+
+    def parse_chunk(self, texts: Sequence[str]) -> List[PackedItem]:
+        t0 = time.perf_counter()
+        try:
+            raw = self.chat_fn(build_packed_messages(texts), len(texts))
+        except Exception as e:
+            print(f"[PACK] packed request failed ({len(texts)} items): {e}")
+            raw = ""
+        self._count(requests=1)
+        share = (time.perf_counter() - t0) / len(texts)
+
+        items = []
+        for text, obj in zip(texts, split_packed_response(raw, len(texts))):
+            if obj is None:
+                items.append(self._single(text))
+                continue
+            self._count(packed=1)
+            items.append(PackedItem({"start": str(obj["start"]), "end": str(obj["end"])},
+                                    json.dumps(obj, ensure_ascii=False), True, share))
+        return items
+
+    def parse_all(self, texts: Sequence[str], concurrency: int = 1, timeout: float = 120.0) -> List[PackedItem]:
+        """按 pack_size 切块；concurrency > 1 时多个打包请求并发（走 parse_many）。"""
+        chunks = [list(texts[i:i + self.pack_size]) for i in range(0, len(texts), self.pack_size)]
+        if concurrency > 1 and len(chunks) > 1:
+            results = asyncio.run(parse_many(chunks, parse_fn=self.parse_chunk,
+                                             concurrency=concurrency, timeout=timeout))
+        else:
+            results = [self.parse_chunk(c) for c in chunks]
+
+        out: List[PackedItem] = []
+        for chunk, res in zip(chunks, results):
+            if isinstance(res, Exception):
+                # 整块超时/出错：逐条兜底
+                res = [self._single(t) for t in chunk]
+            out.extend(res)
+        return out
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            total = self.packed_items + self.fallback_items
+            return {
+                "requests": self.requests,
+                "items": total,
+                "packed_items": self.packed_items,
+                "fallback_items": self.fallback_items,
+                "items_per_request": round(total / self.requests, 2) if self.requests else None,
+            }
+
+
+def client_chat_fn(client, model: str, temperature: float = 0.0, **params) -> PackedChat:
+    """用 ParserClient 发打包请求；max_tokens 随条数放大。"""
+    def chat(messages, n):
+        return client.chat(messages, model=model, temperature=temperature,
+                           max_tokens=TOKENS_PER_ITEM * n + 16, **params)
+    return chat
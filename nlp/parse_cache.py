@@ -0,0 +1,187 @@
+# parse_cache.py
+#
+# LLM 解析结果的两级缓存：进程内 LRU + SQLite 持久化。
+# 键 = 归一化后的话语 + 模型 + 提示词版本 + 温度 + 地名白名单指纹，
+# 白名单一变，旧结果自然失效（也可以调用 purge_whitelist 立即清掉）。
+
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from functools import lru_cache
+from typing import Any, Iterable, NamedTuple, Optional
+
+DEFAULT_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "out", "parse_cache.sqlite3")
+
+_PUNCT = re.compile(r"[\s。，,.!！?？、;；:：\"'“”‘’]+$")
+_SPACES = re.compile(r"\s+")
+
+
+def normalize_utterance(text: str) -> str:
+    """全角转半角、小写、合并空白、去掉句末标点，让同一句话的不同写法命中同一个键。"""
+    t = unicodedata.normalize("NFKC", text or "").strip().lower()
+    t = _SPACES.sub(" ", t)
+    return _PUNCT.sub("", t)
+
+
+def prompt_version(*parts: str) -> str:
+    """提示词内容的短指纹，提示词一改缓存键就跟着变。"""
+    return hashlib.sha1("\x00".join(parts).encode("utf-8")).hexdigest()[:12]
+
+
+def whitelist_fingerprint(whitelist: Iterable[str]) -> str:
+    if isinstance(whitelist, frozenset):
+        # 目录里的白名单是 frozenset，指纹算一次即可
+        return _frozen_fingerprint(whitelist)
+    return hashlib.sha1(",".join(sorted(whitelist)).encode("utf-8")).hexdigest()[:12]
+
+
+@lru_cache(maxsize=32)
+def _frozen_fingerprint(whitelist: frozenset) -> str:
+    return hashlib.sha1(",".join(sorted(whitelist)).encode("utf-8")).hexdigest()[:12]
+
+
+class CacheKey(NamedTuple):
+    digest: str
+    whitelist_fp: str
+
+
+class ParseCache:
+    def __init__(self, path: Optional[str] = DEFAULT_PATH, max_memory: int = 256,
+                 max_disk: int = 20000, ttl_s: float = 7 * 24 * 3600):
+        self.max_memory = max_memory
+        self.max_disk = max_disk
+        self.ttl_s = ttl_s
+        self._mem: "OrderedDict[str, tuple]" = OrderedDict()   # digest -> (created, value)
+        self._lock = threading.Lock()
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+        self._db = None
+        if path:
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+            self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS parse_cache ("
+                " key TEXT PRIMARY KEY, whitelist TEXT, value TEXT,"
+                " created REAL, accessed REAL)"
+            )
+            self._db.execute("CREATE INDEX IF NOT EXISTS idx_parse_cache_accessed ON parse_cache(accessed)")
+            self._disk_count = self._db.execute("SELECT COUNT(*) FROM parse_cache").fetchone()[0]
+
+    # ---------- 键 ----------
+    @staticmethod
+    def make_key(utterance: str, model: str, prompt_ver: str, temperature: float,
+                 whitelist: Iterable[str] = ()) -> CacheKey:
+        wl = whitelist_fingerprint(whitelist)
+        raw = json.dumps([normalize_utterance(utterance), model, prompt_ver, round(float(temperature), 3), wl],
+                         ensure_ascii=False)
+        return CacheKey(hashlib.sha256(raw.encode("utf-8")).hexdigest(), wl)
+
+    # ---------- 读写 ----------
+    def get(self, key: CacheKey) -> Optional[Any]:
+        now = time.time()
+        with self._lock:
+            item = self._mem.get(key.digest)
+            if item is not None:
+                created, value = item
+                if now - created <= self.ttl_s:
+                    self._mem.move_to_end(key.digest)
+                    self.memory_hits += 1
+                    return value
+                del self._mem[key.digest]
+
+            if self._db is not None:
+                row = self._db.execute("SELECT value, created FROM parse_cache WHERE key=?",
+                                       (key.digest,)).fetchone()
+                if row is not None:
+                    if now - row[1] <= self.ttl_s:
+                        self._db.execute("UPDATE parse_cache SET accessed=? WHERE key=?", (now, key.digest))
+                        value = json.loads(row[0])
+                        self._remember(key.digest, row[1], value)
+                        self.disk_hits += 1
+                        return value
+                    self._db.execute("DELETE FROM parse_cache WHERE key=?", (key.digest,))
+                    self._disk_count -= 1
+
+            self.misses += 1
+            return None
+
+    def put(self, key: CacheKey, value: Any):
+        now = time.time()
+        with self._lock:
+            self._remember(key.digest, now, value)
+            if self._db is None:
+                return
+            existed = self._db.execute("SELECT 1 FROM parse_cache WHERE key=?", (key.digest,)).fetchone()
+            self._db.execute(
+                "INSERT OR REPLACE INTO parse_cache(key, whitelist, value, created, accessed) VALUES (?,?,?,?,?)",
+                (key.digest, key.whitelist_fp, json.dumps(value, ensure_ascii=False), now, now))
+            if existed is None:
+                self._disk_count += 1
+            if self._disk_count > self.max_disk:
+                self._evict_disk()
+
+    def _remember(self, digest, created, value):
+        self._mem[digest] = (created, value)
+        self._mem.move_to_end(digest)
+        while len(self._mem) > self.max_memory:
+            self._mem.popitem(last=False)
+
+    def _evict_disk(self):
+        # 淘汰最久未访问的 10%，避免每次写入都触发淘汰
+        n = self._disk_count - int(self.max_disk * 0.9)
+        self._db.execute(
+            "DELETE FROM parse_cache WHERE key IN (SELECT key FROM parse_cache ORDER BY accessed LIMIT ?)", (n,))
+        self._db.execute("DELETE FROM parse_cache WHERE created < ?", (time.time() - self.ttl_s,))
+        self._disk_count = self._db.execute("SELECT COUNT(*) FROM parse_cache").fetchone()[0]
+
+    # ---------- 失效 ----------
+    def purge_whitelist(self, whitelist: Iterable[str]):
+        """地名白名单变化后调用：删除所有不是用当前白名单生成的条目。"""
+        wl = whitelist_fingerprint(whitelist)
+        with self._lock:
+            self._mem.clear()
+            if self._db is not None:
+                self._db.execute("DELETE FROM parse_cache WHERE whitelist != ?", (wl,))
+                self._disk_count = self._db.execute("SELECT COUNT(*) FROM parse_cache").fetchone()[0]
+
+    def clear(self):
+        with self._lock:
+            self._mem.clear()
+            if self._db is not None:
+                self._db.execute("DELETE FROM parse_cache")
+                self._disk_count = 0
+
+    def stats(self):
+        with self._lock:
+            total = self.memory_hits + self.disk_hits + self.misses
+            return {
+                "memory_hits": self.memory_hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "hit_rate": round((self.memory_hits + self.disk_hits) / total, 4) if total else 0.0,
+                "memory_entries": len(self._mem),
+                "disk_entries": self._disk_count if self._db is not None else 0,
+            }
+
+
+_default_cache = None
+_default_lock = threading.Lock()
+
+
+def get_parse_cache() -> ParseCache:
+    """进程内共享的缓存实例；路径可用环境变量 PARSE_CACHE_PATH 覆盖（设为空串则只用内存）。"""
+    global _default_cache
+    with _default_lock:
+        if _default_cache is None:
+            path = os.getenv("PARSE_CACHE_PATH", DEFAULT_PATH)
+            _default_cache = ParseCache(path or None)
+        return _default_cache
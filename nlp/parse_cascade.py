@@ -0,0 +1,153 @@
+# parse_cascade.py
+#
+# 分层解析级联：先走确定性的规则/别名解析器（微秒级），置信度不够时才升级到
+# 本地 LLM，最后才是云端 DeepSeek。各层的命中率与耗时都会被统计下来。
+
+import os
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+from nlp import instruction_parser
+from nlp.instruction_parser import CATALOG, normalize_place_name
+from nlp.rule_parser import rule_parse
+
+# 一层解析器：text -> (start, end, confidence)
+Tier = Callable[[str], Tuple[Optional[str], Optional[str], float]]
+
+
+def rule_tier(text):
+    res = rule_parse(text)
+    return res.start, res.end, res.confidence
+
+
+def ngram_tier(text):
+    # 离线 n-gram 分类器，模型按需加载（首次调用时从 .npz 读入）
+    from nlp.ngram_classifier import get_ngram_classifier
+    res = get_ngram_classifier().predict(text)
+    return res.start, res.end, res.confidence
+
+
+def _llm_result(obj):
+    """
+    LLM 的输出只要两个字段都落在白名单里就视为可信；
+    否则（包括 chat_with_deepseek 失败时的 current/home 兜底值）一律当作没有答案。
+    """
+    obj = obj or {}
+    start = normalize_place_name(obj.get("start"))
+    end = normalize_place_name(obj.get("end"))
+    if not CATALOG.is_valid_route(start, end):
+        return None, None, 0.0
+    return start, end, 1.0
+
+
+def local_llm_tier(text):
+    # 运行时再取函数，方便测试里 patch instruction_parser
+    return _llm_result(instruction_parser.chat_with_local_llm(text))
+
+
+def cloud_llm_tier(text):
+    return _llm_result(instruction_parser.chat_with_deepseek(text))
+
+
+class ParseCascade:
+    """
+    按顺序尝试各层解析器，第一个置信度 >= threshold 的结果直接返回；
+    全部不达标时返回置信度最高的候选（同分取更靠后的层）。
+    """
+
+    def __init__(self, tiers: List[Tuple[str, Tier]], threshold: float = 0.8):
+        self.tiers = list(tiers)
+        self.threshold = threshold
+        self._lock = threading.Lock()
+        self._parses = 0
+        self._stats = {name: {"calls": 0, "hits": 0, "errors": 0, "latency_s": 0.0} for name, _ in self.tiers}
+
+    def parse(self, text: str) -> Dict[str, object]:
+        best = None
+        for name, tier in self.tiers:
+            t0 = time.perf_counter()
+            try:
+                start, end, conf = tier(text)
+                err = False
+            except Exception as e:
+                print(f"[CASCADE] tier {name} failed: {e}")
+                start, end, conf, err = None, None, 0.0, True
+            latency = time.perf_counter() - t0
+
+            hit = conf >= self.threshold
+            self._record(name, latency, hit, err)
+
+            cand = {"start": start, "end": end, "tier": name, "confidence": conf}
+            if best is None or conf >= best["confidence"]:
+                best = cand
+            if hit:
+                break
+
+        with self._lock:
+            self._parses += 1
+        return best or {"start": None, "end": None, "tier": None, "confidence": 0.0}
+
+    def _record(self, name, latency, hit, err):
+        with self._lock:
+            st = self._stats[name]
+            st["calls"] += 1
+            st["hits"] += int(hit)
+            st["errors"] += int(err)
+            st["latency_s"] += latency
+
+    def stats(self) -> Dict[str, Dict[str, float]]:
+        """各层：调用次数、命中次数、命中率（占全部解析请求）、平均耗时(ms)。"""
+        with self._lock:
+            total = self._parses
+            out = {}
+            for name, st in self._stats.items():
+                out[name] = {
+                    "calls": st["calls"],
+                    "hits": st["hits"],
+                    "errors": st["errors"],
+                    "hit_rate": round(st["hits"] / total, 4) if total else 0.0,
+                    "avg_latency_ms": round(st["latency_s"] / st["calls"] * 1000, 3) if st["calls"] else None,
+                }
+            return out
+
+    def reset_stats(self):
+        with self._lock:
+            self._parses = 0
+            for st in self._stats.values():
+                st.update(calls=0, hits=0, errors=0, latency_s=0.0)
+
+
+def default_tiers() -> List[Tuple[str, Tier]]:
+    tiers = [("rule", rule_tier)]
+    # 规则不够把握时先试离线 n-gram 分类器（PARSE_NGRAM_TIER=1 开启）
+    if os.getenv("PARSE_NGRAM_TIER", "0") == "1":
+        tiers.append(("ngram", ngram_tier))
+    if instruction_parser.LOCAL_LLM_ENDPOINT and instruction_parser.LOCAL_LLM_MODEL:
+        tiers.append(("local", local_llm_tier))
+    tiers.append(("cloud", cloud_llm_tier))
+    return tiers
+
+
+_default_cascade = None
+_default_lock = threading.Lock()
+
+
+def get_cascade() -> ParseCascade:
+    global _default_cascade
+    with _default_lock:
+        if _default_cascade is None:
+            _default_cascade = ParseCascade(default_tiers())
+        return _default_cascade
+
+
+# cascade：逐层升级（默认）；hedged：各层并行对冲，先到先得（见 hedged_parse.py）
+PARSE_MODE = os.getenv("PARSE_MODE", "cascade")
+
+
+def parse_instruction(text: str) -> Dict[str, object]:
+    """线上入口：返回 {"start", "end", "tier", ...}。"""
+    if PARSE_MODE == "hedged":
+        from nlp.hedged_parse import get_hedged_parser
+        return get_hedged_parser().parse(text)
+    return get_cascade().parse(text)
@@ -0,0 +1,250 @@
+# phonetic_index.py
+#
+# 地名的语音模糊索引：专门兜住 ASR 的同音/近音误识别（"一院"→医院、"hospitel"→hospital），
+# 不需要再调一次 LLM。
+# - 中文：转成不带声调的拼音音节，并合并常见的平翘舌、前后鼻音、n/l 混淆
+# - 英文：简化版 metaphone 键（去元音、合并同音字母组）
+# 两类键各建一棵 BK-tree，在有界编辑距离内查询（中文按音节算距离，英文按字母），
+# 单次查询在亚毫秒级。
+# pypinyin 是可选依赖：没装时中文退化为按字比较（只剩“错一个字”的容错）。
+
+import re
+from functools import lru_cache
+from typing import Dict, List, NamedTuple, Optional, Sequence, Tuple
+
+try:
+    from pypinyin import Style, lazy_pinyin
+except ImportError:  # 可选依赖
+    lazy_pinyin = None
+
+_CJK_RUN = re.compile(r"[一-鿿]+")
+_EN_WORD = re.compile(r"[a-z]+")
+
+# 至少这么多个音节/字母才进索引；单字别名（"家"）的同音字太多，只走精确匹配
+MIN_SYMBOLS = 2
+# 英文窗口最多取几个连续单词
+MAX_EN_WORDS = 3
+
+
+class PhoneticMatch(NamedTuple):
+    canonical: str
+    alias: str
+    distance: int
+    key: object           # 中文为音节元组，英文为字符串
+
+
+# ---------- 编码 ----------
+def _fuzzy_syllable(s: str) -> str:
+    """合并普通话里最容易被 ASR/口音混淆的声母、韵母。"""
+    for a, b in (("zh", "z"), ("ch", "c"), ("sh", "s")):
+        if s.startswith(a):
+            s = b + s[2:]
+            break
+    if s.startswith("n"):
+        s = "l" + s[1:]
+    for a, b in (("ing", "in"), ("eng", "en"), ("ang", "an")):
+        if s.endswith(a):
+            s = s[:-len(a)] + b
+            break
+    return s
+
+
+def chinese_syllables(text: str) -> List[str]:
+    """每个汉字对应一个（模糊化的）音节；没有 pypinyin 时直接用汉字本身。"""
+    if lazy_pinyin is None:
+        return list(text)
+    return [_fuzzy_syllable(s) for s in lazy_pinyin(text, style=Style.NORMAL, errors="ignore")]
+
+
+_EN_RULES = (
+    ("sch", "sk"), ("ph", "f"), ("ck", "k"), ("gh", ""), ("th", "0"),
+    ("sh", "x"), ("ch", "x"), ("qu", "kw"), ("wr", "r"), ("kn", "n"),
+)
+_VOWELS = set("aeiou")
+
+
+def english_key(word: str) -> str:
+    """简化 metaphone：首字母保留，其余位置去掉元音和 h；w/y 只在元音前保留。"""
+    w = "".join(_EN_WORD.findall(word.lower()))
+    if not w:
+        return ""
+    w = w.replace("x", "ks")
+    for a, b in _EN_RULES:
+        w = w.replace(a, b)
+    w = re.sub(r"c(?=[eiy])", "s", w)
+    w = w.replace("c", "k").replace("q", "k").replace("z", "s")
+
+    out = [w[0]]
+    for i, ch in enumerate(w[1:], 1):
+        nxt = w[i + 1] if i + 1 < len(w) else ""
+        if ch in _VOWELS or ch == "h":
+            continue
+        if ch in "wy" and nxt not in _VOWELS:
+            continue
+        if ch != out[-1]:
+            out.append(ch)
+    return "".join(out)
+
+
+def levenshtein(a: Sequence, b: Sequence, bound: Optional[int] = None) -> int:
+    """编辑距离（字符串或音节元组）；给定 bound 时，一旦确定超过 bound 就提前返回 bound + 1。"""
+    if len(a) < len(b):
+        a, b = b, a
+    if bound is not None and len(a) - len(b) > bound:
+        return bound + 1
+    prev = list(range(len(b) + 1))
+    for i, ca in enumerate(a, 1):
+        cur = [i]
+        for j, cb in enumerate(b, 1):
+            cur.append(min(prev[j] + 1, cur[j - 1] + 1, prev[j - 1] + (ca != cb)))
+        if bound is not None and min(cur) > bound:
+            return bound + 1
+        prev = cur
+    return prev[-1]
+
+
+def max_distance(kind: str, key) -> int:
+    """允许的编辑距离随键长增长：短键必须完全同音，避免把普通词误认成地名。"""
+    n = len(key)
+    short, medium = (2, 4) if kind == "zh" else (3, 6)
+    if n <= short:
+        return 0
+    if n <= medium:
+        return 1
+    return 2
+
+
+# ---------- BK-tree ----------
+class BKTree:
+    def __init__(self):
+        self._root = None  # [key, {distance: child}]
+
+    def add(self, key):
+        if self._root is None:
+            self._root = [key, {}]
+            return
+        node = self._root
+        while True:
+            d = levenshtein(key, node[0])
+            if d == 0:
+                return
+            child = node[1].get(d)
+            if child is None:
+                node[1][d] = [key, {}]
+                return
+            node = child
+
+    def query(self, key, limit: int) -> List[Tuple[int, object]]:
+        """返回所有编辑距离 <= limit 的 (distance, key)，按距离升序。"""
+        out = []
+        stack = [self._root] if self._root else []
+        while stack:
+            node_key, children = stack.pop()
+            # 距离超过 limit + 最大子边 时整棵子树都不可能命中，不必算出精确值
+            d = levenshtein(key, node_key, limit + max(children, default=0))
+            if d <= limit:
+                out.append((d, node_key))
+            # 三角不等式剪枝：只有距离在 [d-limit, d+limit] 的子树可能命中
+            for cd, child in children.items():
+                if d - limit <= cd <= d + limit:
+                    stack.append(child)
+        out.sort()
+        return out
+
+
+class PhoneticIndex:
+    """
+    alias_map -> 两棵 BK-tree（拼音键 / 英文键）。
+    lookup(name)：整串按音查地名；search(text)：在一段文本里找最像地名的片段。
+    多个地名在同一距离上打平时视为有歧义，返回 None，交给更慢的解析层。
+    """
+
+    def __init__(self, alias_map: Dict[str, str]):
+        self._targets = {"zh": {}, "en": {}}   # key -> {canonical: alias}
+        self._trees = {"zh": BKTree(), "en": BKTree()}
+        self.max_zh_chars = 0
+        for alias, canonical in alias_map.items():
+            self._add(alias, canonical)
+            self._add(canonical, canonical)
+        # 按实例缓存（方法上直接挂 lru_cache 会让全局缓存持有 self，索引永远释放不掉）
+        self._best = lru_cache(maxsize=4096)(self._match)
+
+    def _add(self, alias, canonical):
+        kind, key, symbols = self._encode(alias)
+        if not key or symbols < MIN_SYMBOLS:
+            return
+        if kind == "zh":
+            self.max_zh_chars = max(self.max_zh_chars, symbols)
+        self._targets[kind].setdefault(key, {}).setdefault(canonical, alias)
+        self._trees[kind].add(key)
+
+    @staticmethod
+    def _encode(text):
+        """返回 (kind, key, 音节/字母数)；中英混杂时以汉字为准。"""
+        zh = "".join(_CJK_RUN.findall(text))
+        if zh:
+            return "zh", tuple(chinese_syllables(zh)), len(zh)
+        words = _EN_WORD.findall(text.lower())
+        return "en", "".join(english_key(w) for w in words), sum(len(w) for w in words)
+
+    def _match(self, kind, key) -> Optional[PhoneticMatch]:
+        exact = self._targets[kind].get(key)
+        if exact is not None:
+            # 完全同音是最常见的情况，直接查表
+            hits = [(0, key)]
+        else:
+            hits = self._trees[kind].query(key, max_distance(kind, key))
+        if not hits:
+            return None
+        best_d = hits[0][0]
+        found = {}
+        for d, k in hits:
+            if d != best_d:
+                break
+            found.update(self._targets[kind][k])
+        if len(found) != 1:
+            return None
+        canonical, alias = next(iter(found.items()))
+        return PhoneticMatch(canonical, alias, best_d, key)
+
+    def lookup(self, name: str) -> Optional[PhoneticMatch]:
+        if not name:
+            return None
+        kind, key, symbols = self._encode(name.strip())
+        if not key or symbols < MIN_SYMBOLS:
+            return None
+        return self._best(kind, key)
+
+    def search(self, text: str) -> Optional[PhoneticMatch]:
+        """
+        枚举文本里的候选窗口（汉字按 2..最长别名字数、英文按 1..3 个连续单词），
+        取编辑距离最小、同距离下窗口最长的那个命中。
+        """
+        text = (text or "").lower()
+        best = None  # (distance, -length, match)
+        cands = set()
+        for run in _CJK_RUN.findall(text):
+            syl = chinese_syllables(run)
+            for n in range(MIN_SYMBOLS, min(self.max_zh_chars, len(syl)) + 1):
+                for i in range(len(syl) - n + 1):
+                    cands.add(("zh", tuple(syl[i:i + n]), n))
+        words = _EN_WORD.findall(text)
+        for n in range(1, MAX_EN_WORDS + 1):
+            for i in range(len(words) - n + 1):
+                chunk = words[i:i + n]
+                cands.add(("en", "".join(english_key(w) for w in chunk), sum(len(w) for w in chunk)))
+
+        for kind, key, length in cands:
+            if not key or length < MIN_SYMBOLS:
+                continue
+            m = self._best(kind, key)
+            if m is None:
+                continue
+            rank = (m.distance, -length)
+            if best is None or rank < best[0]:
+                best = (rank, {m.canonical: m})
+            elif rank == best[0]:
+                best[1][m.canonical] = m
+        if best is None or len(best[1]) != 1:
+            return None
+        return next(iter(best[1].values()))
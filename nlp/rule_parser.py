@@ -0,0 +1,90 @@
+# rule_parser.py
+#
+# 确定性的规则/别名解析器：不需要任何模型，微秒级返回 (start, end) 以及一个置信度，
+# 供 parse_cascade 判断是否需要升级到 LLM。
+
+import re
+from typing import NamedTuple, Optional
+
+from nlp.instruction_parser import alias_matcher, phonetic_index, normalize_place_name, ALLOWED_PLACES
+
+
+class RuleParse(NamedTuple):
+    start: Optional[str]
+    end: Optional[str]
+    confidence: float
+    pattern: str          # 命中的句式：zh / en_go_to / en_from / order / none
+
+
+_ZH_PATTERN = re.compile(r"从(.*?)[去到到](.*)")
+_EN_GO_TO = re.compile(r"go\s+to\s+(.*?)\s+from\s+(.*)")
+_EN_FROM = re.compile(r"(.*?)\s+from\s+(.*)")
+
+# 各句式在两个槽位都命中别名时的基础置信度
+_PATTERN_CONFIDENCE = {"zh": 0.95, "en_go_to": 0.95, "en_from": 0.85, "order": 0.6}
+
+# 槽位靠语音模糊索引（而不是精确别名）解析出来时扣掉的置信度：完全同音 / 有编辑距离
+PHONETIC_PENALTY = 0.05
+PHONETIC_FUZZY_PENALTY = 0.15
+
+
+def _score(start, end, pattern, resolved, penalty=0.0):
+    """
+    resolved: 两个槽位是否都解析到了地名（而不是原样保留的片段）；
+    penalty:  槽位里最大的模糊匹配扣分。
+    """
+    if start is None or end is None:
+        return 0.0
+    if start not in ALLOWED_PLACES or end not in ALLOWED_PLACES:
+        return 0.1
+    if start == end:
+        return 0.3
+    conf = _PATTERN_CONFIDENCE[pattern]
+    return round(conf - penalty, 4) if resolved else min(conf, 0.3)
+
+
+def rule_parse(text: str) -> RuleParse:
+    """
+    规则解析：利用预编译的 alias_matcher 全词匹配抽取 start/end。
+    支持模式：
+      - "从X去Y" / "X到Y"
+      - "go to Y from X" / "Y from X"
+      - 兜底：按出现顺序取前两个地名
+    整句只扫描一次，之后按正则分组的位置把命中分配给 start/end。
+    """
+    t = (text or "").strip().lower()
+    matches = alias_matcher.find_all(t)
+
+    def pick(m, group):
+        # 分组区间内取最长别名；没有命中再按发音模糊查（兜 ASR 同音字）；都不行则保留原片段
+        # 返回 (地名, 扣分)，扣分为 None 表示没解析出来
+        hit = alias_matcher.best_in(matches, m.start(group), m.end(group))
+        if hit:
+            return normalize_place_name(hit.canonical), 0.0
+        fuzzy = phonetic_index.search(m.group(group))
+        if fuzzy is not None:
+            return fuzzy.canonical, (PHONETIC_PENALTY if fuzzy.distance == 0 else PHONETIC_FUZZY_PENALTY)
+        return normalize_place_name(m.group(group).strip()), None
+
+    for pattern, regex, start_group, end_group in (
+        ("zh", _ZH_PATTERN, 1, 2),
+        ("en_go_to", _EN_GO_TO, 2, 1),
+        ("en_from", _EN_FROM, 2, 1),
+    ):
+        m = regex.search(t)
+        if m:
+            start, pen_s = pick(m, start_group)
+            end, pen_e = pick(m, end_group)
+            resolved = pen_s is not None and pen_e is not None
+            penalty = max(pen_s or 0.0, pen_e or 0.0)
+            return RuleParse(start, end, _score(start, end, pattern, resolved, penalty), pattern)
+
+    # fallback：在句中按出现顺序找两个地名
+    found = [normalize_place_name(h.canonical) for h in alias_matcher.find_longest(t)]
+    if len(found) >= 2:
+        conf = _score(found[0], found[1], "order", True)
+        # 出现三个以上地名时无法确定哪两个是起终点
+        if len(found) > 2:
+            conf = min(conf, 0.4)
+        return RuleParse(found[0], found[1], conf, "order")
+    return RuleParse(None, None, 0.0, "none")
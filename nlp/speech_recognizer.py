@@ -1,50 +1,269 @@
 # speech_recognizer.py
 
-import whisper
+import abc
+import os
+import threading
+import time
+from typing import Callable, Dict, NamedTuple, Optional
+
+import numpy as np
 import speech_recognition as sr
+
+from nlp.audio_capture import audio_to_numpy, get_audio_capture
 # import numpy as np
 # import soundfile as sf
 
-model = whisper.load_model("base")
+# Whisper 模型配置：大小 / 设备（cpu、cuda，空则由 whisper 自己选）/ CPU 线程数（0 表示不设置）
+WHISPER_MODEL = os.getenv("WHISPER_MODEL", "base")
+WHISPER_DEVICE = os.getenv("WHISPER_DEVICE", "") or None
+WHISPER_THREADS = int(os.getenv("WHISPER_THREADS", "0"))
+WHISPER_LANGUAGE = os.getenv("WHISPER_LANGUAGE", "zh")
+WHISPER_BEAM_SIZE = int(os.getenv("WHISPER_BEAM_SIZE", "1"))
 
-def record_voice():
-    recognizer = sr.Recognizer()
-    mic = sr.Microphone()
+# 识别后端：google（在线）/ whisper（参考实现）/ faster-whisper（CTranslate2 int8，CPU 离线）
+ASR_BACKEND = os.getenv("ASR_BACKEND", "google")
+FAST_WHISPER_MODEL = os.getenv("FAST_WHISPER_MODEL", "small")
+FAST_WHISPER_COMPUTE = os.getenv("FAST_WHISPER_COMPUTE", "int8")
 
-    try:
-        with mic as source:
-            print("请开始说话...")
-            recognizer.adjust_for_ambient_noise(source)
-            audio = recognizer.listen(source, timeout=20)  
-        with open("input.wav", "wb") as f:
-            f.write(audio.get_wav_data())
 
+def _load_whisper(name, device=None, threads=0):
+    # whisper/torch 本身导入就要好几秒，放到真正需要时再导入
+    import whisper
+    if threads > 0:
+        import torch
+        torch.set_num_threads(threads)
+    return whisper.load_model(name, device=device)
+
+
+def _load_faster_whisper(name, device=None, threads=0):
+    from faster_whisper import WhisperModel
+    return WhisperModel(name, device=device or "cpu", compute_type=FAST_WHISPER_COMPUTE,
+                        cpu_threads=threads)
+
+
+class WhisperModelHolder:
+    """
+    懒加载、线程安全的 Whisper 模型持有者。
+    - 导入本模块不加载任何权重；第一次 get() 时才加载（并发调用只会加载一次）
+    - warm_up() 可在后台线程提前加载，UI 启动后、录音前调用
+    - load_time_s 记录加载耗时
+    """
+
+    def __init__(self, name=WHISPER_MODEL, device=WHISPER_DEVICE, threads=WHISPER_THREADS, loader=_load_whisper):
+        self.name = name
+        self.device = device
+        self.threads = threads
+        self._loader = loader
+        self._model = None
+        self._error = None
+        self._lock = threading.Lock()
+        self._loaded = threading.Event()
+        self.load_time_s = None
+
+    @property
+    def is_loaded(self):
+        return self._model is not None
+
+    def get(self):
+        if self._model is not None:
+            return self._model
+        with self._lock:
+            if self._model is None:
+                t0 = time.perf_counter()
+                try:
+                    self._model = self._loader(self.name, self.device, self.threads)
+                except Exception as e:
+                    self._error = e
+                    raise
+                finally:
+                    self._loaded.set()
+                self._error = None
+                self.load_time_s = time.perf_counter() - t0
+                print(f"Whisper 模型 {self.name} 加载完成，用时 {self.load_time_s:.2f}s")
+        return self._model
+
+    def warm_up(self, background=True):
+        """提前加载模型；background=True 时立即返回加载线程。"""
+        def _run():
+            try:
+                self.get()
+            except Exception as e:
+                print(f"[ERROR] Whisper 预热失败: {e}")
+
+        if not background:
+            _run()
+            return None
+        t = threading.Thread(target=_run, name="whisper-warmup", daemon=True)
+        t.start()
+        return t
+
+    def wait(self, timeout=None):
+        """等待一次加载尝试结束（成功或失败），返回是否已加载。"""
+        self._loaded.wait(timeout)
+        return self.is_loaded
+
+
+# 进程内共享的模型持有者（Google 识别路径完全不会触发加载）
+whisper_model = WhisperModelHolder()
+
+
+# ---------- 识别后端 ----------
+class AsrResult(NamedTuple):
+    text: str
+    backend: str
+    audio_s: float       # 音频时长
+    elapsed_s: float     # 识别耗时
+    rtf: float           # 实时率 = 识别耗时 / 音频时长，< 1 表示比实时快
+
+
+def to_audio_data(pcm, sample_rate: int = 16000) -> sr.AudioData:
+    """sr.AudioData / int16 PCM 字节 / float32 NumPy 数组 -> sr.AudioData。"""
+    if isinstance(pcm, sr.AudioData):
+        return pcm
+    if isinstance(pcm, np.ndarray):
+        if pcm.dtype != np.int16:
+            pcm = (np.clip(pcm, -1.0, 1.0) * 32767).astype(np.int16)
+        pcm = pcm.tobytes()
+    return sr.AudioData(bytes(pcm), sample_rate, 2)
+
+
+class AsrBackend(abc.ABC):
+    """所有识别后端的公共接口：transcribe(pcm, sample_rate) -> text，并累计实时率。"""
+    name = "base"
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.audio_s = 0.0
+        self.elapsed_s = 0.0
+
+    @abc.abstractmethod
+    def _transcribe(self, audio: sr.AudioData) -> str:
+        ...
+
+    def warm_up(self, background=True):
+        return None
+
+    def transcribe(self, pcm, sample_rate: int = 16000) -> AsrResult:
+        audio = to_audio_data(pcm, sample_rate)
+        audio_s = len(audio.frame_data) / (audio.sample_rate * audio.sample_width)
+        t0 = time.perf_counter()
+        text = (self._transcribe(audio) or "").strip()
+        elapsed = time.perf_counter() - t0
+        with self._lock:
+            self.calls += 1
+            self.audio_s += audio_s
+            self.elapsed_s += elapsed
+        rtf = elapsed / audio_s if audio_s > 0 else float("inf")
+        print(f"[ASR] backend={self.name} audio={audio_s:.2f}s elapsed={elapsed:.2f}s rtf={rtf:.2f}")
+        return AsrResult(text, self.name, audio_s, elapsed, rtf)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "calls": self.calls,
+                "audio_s": round(self.audio_s, 3),
+                "elapsed_s": round(self.elapsed_s, 3),
+                "rtf": round(self.elapsed_s / self.audio_s, 3) if self.audio_s else None,
+            }
+
+
+class GoogleBackend(AsrBackend):
+    name = "google"
+
+    def __init__(self, language="zh-CN"):
+        super().__init__()
+        self.language = language
+        self.recognizer = sr.Recognizer()
+
+    def _transcribe(self, audio):
+        return self.recognizer.recognize_google(audio, language=self.language)
+
+
+class WhisperBackend(AsrBackend):
+    name = "whisper"
+
+    def __init__(self, holder=None, language=WHISPER_LANGUAGE, beam_size=WHISPER_BEAM_SIZE):
+        super().__init__()
+        self.holder = holder or whisper_model
+        self.language = language
+        self.beam_size = beam_size
+
+    def warm_up(self, background=True):
+        return self.holder.warm_up(background)
+
+    def _transcribe(self, audio):
+        result = self.holder.get().transcribe(audio_to_numpy(audio), language=self.language,
+                                              beam_size=self.beam_size, fp16=False)
+        return result["text"]
+
+
+class FasterWhisperBackend(WhisperBackend):
+    """faster-whisper（CTranslate2）int8 量化，CPU 上通常比参考实现快数倍。"""
+    name = "faster-whisper"
+
+    def __init__(self, holder=None, language=WHISPER_LANGUAGE, beam_size=WHISPER_BEAM_SIZE):
+        holder = holder or WhisperModelHolder(FAST_WHISPER_MODEL, WHISPER_DEVICE, WHISPER_THREADS,
+                                              loader=_load_faster_whisper)
+        super().__init__(holder, language, beam_size)
+
+    def _transcribe(self, audio):
+        segments, _info = self.holder.get().transcribe(audio_to_numpy(audio), language=self.language,
+                                                       beam_size=self.beam_size)
+        return "".join(seg.text for seg in segments)
+
+
+ASR_BACKENDS: Dict[str, Callable[[], AsrBackend]] = {
+    "google": GoogleBackend,
+    "whisper": WhisperBackend,
+    "faster-whisper": FasterWhisperBackend,
+}
+
+_backends: Dict[str, AsrBackend] = {}
+_backends_lock = threading.Lock()
+
+
+def get_asr_backend(name: Optional[str] = None) -> AsrBackend:
+    """按名字取（并缓存）识别后端；name 为空时用 ASR_BACKEND。"""
+    name = name or ASR_BACKEND
+    with _backends_lock:
+        if name not in _backends:
+            if name not in ASR_BACKENDS:
+                raise ValueError(f"unknown ASR backend {name!r}, choose from {sorted(ASR_BACKENDS)}")
+            _backends[name] = ASR_BACKENDS[name]()
+        return _backends[name]
+
+
+def transcribe(pcm, sample_rate: int = 16000, backend: Optional[str] = None) -> AsrResult:
+    return get_asr_backend(backend).transcribe(pcm, sample_rate)
+
+def record_voice(timeout=20, phrase_time_limit=None):
+    """录一句话，返回内存里的 sr.AudioData（不再写 input.wav），失败返回 None。"""
+    try:
+        print("请开始说话...")
+        audio = get_audio_capture().listen(timeout=timeout, phrase_time_limit=phrase_time_limit)
         print("录音完成。")
-        return "input.wav"
+        return audio
     except Exception as e:
         print(f"[ERROR] 录音失败: {e}")
         return None
     
-def transcribe_audio():
-    r = sr.Recognizer()
-    with sr.Microphone() as source:
-        print("请开始说话...")
-        audio = r.listen(source, timeout=5, phrase_time_limit=10)
-    wav_path = "input.wav"
-
-    with open(wav_path, "wb") as f:
-        f.write(audio.get_wav_data())
-
+def transcribe_audio(backend=None):
+    print("请开始说话...")
+    # 麦克风流常驻、底噪已标定，这里直接等一句话
+    audio = get_audio_capture().listen(timeout=5, phrase_time_limit=10)
 
-    text = r.recognize_google(audio, language="zh-CN")
-    return text
+    return transcribe(audio, backend=backend).text
 
 # 适合本地部署，不受网络限制
-# def transcribe_audio(filename="input.wav"):
-#     print("Whisper 开始识别音频中...")
-#     result = model.transcribe(filename, language='en') 
-#     print(f"Whisper 识别结果: {result['text']}")
-#     return result['text']
+def transcribe_whisper(audio, language=WHISPER_LANGUAGE):
+    """audio 可以是 sr.AudioData、float32 NumPy 数组或音频文件路径。"""
+    print("Whisper 开始识别音频中...")
+    if isinstance(audio, sr.AudioData):
+        audio = audio_to_numpy(audio)
+    result = whisper_model.get().transcribe(audio, language=language)
+    print(f"Whisper 识别结果: {result['text']}")
+    return result['text']
 
 
 # if __name__ == "__main__": 
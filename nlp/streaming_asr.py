@@ -0,0 +1,169 @@
+# streaming_asr.py
+#
+# 边说边识别：说话过程中每隔 PARTIAL_INTERVAL_S 把已录到的语音段送去识别，得到部分结果（partial）。
+# 连续两次 partial 文本不变就认为“稳定”，立刻在后台投机地跑解析级联；
+# 说话结束时，如果最后一次 partial 已经覆盖了全部有声块，就直接用它当最终文本，
+# 最终文本和某个投机解析的文本一致时直接复用那次解析结果——
+# 很多时候人一停下，路线就已经解析好了。
+# 记录“最后一个有声块 -> 最终文本 -> 最终解析”的时间戳，用来度量说完话到拿到意图的间隔。
+
+import os
+import re
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, Dict, List, NamedTuple, Optional
+
+from nlp.audio_capture import Chunk, get_audio_capture
+from nlp.speech_recognizer import get_asr_backend
+
+ASR_STREAMING = os.getenv("ASR_STREAMING", "0") == "1"
+PARTIAL_INTERVAL_S = float(os.getenv("ASR_PARTIAL_INTERVAL_S", "0.4"))
+STABLE_N = 2            # 连续几次相同的 partial 算稳定
+
+_PUNCT = re.compile(r"[\s,.!?;:，。！？；：、]+")
+
+
+def _norm(text: str) -> str:
+    return _PUNCT.sub("", text or "").lower()
+
+
+class Partial(NamedTuple):
+    text: str
+    t: float            # 拿到这条 partial 的时刻（perf_counter）
+    audio_s: float      # 覆盖的音频时长
+    stable: bool
+
+
+class StreamResult(NamedTuple):
+    text: str
+    parsed: Optional[Dict[str, object]]
+    partials: List[Partial]
+    speech_end_t: float     # 最后一个有声块读到的时刻
+    final_partial_t: Optional[float]    # 最后一条 partial 出来的时刻，没有 partial 时为 None
+    final_text_t: float     # 最终文本确定的时刻
+    final_parse_t: float    # 最终解析结果可用的时刻
+    speculative: bool       # 最终解析是否复用了投机解析
+
+    @property
+    def intent_gap_s(self) -> float:
+        """说完话到拿到意图的间隔（含端点检测的静音等待）。"""
+        return self.final_parse_t - self.speech_end_t
+
+
+class StreamingTranscriber:
+    """
+    capture:  AudioCapture（需要 listen(timeout, phrase_time_limit, on_chunk) 和 threshold）
+    backend:  AsrBackend（transcribe(pcm, sample_rate) -> AsrResult）
+    parse_fn: text -> 解析结果 dict，默认 parse_cascade.parse_instruction
+    """
+
+    def __init__(self, capture=None, backend=None, parse_fn: Optional[Callable] = None,
+                 interval_s: float = PARTIAL_INTERVAL_S, stable_n: int = STABLE_N):
+        self.capture = capture or get_audio_capture()
+        self.backend = backend or get_asr_backend()
+        if parse_fn is None:
+            from nlp.parse_cascade import parse_instruction
+            parse_fn = parse_instruction
+        self.parse_fn = parse_fn
+        self.interval_s = interval_s
+        self.stable_n = max(stable_n, 1)
+        self._pool = ThreadPoolExecutor(max_workers=2, thread_name_prefix="speculative-parse")
+
+    def _partials_loop(self, state, done: threading.Event):
+        covered = 0
+        while not done.wait(self.interval_s):
+            with state["lock"]:
+                chunks = list(state["chunks"])
+            if not chunks or chunks[-1].seq == covered:
+                continue
+            covered = chunks[-1].seq
+            pcm = b"".join(c.data for c in chunks)
+            try:
+                res = self.backend.transcribe(pcm, self.capture.sample_rate)
+            except Exception as e:
+                # 部分结果识别失败不影响最终识别（如 google 对半句话报 UnknownValueError）
+                print(f"[ASR] partial failed: {e}")
+                continue
+            self._on_partial(state, res.text, res.audio_s, covered)
+
+    def _on_partial(self, state, text, audio_s, covered_seq):
+        key = _norm(text)
+        with state["lock"]:
+            partials = state["partials"]
+            prev = partials[len(partials) - self.stable_n + 1:] if self.stable_n > 1 else []
+            stable = bool(key) and len(prev) == self.stable_n - 1 and all(_norm(p.text) == key for p in prev)
+            partials.append(Partial(text, time.perf_counter(), audio_s, stable))
+            state["last_partial"] = (text, covered_seq)
+            if stable and key not in state["speculative"]:
+                state["speculative"][key] = self._pool.submit(self.parse_fn, text)
+
+    def run(self, timeout: Optional[float] = 5, phrase_time_limit: Optional[float] = 10) -> StreamResult:
+        state = {
+            "lock": threading.Lock(),
+            "chunks": [],
+            "partials": [],
+            "speculative": {},
+            "last_partial": None,
+            "last_loud": None,
+        }
+
+        def on_chunk(c: Chunk):
+            with state["lock"]:
+                state["chunks"].append(c)
+                if c.energy > self.capture.threshold:
+                    state["last_loud"] = c
+
+        done = threading.Event()
+        worker = threading.Thread(target=self._partials_loop, args=(state, done), daemon=True)
+        worker.start()
+        try:
+            audio = self.capture.listen(timeout=timeout, phrase_time_limit=phrase_time_limit, on_chunk=on_chunk)
+        finally:
+            done.set()
+
+        with state["lock"]:
+            last_loud = state["last_loud"]
+            last_partial = state["last_partial"]
+        speech_end_t = last_loud.t if last_loud else time.perf_counter()
+
+        # 最后一次 partial 覆盖了全部有声块：直接当最终文本，省掉一次识别
+        if last_partial and last_loud and last_partial[1] >= last_loud.seq and _norm(last_partial[0]):
+            text = last_partial[0]
+        else:
+            worker.join()
+            text = self.backend.transcribe(audio).text
+        final_text_t = time.perf_counter()
+
+        with state["lock"]:
+            fut: Optional[Future] = state["speculative"].get(_norm(text))
+        parsed, speculative = None, False
+        if fut is not None:
+            try:
+                parsed, speculative = fut.result(), True
+            except Exception as e:
+                print(f"[ASR] speculative parse failed: {e}")
+        if not speculative:
+            parsed = self.parse_fn(text)
+        final_parse_t = time.perf_counter()
+
+        with state["lock"]:
+            partials = list(state["partials"])
+        res = StreamResult(text, parsed, partials, speech_end_t, partials[-1].t if partials else None,
+                           final_text_t, final_parse_t, speculative)
+        print(f"[ASR] streaming partials={len(res.partials)} speculative={speculative} "
+              f"speech_end->text={(final_text_t - speech_end_t) * 1000:.0f}ms "
+              f"speech_end->intent={res.intent_gap_s * 1000:.0f}ms")
+        return res
+
+
+_streaming = None
+_streaming_lock = threading.Lock()
+
+
+def get_streaming_transcriber() -> StreamingTranscriber:
+    global _streaming
+    with _streaming_lock:
+        if _streaming is None:
+            _streaming = StreamingTranscriber()
+        return _streaming
@@ -0,0 +1,196 @@
+# tts_cache.py
+#
+# 按内容寻址的 TTS 音频缓存：key = sha1(voice, rate, text)，一句话只合成一次。
+# - 文件放在 TTS_CACHE_DIR 下（<key>.mp3），总大小超过上限时按最近使用时间淘汰（LRU）
+# - 启动时后台预渲染固定提示语和所有“地名对”确认语，之后重复播报直接读本地文件，
+#   edge-tts 慢或连不上时也能照常播报
+
+import asyncio
+import collections
+import hashlib
+import itertools
+import os
+import threading
+import time
+from typing import Awaitable, Callable, Iterable, List, Optional, Sequence
+
+TTS_CACHE_DIR = os.getenv("TTS_CACHE_DIR", os.path.join(os.path.dirname(os.path.dirname(__file__)), "out", "tts_cache"))
+TTS_CACHE_MAX_MB = float(os.getenv("TTS_CACHE_MAX_MB", "64"))
+DEFAULT_VOICE = "zh-CN-XiaoxiaoNeural"
+DEFAULT_RATE = "+0%"
+
+# (text, voice, rate) -> mp3 字节
+Synth = Callable[[str, str, str], Awaitable[bytes]]
+
+
+async def edge_synthesize(text: str, voice: str = DEFAULT_VOICE, rate: str = DEFAULT_RATE) -> bytes:
+    import edge_tts
+    communicate = edge_tts.Communicate(text, voice, rate=rate)
+    buf = bytearray()
+    async for chunk in communicate.stream():
+        if chunk["type"] == "audio":
+            buf.extend(chunk["data"])
+    return bytes(buf)
+
+
+def cache_key(text: str, voice: str = DEFAULT_VOICE, rate: str = DEFAULT_RATE) -> str:
+    return hashlib.sha1(f"{voice}\x1f{rate}\x1f{text}".encode("utf-8")).hexdigest()
+
+
+def expand_phrases(templates: Iterable[str], names: Sequence[str]) -> List[str]:
+    """把含 {start}/{end} 的模板展开成所有有序地名对；不含占位符的原样保留。去重保序。"""
+    out = []
+    for tpl in templates:
+        if "{start}" in tpl or "{end}" in tpl:
+            out.extend(tpl.format(start=s, end=e) for s, e in itertools.permutations(names, 2))
+        else:
+            out.append(tpl)
+    return list(dict.fromkeys(out))
+
+
+class TtsCache:
+    def __init__(self, root: str = TTS_CACHE_DIR, max_bytes: int = int(TTS_CACHE_MAX_MB * 1024 * 1024),
+                 synth: Synth = edge_synthesize):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.synth = synth
+        self._lock = threading.Lock()
+        self._inflight = {}             # key -> threading.Event，同一句并发合成只做一次
+        self._index = collections.OrderedDict()     # key -> 字节数，按最近使用排序（末尾最新）
+        self._bytes = 0
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(root, exist_ok=True)
+        entries = []
+        for name in os.listdir(root):
+            if name.endswith(".mp3"):
+                st = os.stat(os.path.join(root, name))
+                entries.append((st.st_mtime, name[:-4], st.st_size))
+        for _, key, size in sorted(entries):
+            self._index[key] = size
+            self._bytes += size
+
+    def path_for(self, key: str) -> str:
+        return os.path.join(self.root, key + ".mp3")
+
+    def get(self, text: str, voice: str = DEFAULT_VOICE, rate: str = DEFAULT_RATE) -> Optional[str]:
+        """命中返回文件路径并刷新最近使用时间，否则 None。"""
+        key = cache_key(text, voice, rate)
+        with self._lock:
+            if key not in self._index:
+                return None
+            path = self.path_for(key)
+            if not os.path.exists(path):
+                self._bytes -= self._index.pop(key)
+                return None
+            self._index.move_to_end(key)
+        try:
+            # mtime 当作最近使用时间，重启后还能按 LRU 恢复顺序
+            os.utime(path)
+        except OSError:
+            pass
+        return path
+
+    def put(self, text: str, data: bytes, voice: str = DEFAULT_VOICE, rate: str = DEFAULT_RATE) -> str:
+        key = cache_key(text, voice, rate)
+        path = self.path_for(key)
+        tmp = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp, "wb") as f:
+            f.write(data)
+        os.replace(tmp, path)
+        with self._lock:
+            self._bytes += len(data) - self._index.pop(key, 0)
+            self._index[key] = len(data)
+            self._evict()
+        return path
+
+    def _evict(self):
+        while self._bytes > self.max_bytes and len(self._index) > 1:
+            key, size = self._index.popitem(last=False)
+            self._bytes -= size
+            try:
+                os.remove(self.path_for(key))
+            except OSError:
+                pass
+
+    async def render_async(self, text: str, voice: str = DEFAULT_VOICE, rate: str = DEFAULT_RATE) -> str:
+        """命中直接返回路径；未命中则合成、写入缓存后返回路径。"""
+        path = self.get(text, voice, rate)
+        if path:
+            with self._lock:
+                self.hits += 1
+            return path
+        key = cache_key(text, voice, rate)
+        with self._lock:
+            self.misses += 1
+            waiter = self._inflight.get(key)
+            if waiter is None:
+                self._inflight[key] = threading.Event()
+        if waiter is not None:
+            # 同一句正在别处合成（比如后台预渲染），等它写完
+            await asyncio.get_running_loop().run_in_executor(None, waiter.wait, 30)
+            path = self.get(text, voice, rate)
+            if path:
+                return path
+        try:
+            data = await self.synth(text, voice, rate)
+            if not data:
+                raise RuntimeError("TTS engine returned no audio")
+            return self.put(text, data, voice, rate)
+        finally:
+            with self._lock:
+                ev = self._inflight.pop(key, None)
+            if ev is not None:
+                ev.set()
+
+    def render(self, text: str, voice: str = DEFAULT_VOICE, rate: str = DEFAULT_RATE) -> str:
+        return asyncio.run(self.render_async(text, voice, rate))
+
+    def prerender(self, phrases: Iterable[str], voice: str = DEFAULT_VOICE, rate: str = DEFAULT_RATE,
+                  background: bool = True,
+                  gate: Optional[Callable[[], Awaitable[bool]]] = None) -> Optional[threading.Thread]:
+        """
+        逐句预渲染（已缓存的跳过），单句失败只打印不中断。background=True 时返回后台线程。
+        gate 返回 False 时整体跳过（合成引擎连不上，逐句超时只会白占网络和线程）。
+        """
+        phrases = list(phrases)
+
+        async def _all():
+            if gate is not None and not await gate():
+                print("[TTS] prerender skipped: synth engine unavailable")
+                return
+            t0 = time.perf_counter()
+            done = 0
+            for text in phrases:
+                if self.get(text, voice, rate):
+                    continue
+                try:
+                    await self.render_async(text, voice, rate)
+                    done += 1
+                except Exception as e:
+                    print(f"[TTS] prerender failed for {text!r}: {e}")
+            print(f"[TTS] prerendered {done} new / {len(phrases)} phrase(s) in {time.perf_counter() - t0:.1f}s")
+
+        if not background:
+            asyncio.run(_all())
+            return None
+        t = threading.Thread(target=lambda: asyncio.run(_all()), name="tts-prerender", daemon=True)
+        t.start()
+        return t
+
+    def stats(self):
+        with self._lock:
+            return {"entries": len(self._index), "bytes": self._bytes,
+                    "hits": self.hits, "misses": self.misses}
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_tts_cache() -> TtsCache:
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = TtsCache()
+        return _cache
@@ -0,0 +1,293 @@
+# tts_engines.py
+#
+# TTS 引擎抽象：edge-tts（在线）+ 本地离线合成（espeak-ng / espeak 命令行，或 pyttsx3）。
+# EngineSelector 按健康状态和实测首包延迟（TTFA 的 EMA）自动选引擎：
+# - 首选引擎在 TTS_LATENCY_BUDGET_S 内没吐出第一块音频（断网、超时、报错），立刻改用下一个引擎，
+#   保证断网的测试台上确认语也能在固定预算内开口
+# - 失败的引擎标记为不健康，HEALTH_TTL_S 内直接跳过；过期后后台探活，恢复了再参与排序
+
+import abc
+import asyncio
+import os
+import shutil
+import tempfile
+import threading
+import time
+from typing import AsyncIterator, Dict, List, Optional
+
+from nlp.tts_cache import DEFAULT_RATE, DEFAULT_VOICE
+
+TTS_LATENCY_BUDGET_S = float(os.getenv("TTS_LATENCY_BUDGET_S", "1.5"))
+HEALTH_TTL_S = 30.0
+TTFA_ALPHA = 0.3            # TTFA 的 EMA 系数
+OFFLINE_RESERVE_S = 0.3     # 给兜底引擎预留的首包时间（还没测到 EMA 时用）
+
+EDGE_HOST = ("speech.platform.bing.com", 443)
+
+# edge 音色的语言前缀 -> espeak 音色
+ESPEAK_VOICES = {"zh": "cmn", "en": "en-us"}
+
+
+def _rate_percent(rate: str) -> int:
+    try:
+        return int(rate.strip().rstrip("%"))
+    except (AttributeError, ValueError):
+        return 0
+
+
+class TtsEngine(abc.ABC):
+    name = "base"
+    online = False          # 在线引擎的音频可以进缓存；离线兜底的不进，联网后仍用好音色
+
+    @abc.abstractmethod
+    def stream(self, text: str, voice: str, rate: str) -> AsyncIterator[bytes]:
+        ...
+
+    async def health(self) -> bool:
+        return True
+
+
+class EdgeEngine(TtsEngine):
+    name = "edge"
+    online = True
+
+    async def stream(self, text, voice=DEFAULT_VOICE, rate=DEFAULT_RATE):
+        import edge_tts
+        communicate = edge_tts.Communicate(text, voice, rate=rate)
+        async for chunk in communicate.stream():
+            if chunk["type"] == "audio":
+                yield chunk["data"]
+
+    async def health(self) -> bool:
+        # 只做一次 TCP 握手，比真合成一句便宜得多
+        try:
+            _, writer = await asyncio.wait_for(asyncio.open_connection(*EDGE_HOST), timeout=1.0)
+            writer.close()
+            return True
+        except Exception:
+            return False
+
+
+class OfflineEngine(TtsEngine):
+    """本地合成：优先 espeak-ng/espeak（stdout 直接出 WAV，可边合成边播），否则 pyttsx3。"""
+    name = "offline"
+
+    def __init__(self):
+        self.espeak = shutil.which("espeak-ng") or shutil.which("espeak")
+
+    async def stream(self, text, voice=DEFAULT_VOICE, rate=DEFAULT_RATE):
+        if self.espeak:
+            wpm = int(175 * (1 + _rate_percent(rate) / 100))
+            proc = await asyncio.create_subprocess_exec(
+                self.espeak, "-v", ESPEAK_VOICES.get(voice[:2].lower(), "en-us"), "-s", str(wpm), "--stdout", text,
+                stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.DEVNULL)
+            try:
+                while True:
+                    data = await proc.stdout.read(8192)
+                    if not data:
+                        break
+                    yield data
+                await proc.wait()
+            finally:
+                if proc.returncode is None:
+                    proc.kill()
+            return
+        yield await asyncio.get_running_loop().run_in_executor(None, self._pyttsx3_wav, text, rate)
+
+    @staticmethod
+    def _pyttsx3_wav(text, rate):
+        import pyttsx3
+        engine = pyttsx3.init()
+        engine.setProperty("rate", int(engine.getProperty("rate") * (1 + _rate_percent(rate) / 100)))
+        fd, path = tempfile.mkstemp(suffix=".wav")
+        os.close(fd)
+        try:
+            engine.save_to_file(text, path)
+            engine.runAndWait()
+            with open(path, "rb") as f:
+                return f.read()
+        finally:
+            os.remove(path)
+
+    async def health(self) -> bool:
+        if self.espeak:
+            return True
+        try:
+            import pyttsx3  # noqa: F401
+            return True
+        except ImportError:
+            return False
+
+
+class EngineStream:
+    """
+    一次合成的音频块迭代器：第一块到达前按预算在引擎间切换，之后直接透传。
+    engine / cacheable 在拿到第一块后确定，播报服务据此决定是否写缓存。
+    """
+
+    def __init__(self, selector: "EngineSelector", text, voice, rate):
+        self.selector = selector
+        self.text, self.voice, self.rate = text, voice, rate
+        self.engine: Optional[TtsEngine] = None
+        self._agen = None
+
+    @property
+    def cacheable(self) -> bool:
+        return self.engine is not None and self.engine.online
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self) -> bytes:
+        if self._agen is not None:
+            return await self._agen.__anext__()
+        return await self._first_chunk()
+
+    async def _first_chunk(self) -> bytes:
+        sel = self.selector
+        t0 = time.perf_counter()
+        deadline = t0 + sel.budget_s
+        candidates = sel.ranked()
+        last_error = None
+        for i, engine in enumerate(candidates):
+            rest = [e for e in candidates[i + 1:] if sel.healthy(e)]
+            # 给后面的健康引擎留出首包时间；后面没有健康引擎可退时不设限
+            timeout = max(deadline - time.perf_counter() - sel.reserve_s(rest), 0.05) if rest else None
+            agen = engine.stream(self.text, self.voice, self.rate)
+            t_engine = time.perf_counter()
+            try:
+                first = await asyncio.wait_for(agen.__anext__(), timeout)
+            except Exception as e:
+                last_error = e
+                await _aclose(agen)
+                sel.mark_failed(engine, e)
+                continue
+            sel.record_ttfa(engine, time.perf_counter() - t_engine)
+            self.engine, self._agen = engine, agen
+            return first
+        raise RuntimeError(f"no TTS engine produced audio: {last_error!r}")
+
+
+async def _aclose(agen):
+    try:
+        await agen.aclose()
+    except Exception:
+        pass
+
+
+class EngineSelector:
+    def __init__(self, engines: Optional[List[TtsEngine]] = None, budget_s: float = TTS_LATENCY_BUDGET_S,
+                 health_ttl_s: float = HEALTH_TTL_S):
+        self.engines = engines if engines is not None else [EdgeEngine(), OfflineEngine()]
+        self.budget_s = budget_s
+        self.health_ttl_s = health_ttl_s
+        self._lock = threading.Lock()
+        self.ttfa_ema: Dict[str, Optional[float]] = {e.name: None for e in self.engines}
+        self.failed_at: Dict[str, Optional[float]] = {e.name: None for e in self.engines}
+        self.served: Dict[str, int] = {e.name: 0 for e in self.engines}
+        self._probing = set()
+
+    def stream(self, text: str, voice: str = DEFAULT_VOICE, rate: str = DEFAULT_RATE) -> EngineStream:
+        return EngineStream(self, text, voice, rate)
+
+    # ---------- 排序与健康 ----------
+    def healthy(self, engine: TtsEngine) -> bool:
+        with self._lock:
+            return self.failed_at[engine.name] is None
+
+    def ranked(self) -> List[TtsEngine]:
+        """
+        健康的引擎按配置顺序（音质优先），但实测 TTFA EMA 超出预算的往后排；
+        不健康的放最后兜底。
+        """
+        order = {e.name: i for i, e in enumerate(self.engines)}
+        with self._lock:
+            ema = dict(self.ttfa_ema)
+        ok = [e for e in self.engines if self.healthy(e)]
+        bad = [e for e in self.engines if not self.healthy(e)]
+        for e in bad:
+            self._maybe_probe(e)
+        ok.sort(key=lambda e: (ema[e.name] is not None and ema[e.name] > self.budget_s, order[e.name]))
+        return ok + bad if ok else bad
+
+    def reserve_s(self, rest: List[TtsEngine]) -> float:
+        with self._lock:
+            known = [self.ttfa_ema[e.name] for e in rest if self.ttfa_ema[e.name] is not None]
+        return min(known) if known else OFFLINE_RESERVE_S
+
+    def record_ttfa(self, engine: TtsEngine, ttfa: float):
+        with self._lock:
+            prev = self.ttfa_ema[engine.name]
+            self.ttfa_ema[engine.name] = ttfa if prev is None else prev + TTFA_ALPHA * (ttfa - prev)
+            self.failed_at[engine.name] = None
+            self.served[engine.name] += 1
+
+    def mark_failed(self, engine: TtsEngine, error):
+        print(f"[TTS] engine {engine.name} failed before first audio: {error!r}")
+        with self._lock:
+            self.failed_at[engine.name] = time.monotonic()
+
+    def _maybe_probe(self, engine: TtsEngine):
+        """不健康超过 TTL 的引擎在后台探活，不占用本次播报的预算。"""
+        with self._lock:
+            failed = self.failed_at[engine.name]
+            if failed is None or time.monotonic() - failed < self.health_ttl_s or engine.name in self._probing:
+                return
+            self._probing.add(engine.name)
+
+        async def probe():
+            try:
+                ok = await engine.health()
+            except Exception:
+                ok = False
+            with self._lock:
+                self._probing.discard(engine.name)
+                self.failed_at[engine.name] = None if ok else time.monotonic()
+
+        try:
+            asyncio.get_running_loop().create_task(probe())
+        except RuntimeError:
+            with self._lock:
+                self._probing.discard(engine.name)
+
+    async def check_all(self) -> Dict[str, bool]:
+        """对所有引擎做一次健康检查（启动时调用）。"""
+        results = await asyncio.gather(*(e.health() for e in self.engines), return_exceptions=True)
+        out = {}
+        with self._lock:
+            for e, ok in zip(self.engines, results):
+                ok = ok is True
+                out[e.name] = ok
+                self.failed_at[e.name] = None if ok else time.monotonic()
+        return out
+
+    async def available(self, name: str) -> bool:
+        """单独检查一个引擎并刷新其健康状态（比如预渲染前确认 edge 能连上）。"""
+        engine = next((e for e in self.engines if e.name == name), None)
+        if engine is None:
+            return False
+        try:
+            ok = await engine.health() is True
+        except Exception:
+            ok = False
+        with self._lock:
+            self.failed_at[name] = None if ok else time.monotonic()
+        return ok
+
+    def stats(self):
+        with self._lock:
+            return {e.name: {"healthy": self.failed_at[e.name] is None,
+                             "ttfa_ema_s": None if self.ttfa_ema[e.name] is None else round(self.ttfa_ema[e.name], 3),
+                             "served": self.served[e.name]} for e in self.engines}
+
+
+_selector = None
+_selector_lock = threading.Lock()
+
+
+def get_engine_selector() -> EngineSelector:
+    global _selector
+    with _selector_lock:
+        if _selector is None:
+            _selector = EngineSelector()
+        return _selector
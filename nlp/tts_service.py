@@ -0,0 +1,303 @@
+# tts_service.py
+#
+# 常驻 TTS 播报服务：一个后台线程 + 一个事件循环 + 一个优先级队列，取代“每句话一个线程 + asyncio.run”。
+# - say() 线程安全，立即返回 TtsJob；同一时刻只播一句，不会再互相覆盖 reply.mp3
+# - 新提示默认“顶替”旧提示：队列里同级或更低优先级的旧句子直接作废，正在播的也打断
+# - 未命中缓存时边合成边播：音频块一到就写进播放器 stdin（ffplay / mpv），不用等整段 MP3
+# - 每句记录 TTFA（time-to-first-audio，从 say() 到第一块音频送进播放器）
+
+import asyncio
+import itertools
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+from typing import AsyncIterator, Callable, List, Optional
+
+from nlp.tts_cache import DEFAULT_RATE, DEFAULT_VOICE, get_tts_cache
+from nlp.tts_engines import EngineSelector, get_engine_selector
+
+PRIORITY_ALERT = 0      # 数字越小越优先
+PRIORITY_NORMAL = 1
+
+TTS_PLAYER = os.getenv("TTS_PLAYER", "")
+
+# (text, voice, rate) -> 异步产出音频字节块；返回对象带 cacheable 属性时据此决定是否写缓存
+SynthStream = Callable[[str, str, str], AsyncIterator[bytes]]
+
+PLAYER_COMMANDS = {
+    "ffplay": ["ffplay", "-nodisp", "-autoexit", "-loglevel", "quiet", "-i", "-"],
+    "mpv": ["mpv", "--no-terminal", "--no-video", "--cache=no", "-"],
+}
+
+
+# ---------- 播放器 ----------
+class PipePlayer:
+    """把 MP3 字节流写进 ffplay/mpv 的 stdin，边收边播。"""
+    streaming = True
+
+    def __init__(self, cmd: List[str]):
+        self.cmd = cmd
+        self.proc = None
+
+    async def start(self):
+        self.proc = await asyncio.create_subprocess_exec(
+            *self.cmd, stdin=asyncio.subprocess.PIPE,
+            stdout=asyncio.subprocess.DEVNULL, stderr=asyncio.subprocess.DEVNULL)
+
+    async def write(self, data: bytes):
+        self.proc.stdin.write(data)
+        await self.proc.stdin.drain()
+
+    async def finish(self):
+        self.proc.stdin.close()
+        await self.proc.wait()
+
+    async def kill(self):
+        if self.proc and self.proc.returncode is None:
+            self.proc.kill()
+            await self.proc.wait()
+
+
+class FilePlayer:
+    """
+    没有 ffplay/mpv 时的退路：收齐后写临时文件，在子进程里用 playsound 播（无法边收边播）。
+    放在子进程而不是线程里，顶替时才能真正把正在播的声音停掉。
+    """
+    streaming = False
+    cmd = [sys.executable, "-c", "import sys; from playsound import playsound; playsound(sys.argv[1])"]
+
+    def __init__(self):
+        self.buf = bytearray()
+        self.proc = None
+
+    async def start(self):
+        pass
+
+    async def write(self, data: bytes):
+        self.buf.extend(data)
+
+    async def finish(self):
+        fd, path = tempfile.mkstemp(suffix=".wav" if self.buf[:4] == b"RIFF" else ".mp3")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(self.buf)
+            self.proc = await asyncio.create_subprocess_exec(
+                *self.cmd, path, stdout=asyncio.subprocess.DEVNULL, stderr=asyncio.subprocess.DEVNULL)
+            await self.proc.wait()
+        finally:
+            os.remove(path)
+
+    async def kill(self):
+        if self.proc and self.proc.returncode is None:
+            self.proc.kill()
+            await self.proc.wait()
+
+
+def default_player_factory() -> Callable[[], object]:
+    for name in filter(None, [TTS_PLAYER, "ffplay", "mpv"]):
+        if name in PLAYER_COMMANDS and shutil.which(name):
+            cmd = PLAYER_COMMANDS[name]
+            return lambda: PipePlayer(cmd)
+    return FilePlayer
+
+
+# ---------- 播报任务 ----------
+class TtsJob:
+    def __init__(self, text, voice, rate, priority, seq, supersede):
+        self.text = text
+        self.voice = voice
+        self.rate = rate
+        self.priority = priority
+        self.seq = seq
+        self.supersede = supersede
+        self.submitted_t = time.perf_counter()
+        self.first_audio_t = None
+        self.status = "queued"      # queued / playing / done / cancelled / error
+        self.cached = False
+        self.engine = None
+        self.error = None
+        self.done = threading.Event()
+
+    @property
+    def ttfa_s(self) -> Optional[float]:
+        return None if self.first_audio_t is None else self.first_audio_t - self.submitted_t
+
+    def _finish(self, status, error=None):
+        self.status = status
+        self.error = error
+        self.done.set()
+
+    def wait(self, timeout=None) -> bool:
+        return self.done.wait(timeout)
+
+
+class TtsService:
+    def __init__(self, synth_stream: Optional[SynthStream] = None, player_factory: Optional[Callable] = None,
+                 cache=None):
+        # 默认经 EngineSelector 选引擎（edge-tts / 离线合成，见 tts_engines.py），启动时先做一次健康检查
+        self.synth_stream = synth_stream or get_engine_selector().stream
+        owner = getattr(self.synth_stream, "__self__", None)
+        self.selector = owner if isinstance(owner, EngineSelector) else None
+        self.player_factory = player_factory or default_player_factory()
+        self.cache = cache if cache is not None else get_tts_cache()
+        self._lock = threading.Lock()
+        self._seq = itertools.count()
+        self._loop = None
+        self._queue = None
+        self._thread = None
+        self._ready = threading.Event()
+        self._pending: List[TtsJob] = []       # 只在事件循环线程里读写
+        self._current: Optional[TtsJob] = None
+        self._current_task = None
+        self._health_task = None
+        self.ttfa: List[float] = []
+        self.counts = {"done": 0, "cancelled": 0, "error": 0}
+
+    # ---------- 生命周期 ----------
+    def start(self):
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="tts-service", daemon=True)
+                self._thread.start()
+        self._ready.wait()
+        return self
+
+    def stop(self, timeout=2.0):
+        if self._thread is None:
+            return
+        self._loop.call_soon_threadsafe(self._queue.put_nowait, (float("-inf"), -1, None))
+        self._thread.join(timeout)
+        self._thread = None
+        self._ready.clear()
+
+    def _run(self):
+        self._loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self._loop)
+        self._queue = asyncio.PriorityQueue()
+        self._ready.set()
+        try:
+            self._loop.run_until_complete(self._worker())
+        finally:
+            self._loop.close()
+
+    # ---------- 提交 ----------
+    def say(self, text: str, voice: str = DEFAULT_VOICE, rate: str = DEFAULT_RATE,
+            priority: int = PRIORITY_NORMAL, supersede: bool = True) -> TtsJob:
+        """
+        排队播报，立即返回 TtsJob。
+        supersede=True：作废排队中同级或更低优先级的旧句子，并打断正在播的同级或更低优先级句子。
+        """
+        self.start()
+        job = TtsJob(text, voice, rate, priority, next(self._seq), supersede)
+        self._loop.call_soon_threadsafe(self._enqueue, job)
+        return job
+
+    def _enqueue(self, job: TtsJob):
+        if job.supersede:
+            for old in self._pending:
+                if old.priority >= job.priority and not old.done.is_set():
+                    self._record(old, "cancelled")
+            self._pending = [j for j in self._pending if not j.done.is_set()]
+            cur = self._current
+            if cur is not None and cur.priority >= job.priority and self._current_task is not None:
+                self._current_task.cancel()
+        self._pending.append(job)
+        self._queue.put_nowait((job.priority, job.seq, job))
+
+    # ---------- 播放 ----------
+    async def _check_engines(self):
+        health = await self.selector.check_all()
+        print(f"[TTS] engine health: {health}")
+
+    async def _worker(self):
+        if self.selector is not None:
+            # 不阻塞第一句：检查期间的播报照常走预算兜底
+            self._health_task = asyncio.ensure_future(self._check_engines())
+        while True:
+            _, _, job = await self._queue.get()
+            if job is None:
+                return
+            if job in self._pending:
+                self._pending.remove(job)
+            if job.done.is_set():
+                continue
+            self._current = job
+            self._current_task = asyncio.ensure_future(self._play(job))
+            try:
+                await self._current_task
+            except asyncio.CancelledError:
+                pass
+            finally:
+                self._current = self._current_task = None
+            if not job.done.is_set():
+                # 还没开始跑就被打断
+                self._record(job, "cancelled")
+
+    async def _play(self, job: TtsJob):
+        job.status = "playing"
+        player = self.player_factory()
+        try:
+            await player.start()
+            path = self.cache.get(job.text, job.voice, job.rate)
+            if path:
+                job.cached = True
+                with open(path, "rb") as f:
+                    data = f.read()
+                if player.streaming:
+                    job.first_audio_t = time.perf_counter()
+                await player.write(data)
+            else:
+                buf = bytearray()
+                stream = self.synth_stream(job.text, job.voice, job.rate)
+                async for chunk in stream:
+                    if player.streaming and job.first_audio_t is None:
+                        job.first_audio_t = time.perf_counter()
+                    buf.extend(chunk)
+                    await player.write(chunk)
+                job.engine = getattr(getattr(stream, "engine", None), "name", None)
+                # 离线兜底合成的音频不进缓存，联网后仍用在线音色
+                if buf and getattr(stream, "cacheable", True):
+                    self.cache.put(job.text, bytes(buf), job.voice, job.rate)
+            if job.first_audio_t is None:
+                job.first_audio_t = time.perf_counter()
+            await player.finish()
+            self._record(job, "done")
+        except asyncio.CancelledError:
+            await player.kill()
+            self._record(job, "cancelled")
+            raise
+        except Exception as e:
+            await player.kill()
+            print(f"[TTS ERROR] {e}")
+            self._record(job, "error", e)
+
+    def _record(self, job: TtsJob, status, error=None):
+        job._finish(status, error)
+        with self._lock:
+            self.counts[status] += 1
+            if status == "done" and job.ttfa_s is not None:
+                self.ttfa.append(job.ttfa_s)
+        if status == "done":
+            print(f"[TTS] ttfa={job.ttfa_s * 1000:.0f}ms cached={job.cached} engine={job.engine} {job.text[:24]!r}")
+
+    def stats(self):
+        with self._lock:
+            ttfa = sorted(self.ttfa)
+            return dict(self.counts,
+                        ttfa_p50_s=round(ttfa[len(ttfa) // 2], 3) if ttfa else None,
+                        ttfa_last_s=round(self.ttfa[-1], 3) if ttfa else None)
+
+
+_service = None
+_service_lock = threading.Lock()
+
+
+def get_tts_service() -> TtsService:
+    global _service
+    with _service_lock:
+        if _service is None:
+            _service = TtsService()
+        return _service
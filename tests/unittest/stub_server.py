@@ -0,0 +1,91 @@
+# stub_server.py
+#
+# 单元测试共用的假 OpenAI 兼容服务（本地 ThreadingHTTPServer，随机端口）。
+# respond(payload) 决定每个 POST 的回复：
+# - (status, dict/list) -> JSON；(status, bytes/None) -> 原样/空 body
+# - 生成器 -> SSE 流（每个元素是一个 delta 文本，结尾补 [DONE]），客户端提前断开不报错
+# on_get(path) 同理处理 GET（不给时一律 404）；HEAD 恒为 200，供 preconnect 用。
+# 收到的请求按 (path, 客户端端口, payload) 记在 server.calls 里。
+
+import json
+import threading
+import types
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+def chat_reply(content, **extra):
+    """非流式 /v1/chat/completions 的回复体。"""
+    return dict({"choices": [{"message": {"content": content}}]}, **extra)
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, *a):
+        pass
+
+    def do_HEAD(self):
+        self._reply(200, None)
+
+    def do_GET(self):
+        on_get = self.server.on_get
+        self._send(on_get(self.path) if on_get else (404, None))
+
+    def do_POST(self):
+        payload = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        self.server.calls.append((self.path, self.client_address[1], payload))
+        self._send(self.server.respond(payload))
+
+    def _send(self, result):
+        if isinstance(result, types.GeneratorType):
+            self._stream(result)
+        else:
+            self._reply(*result)
+
+    def _reply(self, status, body):
+        if isinstance(body, (dict, list)):
+            body = json.dumps(body).encode()
+        body = body or b""
+        self.send_response(status)
+        if body:
+            self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _stream(self, pieces):
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        try:
+            for piece in pieces:
+                data = json.dumps({"choices": [{"delta": {"content": piece}, "finish_reason": None}]})
+                self._chunk(f"data: {data}\n\n".encode())
+            self._chunk(b"data: [DONE]\n\n")
+            self.wfile.write(b"0\r\n\r\n")
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+
+    def _chunk(self, data):
+        self.wfile.write(b"%x\r\n%s\r\n" % (len(data), data))
+        self.wfile.flush()
+
+
+class StubServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, respond, on_get=None):
+        super().__init__(("127.0.0.1", 0), _Handler)
+        self.respond = respond
+        self.on_get = on_get
+        self.calls = []
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.server_address[1]}"
+
+    def close(self):
+        self.shutdown()
+        self.server_close()
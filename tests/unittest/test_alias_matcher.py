@@ -0,0 +1,37 @@
+import os, sys, unittest
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(__file__))))
+
+from nlp.alias_matcher import AliasMatcher
+from nlp.instruction_parser import alias_matcher
+from evaluation.eval_parsing import rule_based_parser
+
+class TestAliasMatcher(unittest.TestCase):
+    def test_longest_match_wins(self):
+        m = AliasMatcher({"停车场": "parking", "公司停车场": "officeParking", "公司": "office"})
+        hits = m.find_longest("从公司停车场出发")
+        self.assertEqual([h.canonical for h in hits], ["officeParking"])
+        self.assertEqual((hits[0].begin, hits[0].end), (1, 6))
+
+    def test_overlapping_hits_and_positions(self):
+        m = AliasMatcher({"he": "a", "she": "b", "hers": "c"})
+        hits = {(h.alias, h.begin) for h in m.find_all("ushers")}
+        self.assertEqual(hits, {("she", 1), ("he", 2), ("hers", 2)})
+
+    def test_lookup_is_case_insensitive(self):
+        self.assertEqual(alias_matcher.lookup("  Shopping Mall "), "shoppingMall")
+        self.assertIsNone(alias_matcher.lookup("mydorm"))
+
+class TestRuleParser(unittest.TestCase):
+    def test_chinese_pattern(self):
+        self.assertEqual(rule_based_parser("从学校去医院"), ("school", "hospital"))
+        self.assertEqual(rule_based_parser("从公司停车场到购物中心"), ("officeParking", "shoppingMall"))
+
+    def test_english_pattern(self):
+        self.assertEqual(rule_based_parser("go to hospital from home"), ("home", "hospital"))
+
+    def test_fallback_keeps_order(self):
+        self.assertEqual(rule_based_parser("医院 然后 学校"), ("hospital", "school"))
+        self.assertEqual(rule_based_parser("我想出去玩"), (None, None))
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,77 @@
+import os, sys, time, types, unittest
+from unittest.mock import patch
+import numpy as np
+import speech_recognition as sr
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(__file__))))
+
+from nlp import speech_recognizer
+from nlp.speech_recognizer import (ASR_BACKENDS, AsrBackend, FasterWhisperBackend, WhisperModelHolder,
+                                   get_asr_backend, to_audio_data, transcribe)
+
+class _SleepyBackend(AsrBackend):
+    name = "sleepy"
+
+    def _transcribe(self, audio):
+        time.sleep(0.05)
+        return " 从学校去医院 "
+
+class _FakeFWModel:
+    def __init__(self, name, device, compute_type, cpu_threads):
+        self.args = (name, device, compute_type, cpu_threads)
+        self.calls = []
+
+    def transcribe(self, audio, language=None, beam_size=5):
+        self.calls.append((audio.dtype, audio.shape, language, beam_size))
+        seg = types.SimpleNamespace
+        return iter([seg(text="从家"), seg(text="去市场")]), None
+
+class TestAsrBackends(unittest.TestCase):
+    def test_to_audio_data(self):
+        f = np.zeros(16000, dtype=np.float32)
+        a = to_audio_data(f, 16000)
+        self.assertEqual((len(a.frame_data), a.sample_width), (32000, 2))
+        self.assertIs(to_audio_data(a), a)
+        self.assertEqual(to_audio_data(b"\0\0" * 8000, 8000).sample_rate, 8000)
+
+    def test_backend_must_implement_transcribe(self):
+        with self.assertRaises(TypeError):
+            AsrBackend()
+
+    def test_rtf_reported(self):
+        with patch.dict(ASR_BACKENDS, {"sleepy": _SleepyBackend}):
+            res = transcribe(np.zeros(8000, dtype=np.float32), 16000, backend="sleepy")
+        self.assertEqual((res.text, res.backend), ("从学校去医院", "sleepy"))
+        self.assertAlmostEqual(res.audio_s, 0.5, places=3)
+        self.assertGreater(res.rtf, 0.09)
+        st = get_asr_backend("sleepy").stats()
+        self.assertEqual(st["calls"], 1)
+        self.assertIsNotNone(st["rtf"])
+
+    def test_unknown_backend(self):
+        with self.assertRaises(ValueError):
+            get_asr_backend("nope")
+
+    def test_faster_whisper_int8(self):
+        fake = types.ModuleType("faster_whisper")
+        fake.WhisperModel = _FakeFWModel
+        with patch.dict(sys.modules, {"faster_whisper": fake}):
+            holder = WhisperModelHolder("small", None, 4, loader=speech_recognizer._load_faster_whisper)
+            backend = FasterWhisperBackend(holder, language="zh", beam_size=2)
+            self.assertFalse(holder.is_loaded)
+            audio = sr.AudioData(b"\0\0" * 48000, 48000, 2)
+            res = backend.transcribe(audio)
+        model = holder.get()
+        self.assertEqual(model.args, ("small", "cpu", "int8", 4))
+        dtype, shape, lang, beam = model.calls[0]
+        self.assertEqual((dtype, shape, lang, beam), (np.float32, (16000,), "zh", 2))
+        self.assertEqual(res.text, "从家去市场")
+        self.assertAlmostEqual(res.audio_s, 1.0, places=3)
+
+    def test_google_backend_is_default(self):
+        if os.getenv("ASR_BACKEND"):
+            self.skipTest("ASR_BACKEND overridden")
+        self.assertEqual(get_asr_backend().name, "google")
+        self.assertFalse(speech_recognizer.whisper_model.is_loaded)
+
+if __name__ == "__main__":
+    unittest.main()
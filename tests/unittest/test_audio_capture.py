@@ -0,0 +1,107 @@
+import os, sys, queue, tempfile, threading, unittest
+import numpy as np
+import speech_recognition as sr
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(__file__))))
+
+from nlp.audio_capture import AudioCapture, audio_to_numpy, rms
+
+CHUNK = 1600    # 16 kHz 下 0.1 s 一块
+
+def block(amp):
+    x = np.full(CHUNK, amp, dtype=np.int16)
+    x[1::2] *= -1
+    return x.tobytes()
+
+class _FakeMic:
+    """假的 sr.Microphone：测试往队列里喂块，读到 None 表示流结束。"""
+    SAMPLE_RATE, SAMPLE_WIDTH, CHUNK = 16000, 2, CHUNK
+    opened = 0
+
+    def __init__(self):
+        self.feed = queue.Queue()
+        self.stream = self
+
+    def __enter__(self):
+        type(self).opened += 1
+        return self
+
+    def __exit__(self, *a):
+        self.feed.put(None)
+
+    def read(self, n):
+        data = self.feed.get(timeout=5)
+        return data or b""
+
+class TestAudioCapture(unittest.TestCase):
+    def setUp(self):
+        self.mic = _FakeMic()
+        self.cap = AudioCapture(source_factory=lambda: self.mic, buffer_s=5).start()
+        for _ in range(5):
+            self.mic.feed.put(block(50))
+        self.assertTrue(self.cap._calibrated.wait(2))
+
+    def tearDown(self):
+        self.mic.feed.put(None)
+        self.cap.stop()
+
+    def _listen_async(self, **kw):
+        out = {}
+        def run():
+            try:
+                out["audio"] = self.cap.listen(**kw)
+            except Exception as e:
+                out["error"] = e
+        t = threading.Thread(target=run)
+        t.start()
+        return t, out
+
+    def test_calibrated_once(self):
+        self.assertAlmostEqual(self.cap.noise_floor, 50, delta=1)
+        opened = _FakeMic.opened
+        self.assertIs(self.cap.start(), self.cap)
+        self.assertEqual(_FakeMic.opened, opened)
+
+    def test_phrase_in_memory(self):
+        cwd = os.getcwd()
+        with tempfile.TemporaryDirectory() as d:
+            os.chdir(d)
+            try:
+                t, out = self._listen_async(timeout=5, phrase_time_limit=10)
+                for amp in [50] * 3 + [3000] * 6 + [50] * 10:
+                    self.mic.feed.put(block(amp))
+                t.join(5)
+                self.assertEqual(os.listdir(d), [])
+            finally:
+                os.chdir(cwd)
+        audio = out["audio"]
+        self.assertIsInstance(audio, sr.AudioData)
+        n_chunks = len(audio.frame_data) // (CHUNK * 2)
+        # 预录 3 块 + 语音 6 块 + 保留 3 块尾静音
+        self.assertEqual(n_chunks, 12)
+        self.assertEqual(audio_to_numpy(audio).dtype, np.float32)
+
+    def test_timeout_without_speech(self):
+        t, out = self._listen_async(timeout=0.3)
+        for _ in range(50):
+            self.mic.feed.put(block(50))
+            if not t.is_alive():
+                break
+            t.join(0.02)
+        t.join(2)
+        self.assertIsInstance(out.get("error"), sr.WaitTimeoutError)
+
+    def test_noise_floor_tracks_quiet_chunks(self):
+        for _ in range(60):
+            self.mic.feed.put(block(120))
+        self.mic.feed.put(block(10000))   # 语音块不应拉高底噪
+        with self.cap._cond:
+            self.assertTrue(self.cap._cond.wait_for(lambda: self.cap._seq >= 66, 2))
+        self.assertGreater(self.cap.noise_floor, 100)
+        self.assertLess(self.cap.noise_floor, 121)
+
+    def test_rms(self):
+        self.assertAlmostEqual(rms(block(300)), 300, delta=0.5)
+        self.assertEqual(rms(b""), 0.0)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,77 @@
+import os, sys, types, unittest
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(__file__))))
+
+from control.behaviour import BRAKE, DRIVE, HOLD, BehaviourStateMachine, vehicle_speed
+from control.signal_index import Signal
+
+STOP = Signal(0, "Stop", "stop", None, 0.0, 0.0, 0.0, "custom")
+LIMIT = Signal(1, "SpeedLimit30", "speed", 30.0, 0.0, 0.0, 0.0, "custom")
+
+class _FakeAgent:
+    def __init__(self):
+        self.speeds = []
+
+    def set_target_speed(self, speed):
+        self.speeds.append(speed)
+
+class TestBehaviourStateMachine(unittest.TestCase):
+    def _run_until_drive(self, fsm, speeds):
+        states = []
+        for v in speeds:
+            states.append(fsm.step(v))
+            if len(states) > 1 and states[-1] == DRIVE:
+                break
+        return states
+
+    def test_stop_holds_for_sim_seconds(self):
+        fsm = BehaviourStateMachine(dt=0.05, stop_hold_s=3.0)
+        self.assertTrue(fsm.on_signal(STOP))
+        self.assertEqual(fsm.state, BRAKE)
+        # 前 10 个 tick 还在减速，之后停住
+        speeds = [5.0 - 0.5 * i for i in range(10)] + [0.0] * 200
+        states = self._run_until_drive(fsm, speeds)
+        self.assertEqual(states[:10], [BRAKE] * 10)
+        self.assertEqual(states.count(HOLD), 60)          # 3.0 s / 0.05 s
+        self.assertEqual(states[-1], DRIVE)
+        self.assertAlmostEqual(fsm.sim_time, 71 * 0.05)
+
+    def test_hold_scales_with_fixed_delta(self):
+        fsm = BehaviourStateMachine(dt=0.1, stop_hold_s=3.0)
+        fsm.on_signal(STOP)
+        states = self._run_until_drive(fsm, [0.0] * 100)
+        self.assertEqual(states.count(HOLD), 30)
+        self.assertEqual(BehaviourStateMachine(dt=None).dt, 0.05)
+
+    def test_each_sign_triggers_once(self):
+        fsm = BehaviourStateMachine(dt=0.05, stop_hold_s=0.5)
+        fsm.on_signal(STOP)
+        self._run_until_drive(fsm, [0.0] * 100)
+        # 恢复行驶后标志仍在触发半径内，不应再次停车
+        self.assertFalse(fsm.on_signal(STOP))
+        self.assertEqual(fsm.step(3.0), DRIVE)
+
+    def test_speed_limit_does_not_stop(self):
+        agent = _FakeAgent()
+        fsm = BehaviourStateMachine(agent=agent)
+        self.assertTrue(fsm.on_signal(LIMIT))
+        self.assertFalse(fsm.on_signal(LIMIT))
+        self.assertEqual(fsm.state, DRIVE)
+        self.assertEqual(agent.speeds, [30.0])
+        self.assertFalse(fsm.on_signal(Signal(2, "SpeedLimit", "speed", None, 0, 0, 0, "custom")))
+        self.assertFalse(fsm.on_signal(Signal(3, "Tree", "other", None, 0, 0, 0, "opendrive")))
+
+    def test_resume_reapplies_speed_limit(self):
+        agent = _FakeAgent()
+        fsm = BehaviourStateMachine(dt=0.05, stop_hold_s=0.5, agent=agent)
+        fsm.on_signal(LIMIT)
+        fsm.on_signal(STOP)
+        states = self._run_until_drive(fsm, [0.0] * 100)
+        self.assertEqual(states[-1], DRIVE)
+        self.assertEqual(agent.speeds, [30.0, 30.0])
+
+    def test_vehicle_speed(self):
+        vehicle = types.SimpleNamespace(get_velocity=lambda: types.SimpleNamespace(x=3.0, y=4.0, z=0.0))
+        self.assertEqual(vehicle_speed(vehicle), 5.0)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,105 @@
+import os, sys, tempfile, threading, time, types, unittest
+from unittest.mock import patch
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(__file__))))
+
+import numpy as np
+
+from control.camera_recorder import CameraRecorder, RecorderConfig, _image_writer
+
+W, H = 8, 6
+
+class _FakeImage:
+    """模拟 carla.Image：只用到 raw_data / width / height / frame。"""
+    def __init__(self, frame, width=W, height=H):
+        self.frame, self.width, self.height = frame, width, height
+        bgra = np.zeros((height, width, 4), dtype=np.uint8)
+        bgra[..., 0], bgra[..., 1], bgra[..., 2], bgra[..., 3] = frame % 256, 1, 2, 255
+        self.raw_data = memoryview(bgra.tobytes())
+
+class TestCameraRecorder(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def _recorder(self, **kw):
+        return CameraRecorder(RecorderConfig(out_dir=self.tmp.name, fmt="npy", width=W, height=H, **kw))
+
+    def test_writes_bgr_frames_and_keep_every(self):
+        rec = self._recorder(keep_every=2)
+        for i in range(10):
+            rec.on_image(_FakeImage(i))
+        rec.close()
+        self.assertEqual(sorted(os.listdir(self.tmp.name)), [f"{i:06d}.npy" for i in range(0, 10, 2)])
+        img = np.load(os.path.join(self.tmp.name, "000004.npy"))
+        self.assertEqual(img.shape, (H, W, 3))
+        self.assertEqual(img[0, 0].tolist(), [4, 1, 2])
+        self.assertEqual(rec.stats(), {"seen": 10, "skipped": 5, "dropped": 0, "written": 5, "errors": 0})
+
+    def test_drops_instead_of_blocking_when_writer_lags(self):
+        rec = self._recorder(slots=2, workers=1)
+        gate = threading.Event()
+
+        def slow_write(path, bgr):
+            gate.wait(2)
+            np.save(path, bgr)
+        rec._write = slow_write
+
+        t0 = time.perf_counter()
+        for i in range(20):
+            rec.on_image(_FakeImage(i))
+        # 回调不等编码：20 帧的拷贝远小于一次写盘
+        self.assertLess(time.perf_counter() - t0, 0.5)
+        gate.set()
+        rec.close()
+        s = rec.stats()
+        self.assertEqual(s["written"], 2)
+        self.assertEqual(s["dropped"], 18)
+        self.assertEqual(len(os.listdir(self.tmp.name)), 2)
+
+    def test_size_mismatch_counts_error_and_frees_slot(self):
+        rec = self._recorder(slots=1, workers=1)
+        rec.on_image(_FakeImage(0, width=W * 2))
+        rec.on_image(_FakeImage(1))
+        rec.close()
+        s = rec.stats()
+        self.assertEqual((s["errors"], s["written"], s["dropped"]), (1, 1, 0))
+
+    def test_rejects_non_positive_counts(self):
+        for field in ("keep_every", "slots", "workers"):
+            with self.assertRaises(ValueError):
+                self._recorder(**{field: 0})
+
+    def test_cv2_write_failure_raises(self):
+        fake_cv2 = types.SimpleNamespace(IMWRITE_JPEG_QUALITY=1, IMWRITE_PNG_COMPRESSION=16,
+                                         imwrite=lambda path, img, params: False)
+        with patch.dict(sys.modules, {"cv2": fake_cv2}):
+            write = _image_writer("png", 90)
+        with self.assertRaises(OSError):
+            write(os.path.join(self.tmp.name, "x.png"), np.zeros((H, W, 3), dtype=np.uint8))
+
+    def test_default_format_is_png(self):
+        self.assertEqual(RecorderConfig().fmt, "png")
+        with patch.dict(os.environ, {}, clear=False):
+            os.environ.pop("CAMERA_FORMAT", None)
+            self.assertEqual(RecorderConfig.from_env().fmt, "png")
+
+    def test_config_from_env(self):
+        env = {"CAMERA_RECORD": "0", "CAMERA_FORMAT": "png", "CAMERA_SENSOR_TICK": "0.1", "CAMERA_KEEP_EVERY": "3"}
+        old = {k: os.environ.get(k) for k in env}
+        os.environ.update(env)
+        try:
+            cfg = RecorderConfig.from_env()
+        finally:
+            for k, v in old.items():
+                if v is None:
+                    os.environ.pop(k)
+                else:
+                    os.environ[k] = v
+        self.assertEqual((cfg.enabled, cfg.fmt, cfg.sensor_tick, cfg.keep_every), (False, "png", 0.1, 3))
+        with self.assertRaises(ValueError):
+            CameraRecorder(RecorderConfig(out_dir=self.tmp.name, fmt="bmp"))
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,63 @@
+import os, sys, json, re, unittest
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(__file__))))
+
+from nlp.constrained import build_gbnf, build_json_schema
+from nlp.instruction_parser import chat_with_local_llm, ALLOWED_PLACES
+from tests.unittest.stub_server import StubServer, chat_reply
+
+def _grammar_reply(payload):
+    """假的 llama.cpp：检查请求里的约束，并只从约束允许的地名里取值返回。"""
+    if "grammar" in payload:
+        allowed = re.findall(r'"\\"(\w+)\\""', payload["grammar"].split("place ::=", 1)[1])
+    elif "response_format" in payload:
+        allowed = payload["response_format"]["json_schema"]["schema"]["properties"]["start"]["enum"]
+    else:
+        allowed = []
+    if allowed:
+        content = json.dumps({"start": allowed[0], "end": allowed[-1]}, separators=(",", ":"))
+    else:
+        content = "Sure! The start is the school and the end is home."
+    return 200, chat_reply(content)
+
+class TestConstrainedLocalLLM(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.server = StubServer(_grammar_reply)
+        cls.endpoint = cls.server.url
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.close()
+
+    @property
+    def last_payload(self):
+        return self.server.calls[-1][2]
+
+    def test_gbnf_lists_every_place(self):
+        g = build_gbnf(["home", "school"])
+        self.assertTrue(g.startswith("root ::= "))
+        self.assertIn('place ::= "\\"home\\"" | "\\"school\\""', g)
+
+    def test_grammar_payload(self):
+        obj = chat_with_local_llm("从学校回家", endpoint=self.endpoint, model="m", constrain="grammar")
+        payload = self.last_payload
+        self.assertIn("grammar", payload)
+        self.assertLessEqual(payload["max_tokens"], 24)
+        for place in ALLOWED_PLACES:
+            self.assertIn(f'"\\"{place}\\""', payload["grammar"])
+        self.assertIn(obj["start"], ALLOWED_PLACES)
+        self.assertIn(obj["end"], ALLOWED_PLACES)
+
+    def test_schema_payload(self):
+        obj = chat_with_local_llm("从学校回家", endpoint=self.endpoint, model="m", constrain="schema")
+        schema = self.last_payload["response_format"]["json_schema"]["schema"]
+        self.assertEqual(schema, build_json_schema(ALLOWED_PLACES))
+        self.assertIn(obj["end"], ALLOWED_PLACES)
+
+    def test_unconstrained_free_text(self):
+        obj = chat_with_local_llm("从学校回家", endpoint=self.endpoint, model="m", constrain="none")
+        self.assertNotIn("grammar", self.last_payload)
+        self.assertEqual(obj, {})
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,73 @@
+import os, sys, csv, json, tempfile, unittest, unittest.mock, wave
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(__file__))))
+
+from evaluation import eval_asr
+
+FIXTURES = [
+    ("001.wav", "从学校去医院", 1),
+    ("002.wav", "从家去市场", 2),
+    ("003.wav", "go to the hospital from home", 3),
+    ("004.wav", "你好", 4),
+]
+
+def write_wav(path, seconds, value):
+    with wave.open(path, "wb") as w:
+        w.setnchannels(1)
+        w.setsampwidth(2)
+        w.setframerate(16000)
+        w.writeframes(int(value).to_bytes(2, "little", signed=True) * int(16000 * seconds))
+
+class TestEvalAsr(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        d = self.tmp.name
+        with open(os.path.join(d, "transcripts.jsonl"), "w", encoding="utf-8") as f:
+            for name, text, v in FIXTURES:
+                # 每条音频内容不同，桩按哈希找回参考文本
+                write_wav(os.path.join(d, name), 0.5, v)
+                f.write(json.dumps({"wav": name, "text": text}, ensure_ascii=False) + "\n")
+        self.out_csv = os.path.join(d, "out", "asr_results.csv")
+        self.out_txt = os.path.join(d, "out", "asr_summary.txt")
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def _run(self, *extra):
+        return eval_asr.main(["--wav_dir", self.tmp.name, "--backends", "google", "--stub_latency", "0.01",
+                              "--out_csv", self.out_csv, "--out_txt", self.out_txt, *extra])
+
+    def test_corpus_gold_from_reference(self):
+        items = eval_asr.load_corpus(self.tmp.name)
+        self.assertEqual([(it["gold_start"], it["gold_end"]) for it in items],
+                         [("school", "hospital"), ("home", "market"), ("home", "hospital"), (None, None)])
+
+    def test_stub_cloud_offline(self):
+        (name, total, correct, acc, rtf, p50, p95, rss, _load), = self._run()
+        self.assertEqual((name, total, correct, acc), ("google-stub", 3, 3, 100.0))
+        self.assertGreater(rtf, 0)
+        self.assertLessEqual(p50, p95)
+        self.assertGreater(rss, 0)
+        with open(self.out_csv, encoding="utf-8") as f:
+            rows = list(csv.DictReader(f))
+        self.assertEqual(len(rows), 4)
+        self.assertEqual(rows[0]["hyp_text"], "从学校去医院")
+        # 没有金标的样本不算对，只打标记
+        self.assertEqual((rows[3]["correct"], rows[3]["tags"]), ("", "no_gold"))
+
+    def test_sharded_workers(self):
+        (_, total, correct, *_rest), = self._run("--workers", "2")
+        self.assertEqual((total, correct), (3, 3))
+
+    def test_error_tag_names_bare_exception(self):
+        with unittest.mock.patch.object(eval_asr, "make_backend") as make:
+            make.return_value.name = "google"
+            make.return_value.holder = None
+            make.return_value.transcribe.side_effect = TimeoutError()
+            (_, total, correct, *_rest), = self._run()
+        self.assertEqual((total, correct), (3, 0))
+        with open(self.out_csv, encoding="utf-8") as f:
+            tags = [r["tags"] for r in csv.DictReader(f)]
+        self.assertEqual(tags, ["ERR:TimeoutError"] * 3 + ["ERR:TimeoutError,no_gold"])
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,81 @@
+import os, sys, time, threading, unittest
+from unittest.mock import patch
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(__file__))))
+
+from nlp.hedged_parse import HedgedParser, HedgePolicy
+
+def slow(answer, delay):
+    def backend(_text, cancel):
+        cancel.wait(delay)
+        return answer
+    return backend
+
+class TestHedgedParser(unittest.TestCase):
+    def test_fastest_whitelisted_answer_wins(self):
+        hp = HedgedParser(HedgePolicy(["local", "cloud"]), backends={
+            "local": slow(("school", "hospital"), 0.0),
+            "cloud": slow(("home", "market"), 1.0),
+        })
+        t0 = time.perf_counter()
+        out = hp.parse("从学校去医院")
+        self.assertLess(time.perf_counter() - t0, 0.5)
+        self.assertEqual((out["start"], out["end"], out["tier"]), ("school", "hospital", "local"))
+        self.assertEqual(out["confidence"], 1.0)
+        self.assertEqual(hp.stats()["wins"], {"local": 1, "cloud": 0})
+
+    def test_invalid_answer_does_not_win(self):
+        hp = HedgedParser(HedgePolicy(["local", "cloud"]), backends={
+            "local": slow(("library", "hospital"), 0.0),
+            "cloud": slow(("home", "market"), 0.05),
+        })
+        out = hp.parse("回家之后再去买点菜")
+        self.assertEqual(out["tier"], "cloud")
+
+    def test_delayed_tier_not_dispatched_after_win(self):
+        called = threading.Event()
+        def cloud(_text, _cancel):
+            called.set()
+            return "home", "market"
+        hp = HedgedParser(HedgePolicy(["rule", "cloud"], delays={"cloud": 0.3}),
+                          backends={"cloud": cloud})
+        out = hp.parse("从学校去医院")
+        self.assertEqual(out["tier"], "rule")
+        time.sleep(0.4)
+        self.assertFalse(called.is_set())
+        self.assertEqual(hp.stats()["dispatched"]["cloud"], 0)
+
+    def test_no_answer_and_errors(self):
+        def boom(_text, _cancel):
+            raise RuntimeError("offline")
+        hp = HedgedParser(HedgePolicy(["local", "cloud"]), backends={
+            "local": boom, "cloud": slow((None, None), 0.0)})
+        out = hp.parse("我想出去玩")
+        self.assertIsNone(out["tier"])
+        self.assertEqual(out["confidence"], 0.0)
+        self.assertEqual(hp.stats()["no_answer"], 1)
+
+    def test_rule_winner_keeps_rule_confidence(self):
+        out = HedgedParser(HedgePolicy(["rule"])).parse("从学校去医院")
+        self.assertEqual(out["tier"], "rule")
+        self.assertGreaterEqual(out["confidence"], 0.8)
+
+    def test_local_loser_is_cancelled(self):
+        seen = {}
+        def fake_local(text, endpoint=None, model=None, constrain=None, cancel=None):
+            seen["cancel"] = cancel
+            cancel.wait(2.0)
+            return {}
+        hp = HedgedParser(HedgePolicy(["rule", "local"]), backends={"rule": slow(("school", "hospital"), 0.1)})
+        with patch("nlp.instruction_parser.chat_with_local_llm", side_effect=fake_local):
+            t0 = time.perf_counter()
+            out = hp.parse("从学校去医院")
+            self.assertEqual(out["tier"], "rule")
+            self.assertLess(time.perf_counter() - t0, 1.0)
+            # 规则层赢了之后，本地请求拿到的 cancel 已置位，会立刻断开
+            deadline = time.time() + 1
+            while "cancel" not in seen and time.time() < deadline:
+                time.sleep(0.01)
+            self.assertTrue(seen["cancel"].is_set())
+
+if __name__ == "__main__":
+    unittest.main()
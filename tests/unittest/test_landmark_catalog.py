@@ -0,0 +1,68 @@
+import os, sys, unittest
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(__file__))))
+
+from nlp.landmark_catalog import LandmarkCatalog, get_catalog
+from nlp import instruction_parser
+
+class _Map:
+    def __init__(self, n):
+        self.calls = 0
+        self.n = n
+    def get_spawn_points(self):
+        self.calls += 1
+        return [f"sp{i}" for i in range(self.n)]
+
+class _World:
+    def __init__(self, n=300, wid=1):
+        self.id = wid
+        self.map = _Map(n)
+    def get_map(self):
+        return self.map
+
+class TestLandmarkCatalog(unittest.TestCase):
+    def setUp(self):
+        self.cat = LandmarkCatalog.load()
+
+    def test_single_source_for_parser(self):
+        cat = get_catalog()
+        self.assertIs(instruction_parser.alias_map, cat.alias_map)
+        self.assertIs(instruction_parser.ALLOWED_PLACES, cat.allowed)
+        self.assertIn("cottageArea", cat.allowed)
+        self.assertEqual(cat.lookup("火车站"), "railway")
+        self.assertEqual(cat.lookup(" ShoppingMall "), "shoppingMall")
+        self.assertEqual(cat.lookup("cottagearea"), "cottageArea")
+
+    def test_whitelist_bits(self):
+        self.assertTrue(self.cat.is_valid_route("home", "school"))
+        self.assertFalse(self.cat.is_valid_route("home", "home"))
+        self.assertFalse(self.cat.is_valid_route("home", "library"))
+        self.assertEqual(self.cat.mask(["home", "library"]), 0)
+        self.assertEqual(self.cat.mask(self.cat.ids), self.cat.all_mask)
+
+    def test_routable_needs_spawn_points(self):
+        self.assertTrue(self.cat.is_valid_route("home", "highspeed"))
+        self.assertFalse(self.cat.routable("home", "highspeed"))
+        self.assertFalse(self.cat.routable("highspeed", "school"))
+        self.assertTrue(self.cat.routable("home", "school"))
+
+    def test_prompts_cached_and_complete(self):
+        p = self.cat.system_prompt("cloud")
+        self.assertIs(p, self.cat.system_prompt("cloud"))
+        for place in self.cat.ids:
+            self.assertIn(place, p)
+        self.assertIn('{"start"', self.cat.system_prompt("local"))
+
+    def test_transforms_cached_per_world(self):
+        world = _World()
+        lm = self.cat.transforms(world)
+        self.cat.transforms(world)
+        self.assertEqual(world.map.calls, 1)
+        self.assertEqual(lm["home"], "sp109")
+        self.assertNotIn("highspeed", lm)
+
+    def test_insufficient_spawn_points(self):
+        with self.assertRaises(ValueError):
+            self.cat.transforms(_World(n=100, wid=2))
+
+if __name__ == "__main__":
+    unittest.main()
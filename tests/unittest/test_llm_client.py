@@ -0,0 +1,82 @@
+import os, sys, unittest
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(__file__))))
+
+import requests
+from unittest.mock import patch
+from nlp import instruction_parser
+from nlp.llm_client import ParserClient, get_client
+from tests.unittest.stub_server import StubServer, chat_reply
+
+class _Flaky:
+    """前 fail_first 次返回 503，之后正常作答。"""
+    def __init__(self):
+        self.fail_first = 0
+
+    def __call__(self, payload):
+        if self.fail_first > 0:
+            self.fail_first -= 1
+            return 503, None
+        return 200, chat_reply('{"start":"school","end":"home"}')
+
+class TestParserClient(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.stub = _Flaky()
+        cls.server = StubServer(cls.stub)
+        cls.base = cls.server.url
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.close()
+
+    def setUp(self):
+        self.server.calls.clear()
+        self.stub.fail_first = 0
+
+    def test_keep_alive_reuses_connection(self):
+        client = ParserClient(self.base, backoff=0.0)
+        client.preconnect(background=False)
+        for _ in range(3):
+            self.assertIn("school", client.chat([{"role": "user", "content": "x"}], model="m"))
+        ports = {port for _, port, _ in self.server.calls}
+        self.assertEqual(len(ports), 1)
+        self.assertEqual(self.server.calls[0][0], "/v1/chat/completions")
+
+    def test_base_url_with_v1(self):
+        client = ParserClient(self.base + "/v1", backoff=0.0)
+        client.chat([{"role": "user", "content": "x"}], model="m")
+        self.assertEqual(self.server.calls[0][0], "/v1/chat/completions")
+
+    def test_retries_then_succeeds(self):
+        self.stub.fail_first = 2
+        client = ParserClient(self.base, max_retries=2, backoff=0.0)
+        client.chat([{"role": "user", "content": "x"}], model="m")
+        self.assertEqual(len(self.server.calls), 3)
+
+    def test_retries_exhausted_raises(self):
+        self.stub.fail_first = 5
+        client = ParserClient(self.base, max_retries=1, backoff=0.0)
+        with self.assertRaises(requests.HTTPError):
+            client.chat([{"role": "user", "content": "x"}], model="m")
+        self.assertEqual(len(self.server.calls), 2)
+
+    def test_connect_error_is_bounded(self):
+        client = ParserClient("http://127.0.0.1:1", connect_timeout=0.2, max_retries=1, backoff=0.0)
+        with self.assertRaises(requests.ConnectionError):
+            client.chat([{"role": "user", "content": "x"}], model="m")
+
+    def test_get_client_keys_on_settings(self):
+        a = get_client("http://127.0.0.1:9/v1", read_timeout=60.0)
+        self.assertIs(a, get_client("http://127.0.0.1:9/v1/", read_timeout=60.0))
+        b = get_client("http://127.0.0.1:9/v1", pool_size=32)
+        self.assertIsNot(a, b)
+        self.assertEqual(a.timeout[1], 60.0)
+
+    def test_deepseek_network_error_falls_back(self):
+        client = ParserClient("http://127.0.0.1:1", connect_timeout=0.2, max_retries=0)
+        with patch.object(instruction_parser, "cloud_client", return_value=client):
+            out = instruction_parser.chat_with_deepseek("从学校去医院", use_cache=False, stream=False)
+        self.assertEqual(out, {"start": "current", "end": "home"})
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,92 @@
+import os, sys, unittest
+from unittest.mock import patch
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(__file__))))
+
+from nlp import instruction_parser
+from nlp.local_prefix import PrefillInfo, PrefixStats, SlotPool, prefix_params, read_prefill
+from tests.unittest.stub_server import StubServer, chat_reply
+
+class _PrefixStub:
+    """假的 llama.cpp：按槽位记住上一次的 prompt，返回公共前缀长度作为 cache_n。"""
+    def __init__(self):
+        self.slots = {}
+
+    def props(self, path):
+        return (200, {"total_slots": 3}) if path == "/props" else (404, None)
+
+    def __call__(self, payload):
+        tokens = list("".join(m["content"] for m in payload["messages"]))
+        cache_n = 0
+        slot = payload.get("id_slot", -1)
+        if payload.get("cache_prompt") and slot in self.slots:
+            for a, b in zip(self.slots[slot], tokens):
+                if a != b:
+                    break
+                cache_n += 1
+        self.slots[slot] = tokens
+        return 200, chat_reply('{"start":"school","end":"home"}',
+                               timings={"prompt_n": len(tokens) - cache_n, "cache_n": cache_n})
+
+class TestReadPrefill(unittest.TestCase):
+    def test_llamacpp_timings(self):
+        self.assertEqual(read_prefill({"timings": {"prompt_n": 5, "cache_n": 95}}), PrefillInfo(100, 95))
+
+    def test_openai_usage(self):
+        usage = {"prompt_tokens": 120, "prompt_tokens_details": {"cached_tokens": 100}}
+        self.assertEqual(read_prefill({"usage": usage}), PrefillInfo(120, 100))
+        self.assertEqual(read_prefill({"usage": {"prompt_tokens": 80, "prompt_cache_hit_tokens": 64}}), PrefillInfo(80, 64))
+        self.assertIsNone(read_prefill({"choices": []}))
+
+    def test_stats_summary(self):
+        st = PrefixStats()
+        st.record(PrefillInfo(100, 90))
+        st.record(None)
+        s = st.summary()
+        self.assertEqual((s["calls"], s["reported"], s["saved_per_call"]), (2, 1, 90.0))
+
+class TestSlotPool(unittest.TestCase):
+    def test_acquire_release(self):
+        pool = SlotPool(2, wait_s=0.01)
+        a, b = pool.acquire(), pool.acquire()
+        self.assertEqual({a, b}, {0, 1})
+        self.assertEqual(pool.acquire(), -1)
+        pool.release(a)
+        self.assertEqual(pool.acquire(), a)
+        self.assertEqual(prefix_params(-1), {"cache_prompt": True})
+        self.assertEqual(prefix_params(1), {"cache_prompt": True, "id_slot": 1})
+
+class TestLocalPrefixReuse(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.stub = _PrefixStub()
+        cls.server = StubServer(cls.stub, on_get=cls.stub.props)
+        cls.endpoint = cls.server.url
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.close()
+
+    def test_warmup_then_prefix_hit(self):
+        with patch.object(instruction_parser, "LOCAL_LLM_SLOTS", 2):
+            self.assertEqual(instruction_parser.warm_local_llm(self.endpoint, "stub"), 2)
+            self.assertEqual(set(self.stub.slots), {0, 1})
+            instruction_parser.local_prefix_stats.reset()
+            obj = instruction_parser.chat_with_local_llm("从学校回家", endpoint=self.endpoint, model="stub")
+        self.assertEqual(obj, {"start": "school", "end": "home"})
+        last = self.server.calls[-1][2]
+        self.assertTrue(last["cache_prompt"])
+        self.assertIn(last["id_slot"], (0, 1))
+        system_len = len(instruction_parser.CATALOG.system_prompt("local"))
+        s = instruction_parser.local_prefix_stats.summary()
+        self.assertGreaterEqual(s["cached_tokens"], system_len)
+
+    def test_slot_count_read_from_server(self):
+        with patch.object(instruction_parser, "LOCAL_LLM_SLOTS", None), \
+             patch.dict(instruction_parser._slot_pools, clear=True):
+            self.assertEqual(instruction_parser.local_slots(self.endpoint + "/v1").n_slots, 3)
+            # 连不上（或不是 llama.cpp）时按启动脚本的默认槽位数
+            self.assertEqual(instruction_parser.local_slots("http://127.0.0.1:9").n_slots,
+                             instruction_parser.DEFAULT_LOCAL_SLOTS)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,64 @@
+import os, sys, tempfile, time, unittest
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(__file__))))
+
+from nlp.ngram_classifier import NgramClassifier, dataset_examples, get_ngram_classifier, ngram_ids, train_default
+
+class TestNgramClassifier(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        # 不用评测集训练，评测集当作留出集
+        cls.clf = train_default(include_dataset=False, per_pair=8)
+
+    def test_ngram_ids_are_stable(self):
+        a = ngram_ids("从学校去医院")
+        self.assertEqual(sorted(a), sorted(ngram_ids("  从学校去医院 ")))
+        self.assertTrue(all(0 <= i < 1 << 14 for i in a))
+
+    def test_direction(self):
+        self.assertEqual(self.clf.predict("从学校去医院")[:2], ("school", "hospital"))
+        self.assertEqual(self.clf.predict("从医院去学校")[:2], ("hospital", "school"))
+        self.assertEqual(self.clf.predict("go to market from home")[:2], ("home", "market"))
+
+    def test_heldout_dataset(self):
+        data = dataset_examples()
+        preds = self.clf.predict_many([t for t, _, _ in data])
+        correct = sum((p.start, p.end) == (s, e) for p, (_, s, e) in zip(preds, data))
+        self.assertGreaterEqual(correct, int(0.75 * len(data)))
+
+    def test_confidence_drops_off_vocabulary(self):
+        known = self.clf.predict("从学校去医院").confidence
+        unknown = self.clf.predict("今天天气不错").confidence
+        self.assertGreater(known, 0.8)
+        self.assertLess(unknown, 0.5)
+
+    def test_roundtrip_artifact(self):
+        with tempfile.TemporaryDirectory() as d:
+            path = os.path.join(d, "ngram.npz")
+            self.clf.save(path)
+            t0 = time.perf_counter()
+            loaded = NgramClassifier.load(path)
+            self.assertLess(time.perf_counter() - t0, 0.5)
+        self.assertEqual(loaded.classes, self.clf.classes)
+        self.assertEqual(loaded.predict("从家去商场")[:2], self.clf.predict("从家去商场")[:2])
+
+    def test_dataset_flag_roundtrip(self):
+        self.assertFalse(self.clf.trained_on_dataset)
+        with tempfile.TemporaryDirectory() as d:
+            path = os.path.join(d, "ngram.npz")
+            self.clf.trained_on_dataset = True
+            try:
+                self.clf.save(path)
+            finally:
+                self.clf.trained_on_dataset = False
+            self.assertTrue(NgramClassifier.load(path).trained_on_dataset)
+
+    def test_shared_instance_per_path(self):
+        with tempfile.TemporaryDirectory() as d:
+            a, b = os.path.join(d, "a.npz"), os.path.join(d, "b.npz")
+            self.clf.save(a)
+            self.clf.save(b)
+            self.assertIs(get_ngram_classifier(a), get_ngram_classifier(a))
+            self.assertIsNot(get_ngram_classifier(a), get_ngram_classifier(b))
+
+if __name__ == "__main__":
+    unittest.main()
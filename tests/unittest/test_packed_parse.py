@@ -0,0 +1,75 @@
+import os, sys, json, re, unittest
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(__file__))))
+
+from nlp.llm_client import ParserClient
+from nlp.packed_parse import PackedParser, client_chat_fn, split_packed_response
+from nlp.rule_parser import rule_parse
+from tests.unittest.stub_server import StubServer, chat_reply
+
+def _packed_reply(payload):
+    """
+    假的 LLM：把编号指令用规则解析器逐条作答，拼成 JSON 数组返回。
+    含“图书馆”的条目故意答成白名单外的地名，含“跳过”的条目不作答，用来触发单条兜底。
+    """
+    arr = []
+    for line in payload["messages"][-1]["content"].splitlines():
+        m = re.match(r"(\d+)\. (.*)", line)
+        if not m or "跳过" in m.group(2):
+            continue
+        res = rule_parse(m.group(2))
+        end = "library" if "图书馆" in m.group(2) else res.end
+        arr.append({"id": int(m.group(1)), "start": res.start, "end": end})
+    return 200, chat_reply("Here you go:\n" + json.dumps(arr, ensure_ascii=False))
+
+class TestSplit(unittest.TestCase):
+    def test_ids_route_back(self):
+        text = '[{"id":2,"start":"home","end":"school"},{"id":1,"start":"school","end":"hospital"}]'
+        out = split_packed_response(text, 3)
+        self.assertEqual(out[0]["end"], "hospital")
+        self.assertEqual(out[1]["end"], "school")
+        self.assertIsNone(out[2])
+
+    def test_positional_and_garbage(self):
+        self.assertEqual(len([x for x in split_packed_response('[{"start":"home","end":"school"}]', 1) if x]), 1)
+        self.assertEqual(split_packed_response("not json", 2), [None, None])
+        self.assertEqual(split_packed_response('[{"id":1,"start":"moon","end":"home"}]', 1), [None])
+
+class TestPackedParser(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.server = StubServer(_packed_reply)
+        cls.client = ParserClient(cls.server.url, max_retries=0)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.client.close()
+        cls.server.close()
+
+    def test_pack_split_and_fallback(self):
+        texts = ["从学校去医院", "从家去市场", "从公司去图书馆", "跳过 从商场去车站", "从医院回家"]
+        singles = []
+        def single(t):
+            singles.append(t)
+            return {"start": "shoppingMall", "end": "railway"}, "single"
+        self.server.calls.clear()
+        packer = PackedParser(client_chat_fn(self.client, "stub"), single, pack_size=3)
+        items = packer.parse_all(texts)
+
+        self.assertEqual(len(self.server.calls), 2)
+        self.assertEqual(singles, ["从公司去图书馆", "跳过 从商场去车站"])
+        self.assertEqual(items[0].obj, {"start": "school", "end": "hospital"})
+        self.assertTrue(items[0].packed)
+        self.assertFalse(items[3].packed)
+        self.assertEqual(items[4].obj, {"start": "hospital", "end": "home"})
+        st = packer.stats()
+        self.assertEqual((st["requests"], st["packed_items"], st["fallback_items"]), (4, 3, 2))
+
+    def test_failed_pack_falls_back_to_singles(self):
+        def boom(_messages, _n):
+            raise RuntimeError("down")
+        packer = PackedParser(boom, lambda t: ({"start": "home", "end": "school"}, "single"), pack_size=4)
+        items = packer.parse_all(["a", "b"])
+        self.assertTrue(all(not it.packed and it.obj for it in items))
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,79 @@
+import os, sys, tempfile, time, unittest
+from unittest.mock import patch
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(__file__))))
+
+from nlp.parse_cache import ParseCache, normalize_utterance
+from nlp import instruction_parser
+
+WL = ["home", "school"]
+
+class TestParseCache(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, "cache.sqlite3")
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_normalize_utterance(self):
+        self.assertEqual(normalize_utterance("  从学校去医院。 "), "从学校去医院")
+        self.assertEqual(normalize_utterance("Go  To Home!"), "go to home")
+
+    def test_memory_then_disk_hits(self):
+        cache = ParseCache(self.path)
+        key = cache.make_key("从学校回家", "m", "v1", 0.7, WL)
+        self.assertIsNone(cache.get(key))
+        cache.put(key, {"start": "school", "end": "home"})
+        self.assertEqual(cache.get(cache.make_key("从学校回家。", "m", "v1", 0.7, WL))["end"], "home")
+
+        reopened = ParseCache(self.path)
+        self.assertEqual(reopened.get(key), {"start": "school", "end": "home"})
+        self.assertEqual(reopened.stats()["disk_hits"], 1)
+        self.assertEqual(cache.stats()["memory_hits"], 1)
+
+    def test_key_depends_on_model_prompt_temperature_whitelist(self):
+        base = ParseCache.make_key("x", "m", "v1", 0.7, WL)
+        self.assertNotEqual(base, ParseCache.make_key("x", "m2", "v1", 0.7, WL))
+        self.assertNotEqual(base, ParseCache.make_key("x", "m", "v2", 0.7, WL))
+        self.assertNotEqual(base, ParseCache.make_key("x", "m", "v1", 0.0, WL))
+        self.assertNotEqual(base, ParseCache.make_key("x", "m", "v1", 0.7, WL + ["market"]))
+
+    def test_ttl_and_lru_eviction(self):
+        cache = ParseCache(self.path, max_memory=2, max_disk=10, ttl_s=0.05)
+        keys = [cache.make_key(str(i), "m", "v", 0, WL) for i in range(20)]
+        for k in keys:
+            cache.put(k, {"i": 1})
+        self.assertLessEqual(cache.stats()["memory_entries"], 2)
+        self.assertLessEqual(cache.stats()["disk_entries"], 10)
+        time.sleep(0.06)
+        self.assertIsNone(cache.get(keys[-1]))
+
+    def test_purge_whitelist(self):
+        cache = ParseCache(self.path)
+        old = cache.make_key("x", "m", "v", 0, WL)
+        cache.put(old, {"start": "home"})
+        cache.purge_whitelist(WL + ["market"])
+        self.assertIsNone(cache.get(old))
+
+    def test_chat_with_deepseek_uses_cache(self):
+        cache = ParseCache(None)
+        reply = {"choices": [{"message": {"content": '{"start": "school", "end": "home"}'}}]}
+        with patch("nlp.instruction_parser.get_parse_cache", return_value=cache), \
+             patch.object(instruction_parser.cloud_client(), "chat_completion", return_value=reply) as mock_call:
+            for _ in range(3):
+                self.assertEqual(instruction_parser.chat_with_deepseek("从学校回家", stream=False)["end"], "home")
+        self.assertEqual(mock_call.call_count, 1)
+        self.assertEqual(cache.stats()["memory_hits"], 2)
+
+    def test_chat_with_deepseek_skips_invalid_answers(self):
+        cache = ParseCache(None)
+        reply = {"choices": [{"message": {"content": '{"start": "current", "end": "library"}'}}]}
+        with patch("nlp.instruction_parser.get_parse_cache", return_value=cache), \
+             patch.object(instruction_parser.cloud_client(), "chat_completion", return_value=reply) as mock_call:
+            for _ in range(2):
+                instruction_parser.chat_with_deepseek("去图书馆", stream=False)
+        self.assertEqual(mock_call.call_count, 2)
+        self.assertEqual(cache.stats()["memory_entries"], 0)
+
+if __name__ == "__main__":
+    unittest.main()
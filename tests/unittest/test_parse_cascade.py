@@ -0,0 +1,58 @@
+import os, sys, unittest
+from unittest.mock import patch
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(__file__))))
+
+from nlp.rule_parser import rule_parse
+from nlp.parse_cascade import ParseCascade, rule_tier, cloud_llm_tier
+
+class TestRuleConfidence(unittest.TestCase):
+    def test_textbook_command_is_confident(self):
+        res = rule_parse("从学校去医院")
+        self.assertEqual((res.start, res.end), ("school", "hospital"))
+        self.assertGreaterEqual(res.confidence, 0.9)
+
+    def test_unknown_place_is_not_confident(self):
+        res = rule_parse("从学校去图书馆")
+        self.assertLess(res.confidence, 0.5)
+
+    def test_nothing_found(self):
+        self.assertEqual(rule_parse("我想出去玩").confidence, 0.0)
+
+class TestParseCascade(unittest.TestCase):
+    def test_rule_hit_skips_llm(self):
+        with patch("nlp.instruction_parser.chat_with_deepseek") as mock_llm:
+            cascade = ParseCascade([("rule", rule_tier), ("cloud", cloud_llm_tier)])
+            out = cascade.parse("从学校去医院")
+            self.assertFalse(mock_llm.called)
+        self.assertEqual((out["start"], out["end"], out["tier"]), ("school", "hospital", "rule"))
+        stats = cascade.stats()
+        self.assertEqual(stats["rule"]["hits"], 1)
+        self.assertEqual(stats["cloud"]["calls"], 0)
+
+    def test_low_confidence_escalates(self):
+        with patch("nlp.instruction_parser.chat_with_deepseek",
+                   return_value={"start": "home", "end": "market"}) as mock_llm:
+            cascade = ParseCascade([("rule", rule_tier), ("cloud", cloud_llm_tier)])
+            out = cascade.parse("回家之后再去买点菜")
+            self.assertTrue(mock_llm.called)
+        self.assertEqual((out["start"], out["end"], out["tier"]), ("home", "market", "cloud"))
+        self.assertEqual(cascade.stats()["cloud"]["hit_rate"], 1.0)
+
+    def test_llm_failure_keeps_best_candidate(self):
+        def boom(_text):
+            raise RuntimeError("offline")
+        cascade = ParseCascade([("rule", rule_tier), ("cloud", boom)])
+        out = cascade.parse("从学校去图书馆")
+        self.assertEqual(out["tier"], "rule")
+        self.assertEqual(cascade.stats()["cloud"]["errors"], 1)
+
+    def test_cloud_failure_sentinel_is_no_answer(self):
+        # chat_with_deepseek 失败时返回 current/home 兜底值，不能当成识别结果
+        with patch("nlp.instruction_parser.chat_with_deepseek",
+                   return_value={"start": "current", "end": "home"}):
+            self.assertEqual(cloud_llm_tier("你好"), (None, None, 0.0))
+            out = ParseCascade([("rule", rule_tier), ("cloud", cloud_llm_tier)]).parse("你好")
+        self.assertEqual((out["start"], out["end"], out["confidence"]), (None, None, 0.0))
+
+if __name__ == "__main__":
+    unittest.main()
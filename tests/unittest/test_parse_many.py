@@ -0,0 +1,53 @@
+import os, sys, time, asyncio, threading, unittest
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(__file__))))
+
+from nlp.instruction_parser import parse_many
+
+class TestParseMany(unittest.TestCase):
+    def test_order_preserved_and_concurrent(self):
+        active = {"now": 0, "peak": 0}
+        lock = threading.Lock()
+
+        def slow_parse(text):
+            with lock:
+                active["now"] += 1
+                active["peak"] = max(active["peak"], active["now"])
+            time.sleep(0.05 if int(text) % 2 else 0.01)
+            with lock:
+                active["now"] -= 1
+            return {"start": text}
+
+        texts = [str(i) for i in range(20)]
+        t0 = time.time()
+        out = asyncio.run(parse_many(texts, parse_fn=slow_parse, concurrency=5))
+        elapsed = time.time() - t0
+
+        self.assertEqual([o["start"] for o in out], texts)
+        self.assertLessEqual(active["peak"], 5)
+        self.assertLess(elapsed, 20 * 0.03)
+
+    def test_timeout_and_errors_are_returned_in_place(self):
+        def parse(text):
+            if text == "slow":
+                time.sleep(0.5)
+            if text == "bad":
+                raise ValueError("bad input")
+            return text
+
+        out = asyncio.run(parse_many(["ok", "slow", "bad"], parse_fn=parse, concurrency=3, timeout=0.1))
+        self.assertEqual(out[0], "ok")
+        self.assertIsInstance(out[1], asyncio.TimeoutError)
+        self.assertIsInstance(out[2], ValueError)
+
+    def test_timeout_does_not_cascade(self):
+        # 超时的请求还在线程里跑：下一条要等它真正结束才开始，且不被算超时
+        def parse(text):
+            time.sleep(0.4 if text == "slow" else 0.01)
+            return text
+
+        out = asyncio.run(parse_many(["slow", "ok1", "ok2"], parse_fn=parse, concurrency=1, timeout=0.2))
+        self.assertIsInstance(out[0], asyncio.TimeoutError)
+        self.assertEqual(out[1:], ["ok1", "ok2"])
+
+if __name__ == "__main__":
+    unittest.main()
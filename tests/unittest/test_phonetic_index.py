@@ -0,0 +1,68 @@
+import os, sys, unittest
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(__file__))))
+
+from nlp import phonetic_index as pi
+from nlp.phonetic_index import PhoneticIndex, BKTree, english_key, levenshtein
+from nlp.instruction_parser import alias_map, normalize_place_name
+from nlp.rule_parser import rule_parse
+
+HAS_PINYIN = pi.lazy_pinyin is not None
+
+class TestPhoneticKeys(unittest.TestCase):
+    def test_english_key_absorbs_spelling(self):
+        self.assertEqual(english_key("hospitel"), english_key("hospital"))
+        self.assertEqual(english_key("skool"), english_key("school"))
+
+    def test_bounded_levenshtein(self):
+        self.assertEqual(levenshtein("kitten", "sitting"), 3)
+        self.assertEqual(levenshtein("kitten", "sitting", bound=1), 2)
+        self.assertEqual(levenshtein(("yi", "yuan"), ("yi", "yan")), 1)
+
+    def test_bktree_query(self):
+        tree = BKTree()
+        for k in ("hsptl", "skl", "mrkt", "prkng"):
+            tree.add(k)
+        self.assertEqual(tree.query("brkng", 1), [(1, "prkng")])
+        self.assertEqual(tree.query("xyz", 1), [])
+
+class TestPhoneticIndex(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.index = PhoneticIndex(alias_map)
+
+    def test_english_lookup(self):
+        self.assertEqual(self.index.lookup("hospitel").canonical, "hospital")
+        self.assertEqual(self.index.lookup("shopping mole").canonical, "shoppingMall")
+        self.assertIsNone(self.index.lookup("mydorm"))
+
+    @unittest.skipUnless(HAS_PINYIN, "pypinyin not installed")
+    def test_chinese_homophones(self):
+        self.assertEqual(self.index.lookup("一院").canonical, "hospital")
+        self.assertEqual(self.index.lookup("听车厂").canonical, "parking")
+        m = self.index.search("我要去半公楼停车厂")
+        self.assertEqual((m.canonical, m.distance), ("officeParking", 0))
+
+    def test_single_char_alias_not_fuzzy(self):
+        self.assertIsNone(self.index.lookup("佳"))
+
+class TestFallbacks(unittest.TestCase):
+    def test_normalize_stays_exact(self):
+        # 模糊匹配只用于规则层的 ASR 文本，LLM 的近似输出不应被改成合法地名
+        self.assertEqual(normalize_place_name("Hospital"), "hospital")
+        self.assertEqual(normalize_place_name("hospitality"), "hospitality")
+        self.assertEqual(normalize_place_name("homme"), "homme")
+        self.assertEqual(normalize_place_name("MyDorm"), "mydorm")
+
+    def test_rule_parser_uses_phonetic_slot_en(self):
+        res = rule_parse("go to hospitel from home")
+        self.assertEqual((res.start, res.end), ("home", "hospital"))
+
+    @unittest.skipUnless(HAS_PINYIN, "pypinyin not installed")
+    def test_rule_parser_uses_phonetic_slot(self):
+        res = rule_parse("从一院去上场")
+        self.assertEqual((res.start, res.end), ("hospital", "shoppingMall"))
+        self.assertLess(res.confidence, rule_parse("从医院去商场").confidence)
+        self.assertGreaterEqual(res.confidence, 0.8)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,88 @@
+import os, sys, math, unittest
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(__file__))))
+
+import numpy as np
+
+from control.radar_processing import (RadarConfig, RadarProcessor, decimate, polar_to_xyz,
+                                      radar_to_numpy, sensor_to_world, voxel_downsample)
+
+class _FakeMeasurement:
+    """模拟 carla.RadarMeasurement：raw_data 为 float32 [velocity, azimuth, altitude, depth]。"""
+    def __init__(self, rows, frame=1, timestamp=0.05):
+        self.raw_data = memoryview(np.asarray(rows, dtype=np.float32).tobytes())
+        self.frame, self.timestamp = frame, timestamp
+
+def _scalar_xyz(vel, azi, alt, depth):
+    # 原来逐点 math.cos/sin 的写法，作为对照
+    return (depth * math.cos(alt) * math.cos(azi), depth * math.cos(alt) * math.sin(azi), depth * math.sin(alt), vel)
+
+class TestRadarProcessing(unittest.TestCase):
+    def setUp(self):
+        rng = np.random.default_rng(0)
+        n = 500
+        self.rows = np.stack([rng.uniform(-5, 5, n), rng.uniform(-0.4, 0.4, n),
+                              rng.uniform(-0.17, 0.17, n), rng.uniform(1, 80, n)], axis=1).astype(np.float32)
+
+    def test_vectorized_matches_scalar(self):
+        det = radar_to_numpy(_FakeMeasurement(self.rows).raw_data)
+        self.assertEqual(det.shape, (500, 4))
+        got = polar_to_xyz(det)
+        want = np.array([_scalar_xyz(*r) for r in det.tolist()])
+        np.testing.assert_allclose(got, want, rtol=1e-5, atol=1e-4)
+
+    def test_empty_frame(self):
+        proc = RadarProcessor(RadarConfig(voxel_size=0.5))
+        frame = proc.process(_FakeMeasurement(np.zeros((0, 4))))
+        self.assertEqual(frame.points.shape, (0, 4))
+        self.assertEqual(len(proc.draw_points(frame)), 0)
+
+    def test_voxel_downsample_one_point_per_voxel(self):
+        pts = np.array([[0.1, 0.1, 0, 1], [0.2, 0.3, 0, 2], [1.1, 0, 0, 3], [-0.1, 0, 0, 4]], dtype=np.float32)
+        out = voxel_downsample(pts, 1.0)
+        self.assertEqual(out[:, 3].tolist(), [1, 3, 4])
+        self.assertIs(voxel_downsample(pts, 0.0), pts)
+
+    def test_decimate_caps_and_spans(self):
+        pts = np.arange(1000, dtype=np.float32).reshape(-1, 1)
+        out = decimate(pts, 200)
+        self.assertLessEqual(len(out), 200)
+        self.assertGreater(out[-1, 0], 900)
+        self.assertEqual(len(decimate(pts[:50], 200)), 50)
+
+    def test_sensor_to_world(self):
+        # 车头朝 +y（yaw=90°）：传感器前方 x 映射到世界 +y
+        pts = np.array([[2, 0, 0, 0], [0, 1, 0, 0], [0, 0, 3, 0]], dtype=np.float32)
+        out = sensor_to_world(pts, (10, 20, 0), (0, 1, 0), (-1, 0, 0), (0, 0, 1))
+        np.testing.assert_allclose(out, [[10, 22, 0], [9, 20, 0], [10, 20, 3]])
+
+    def test_processor_latest_and_draw_every(self):
+        proc = RadarProcessor(RadarConfig(draw_every=3, max_draw=50))
+        self.assertIsNone(proc.latest())
+        draws = []
+        for i in range(6):
+            frame = proc.process(_FakeMeasurement(self.rows, frame=i))
+            if proc.should_draw():
+                draws.append(len(proc.draw_points(frame)))
+        self.assertEqual(len(draws), 2)
+        self.assertTrue(all(n <= 50 for n in draws))
+        latest = proc.latest()
+        self.assertEqual((latest.frame, latest.points.shape), (5, (500, 4)))
+        self.assertEqual(proc.stats(), {"frames": 6, "detections": 3000, "points": 500})
+
+    def test_config_from_env(self):
+        env = {"RADAR_VOXEL": "0.5", "RADAR_DRAW": "0", "RADAR_MAX_DRAW": "64"}
+        old = {k: os.environ.get(k) for k in env}
+        os.environ.update(env)
+        try:
+            cfg = RadarConfig.from_env()
+        finally:
+            for k, v in old.items():
+                if v is None:
+                    os.environ.pop(k)
+                else:
+                    os.environ[k] = v
+        self.assertEqual((cfg.voxel_size, cfg.draw, cfg.max_draw), (0.5, False, 64))
+        self.assertFalse(RadarProcessor(cfg).should_draw())
+
+if __name__ == "__main__":
+    unittest.main()
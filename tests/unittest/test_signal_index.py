@@ -0,0 +1,99 @@
+import os, sys, types, unittest
+from unittest.mock import patch
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(__file__))))
+
+import numpy as np
+
+import control.signal_index as signal_index
+from control.signal_index import Signal, SignalIndex, get_signal_index, make_signals, signal_kind
+
+class _Loc:
+    def __init__(self, x, y, z=0.0):
+        self.x, self.y, self.z = x, y, z
+
+    def distance(self, other):
+        return float(np.linalg.norm([self.x - other.x, self.y - other.y, self.z - other.z]))
+
+class _Landmark:
+    def __init__(self, name, type_code, value, x, y, z=0.0):
+        self.name, self.type, self.value = name, type_code, value
+        self.transform = types.SimpleNamespace(location=_Loc(x, y, z))
+
+class _Map:
+    def __init__(self, name, landmarks):
+        self.name, self.landmarks, self.calls = name, landmarks, 0
+
+    def get_all_landmarks(self):
+        self.calls += 1
+        return self.landmarks
+
+def _signals(n, seed=0):
+    rng = np.random.default_rng(seed)
+    xy = rng.uniform(-500, 500, (n, 2))
+    return [Signal(i, f"s{i}", "stop", None, float(x), float(y), 0.0, "custom") for i, (x, y) in enumerate(xy)]
+
+class TestSignalIndex(unittest.TestCase):
+    def test_query_matches_brute_force(self):
+        sigs = _signals(2000)
+        index = SignalIndex(sigs)
+        rng = np.random.default_rng(1)
+        for x, y in rng.uniform(-520, 520, (200, 2)):
+            got = [(s.id, round(d, 6)) for s, d in index.query(x, y, 0.0, 25.0)]
+            want = sorted((s.id, round(_Loc(s.x, s.y).distance(_Loc(x, y)), 6)) for s in sigs
+                          if _Loc(s.x, s.y).distance(_Loc(x, y)) <= 25.0)
+            self.assertEqual(sorted(got), want)
+            self.assertEqual([d for _, d in got], sorted(d for _, d in got))
+
+    def test_query_empty(self):
+        self.assertEqual(SignalIndex([]).query(0, 0, 0), [])
+        self.assertEqual(SignalIndex(_signals(10)).query(9999, 9999, 0), [])
+
+    def test_corridor_keeps_only_signals_near_route(self):
+        sigs = [Signal(0, "near", "stop", None, 50.0, 5.0, 0.0, "custom"),
+                Signal(1, "far", "stop", None, 50.0, 40.0, 0.0, "custom"),
+                Signal(2, "corner", "stop", None, 105.0, 60.0, 0.0, "custom"),
+                Signal(3, "past_end", "stop", None, 100.0, 130.0, 0.0, "custom")]
+        route = [(0, 0, 0), (100, 0, 0), (100, 100, 0)]
+        corridor = SignalIndex(sigs).corridor(route, width=12.0)
+        self.assertEqual([s.id for s in corridor.signals], [0, 2])
+        self.assertEqual(corridor.query(52, 0, 0)[0][0].name, "near")
+
+    def test_corridor_accepts_trace_route(self):
+        wp = lambda x, y: (types.SimpleNamespace(transform=types.SimpleNamespace(location=_Loc(x, y))), None)
+        corridor = SignalIndex(_signals(500)).corridor([wp(-500, 0), wp(500, 0)], width=10.0)
+        self.assertTrue(corridor.signals)
+        self.assertTrue(all(abs(s.y) <= 10.0 for s in corridor.signals))
+
+    def test_make_signals(self):
+        sigs = make_signals([("Sign_Stop", "206", 0.0, 1, 2, 3), ("x", "274", 50.0, 4, 5, 6), ("tree", "", 0, 0, 0, 0)],
+                            [{"name": "SpeedLimit30", "location": _Loc(7, 8, 0.5)}])
+        self.assertEqual([(s.id, s.kind, s.value, s.source) for s in sigs],
+                         [(0, "stop", None, "opendrive"), (1, "speed", 50.0, "opendrive"),
+                          (2, "other", None, "opendrive"), (3, "speed", 30.0, "custom")])
+        self.assertEqual(signal_kind("STOP"), "stop")
+
+    def test_get_signal_index_builds_once_per_map(self):
+        carla_map = _Map("Town10HD", [_Landmark("Stop", "206", 0.0, 10, 0)])
+        custom = [{"name": "Stop", "location": _Loc(123, 45, 0.5)}]
+        fake_carla = types.ModuleType("carla")
+        with patch.dict(sys.modules, {"carla": fake_carla}), patch.dict(signal_index._indexes, clear=True):
+            sys.modules.pop("utils.signal_location", None)
+            a = get_signal_index(carla_map, custom, include_map=True)
+            b = get_signal_index(carla_map, custom, include_map=True)
+            sys.modules.pop("utils.signal_location", None)
+        self.assertIs(a, b)
+        self.assertEqual(carla_map.calls, 1)
+        self.assertEqual([s.source for s in a.signals], ["opendrive", "custom"])
+        self.assertEqual(a.query(10, 1, 0)[0][0].kind, "stop")
+
+    def test_map_signals_are_opt_in(self):
+        # 默认只认自定义标志，和原来 run_navigation 的行为一致
+        carla_map = _Map("Town01", [_Landmark("Stop", "206", 0.0, 10, 0)])
+        with patch.dict(signal_index._indexes, clear=True):
+            index = get_signal_index(carla_map, [{"name": "SpeedLimit30", "location": _Loc(0, 0)}])
+        self.assertEqual(carla_map.calls, 0)
+        self.assertEqual([(s.source, s.kind, s.value) for s in index.signals], [("custom", "speed", 30.0)])
+        self.assertEqual(index.query(10, 0, 0, 8.0), [])
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,63 @@
+import os, sys, time, unittest
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(__file__))))
+
+from nlp.json_stream import JsonObjectScanner
+from nlp.llm_client import ParserClient
+from tests.unittest.stub_server import StubServer
+
+class TestJsonObjectScanner(unittest.TestCase):
+    def test_object_split_across_chunks(self):
+        sc = JsonObjectScanner()
+        out = []
+        for chunk in ['好的：{"sta', 'rt": "school", ', '"end": "ho', 'me"} 以上是结果']:
+            out += sc.feed(chunk)
+        self.assertEqual(out, [{"start": "school", "end": "home"}])
+
+    def test_braces_inside_strings_and_single_quotes(self):
+        sc = JsonObjectScanner()
+        self.assertEqual(sc.feed('{"start": "a}b", "end": "c"}'), [{"start": "a}b", "end": "c"}])
+        self.assertEqual(sc.feed("{'start': 'home', 'end': 'school'}"), [{"start": "home", "end": "school"}])
+
+    def test_invalid_fragment_is_skipped(self):
+        sc = JsonObjectScanner()
+        self.assertEqual(sc.feed('{start: x} {"start": "home", "end": "market"}'),
+                         [{"start": "home", "end": "market"}])
+
+PIECES = ['{"start": "school",', ' "end": "home"}', "\n解释", "说明" * 10]
+DELAY = 0.2
+
+def _sse_reply(_payload):
+    # JSON 在前两块里就完整了，之后的“解释”每块都要等 DELAY
+    for i, piece in enumerate(PIECES):
+        if i >= 2:
+            time.sleep(DELAY)
+        yield piece
+
+class TestStreamChat(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.server = StubServer(_sse_reply)
+        cls.client = ParserClient(cls.server.url)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.close()
+
+    def test_early_exit_on_valid_json(self):
+        res = self.client.stream_chat({"model": "m", "messages": []},
+                                      accept=lambda o: o.get("start") == "school")
+        self.assertEqual(res.obj, {"start": "school", "end": "home"})
+        self.assertTrue(res.early_exit)
+        self.assertLess(res.total_s, DELAY)
+        self.assertIsNotNone(res.ttft_s)
+        self.assertLessEqual(res.ttft_s, res.json_s)
+        self.assertEqual(self.client.timings[-1]["json_s"], res.json_s)
+
+    def test_rejected_json_reads_to_end(self):
+        res = self.client.stream_chat({"model": "m", "messages": []}, accept=lambda o: False)
+        self.assertIsNone(res.obj)
+        self.assertFalse(res.early_exit)
+        self.assertIn("解释", res.text)
+
+if __name__ == "__main__":
+    unittest.main()
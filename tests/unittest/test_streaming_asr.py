@@ -0,0 +1,80 @@
+import os, sys, threading, time, unittest
+import speech_recognition as sr
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(__file__))))
+
+from nlp.audio_capture import Chunk
+from nlp.speech_recognizer import AsrResult
+from nlp.streaming_asr import StreamingTranscriber
+
+CHUNK_BYTES = 1600 * 2
+
+class _FakeCapture:
+    """按固定节奏吐块：loud 个有声块 + quiet 个静音块，然后返回整段 AudioData。"""
+    sample_rate, threshold = 16000, 100.0
+
+    def __init__(self, loud=10, quiet=6, dt=0.03):
+        self.loud, self.quiet, self.dt = loud, quiet, dt
+
+    def listen(self, timeout=None, phrase_time_limit=None, on_chunk=None):
+        data = []
+        for i in range(self.loud + self.quiet):
+            time.sleep(self.dt)
+            c = Chunk(i + 1, b"\0" * CHUNK_BYTES, 1000.0 if i < self.loud else 10.0, time.perf_counter())
+            data.append(c.data)
+            on_chunk(c)
+        return sr.AudioData(b"".join(data), self.sample_rate, 2)
+
+class _PrefixBackend:
+    """识别结果随音频变长逐步补全，模拟说到一半的 partial。"""
+    def __init__(self, words=("从学校", "从学校去", "从学校去医院"), step=4):
+        self.words, self.step = words, step
+        self.final_calls = 0
+
+    def transcribe(self, pcm, sample_rate=16000):
+        if isinstance(pcm, sr.AudioData):
+            self.final_calls += 1
+            pcm = pcm.frame_data
+        n = len(pcm) // CHUNK_BYTES
+        text = self.words[min(n // self.step, len(self.words) - 1)]
+        return AsrResult(text, "fake", n * 0.1, 0.0, 0.0)
+
+class TestStreamingTranscriber(unittest.TestCase):
+    def _parser(self):
+        calls = []
+        lock = threading.Lock()
+        def parse(text):
+            with lock:
+                calls.append(text)
+            return {"start": "school", "end": "hospital" if "医院" in text else None, "tier": "rule"}
+        return parse, calls
+
+    def test_speculative_parse_ready_at_end_of_speech(self):
+        parse, calls = self._parser()
+        backend = _PrefixBackend()
+        st = StreamingTranscriber(_FakeCapture(), backend, parse, interval_s=0.05)
+        res = st.run()
+        self.assertEqual(res.text, "从学校去医院")
+        self.assertEqual(res.parsed["end"], "hospital")
+        self.assertTrue(res.speculative)
+        self.assertEqual(backend.final_calls, 0)
+        self.assertEqual(calls.count("从学校去医院"), 1)
+        self.assertTrue(any(p.stable for p in res.partials))
+        self.assertLessEqual(res.speech_end_t, res.final_text_t)
+        self.assertLessEqual(res.final_text_t, res.final_parse_t)
+        self.assertIsNotNone(res.final_partial_t)
+        self.assertLess(res.intent_gap_s, 0.5)
+
+    def test_falls_back_to_final_transcription(self):
+        parse, calls = self._parser()
+        backend = _PrefixBackend()
+        # partial 间隔比整句还长：没有 partial，走完整识别 + 解析
+        st = StreamingTranscriber(_FakeCapture(loud=4, quiet=2, dt=0.01), backend, parse, interval_s=5)
+        res = st.run()
+        self.assertFalse(res.speculative)
+        self.assertEqual(res.partials, [])
+        self.assertIsNone(res.final_partial_t)
+        self.assertEqual(backend.final_calls, 1)
+        self.assertEqual(calls, [res.text])
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,79 @@
+import os, sys, asyncio, tempfile, threading, unittest
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(__file__))))
+
+from nlp.tts_cache import TtsCache, cache_key, expand_phrases
+
+class _FakeSynth:
+    """假的 edge-tts：返回 size 字节，可以设成“断网”。"""
+    def __init__(self, size=100):
+        self.size = size
+        self.calls = []
+        self.offline = False
+        self.lock = threading.Lock()
+
+    async def __call__(self, text, voice, rate):
+        with self.lock:
+            self.calls.append(text)
+        if self.offline:
+            raise ConnectionError("tts unreachable")
+        await asyncio.sleep(0.01)
+        return b"\xff" * self.size
+
+class TestTtsCache(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.synth = _FakeSynth()
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_key_depends_on_voice_and_rate(self):
+        self.assertNotEqual(cache_key("你好"), cache_key("你好", voice="en-US-AriaNeural"))
+        self.assertNotEqual(cache_key("你好"), cache_key("你好", rate="+20%"))
+
+    def test_hit_after_first_render_and_offline(self):
+        cache = TtsCache(self.tmp.name, max_bytes=10_000, synth=self.synth)
+        p1 = cache.render("开始导航")
+        self.synth.offline = True
+        p2 = cache.render("开始导航")
+        self.assertEqual(p1, p2)
+        self.assertEqual(self.synth.calls, ["开始导航"])
+        with self.assertRaises(ConnectionError):
+            cache.render("没缓存过的句子")
+        st = cache.stats()
+        self.assertEqual((st["entries"], st["hits"]), (1, 1))
+
+    def test_lru_eviction_and_reload(self):
+        cache = TtsCache(self.tmp.name, max_bytes=250, synth=self.synth)
+        cache.render("a")
+        cache.render("b")
+        cache.render("a")          # a 变成最近使用
+        cache.render("c")          # 超过 250 字节，淘汰最久未用的 b
+        self.assertIsNotNone(cache.get("a"))
+        self.assertIsNone(cache.get("b"))
+        self.assertEqual(len(os.listdir(self.tmp.name)), 2)
+        reopened = TtsCache(self.tmp.name, max_bytes=250, synth=self.synth)
+        self.assertEqual(reopened.stats()["bytes"], 200)
+
+    def test_prerender_pairs_in_background(self):
+        phrases = expand_phrases(["从 {start} 到 {end}", "请重试", "请重试"], ["school", "home", "market"])
+        self.assertEqual(len(phrases), 7)
+        cache = TtsCache(self.tmp.name, max_bytes=10_000, synth=self.synth)
+        t = cache.prerender(phrases)
+        # 预渲染进行中同时请求同一句，不应重复合成
+        cache.render("从 school 到 home")
+        t.join(5)
+        self.assertEqual(sorted(self.synth.calls), sorted(phrases))
+        self.synth.offline = True
+        self.assertTrue(all(cache.get(p) for p in phrases))
+
+    def test_prerender_skipped_when_gate_fails(self):
+        async def offline():
+            return False
+        cache = TtsCache(self.tmp.name, max_bytes=10_000, synth=self.synth)
+        cache.prerender(["请重试"], background=False, gate=offline)
+        self.assertEqual(self.synth.calls, [])
+        self.assertIsNone(cache.get("请重试"))
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,118 @@
+import os, sys, asyncio, tempfile, time, unittest
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(__file__))))
+
+from nlp.tts_cache import TtsCache
+from nlp.tts_engines import EngineSelector, TtsEngine
+from nlp.tts_service import TtsService
+
+class _FakeEngine(TtsEngine):
+    def __init__(self, name, first_delay, online, fail=False, healthy=True):
+        self.name, self.first_delay, self.online, self.fail, self.ok = name, first_delay, online, fail, healthy
+        self.calls = 0
+
+    async def stream(self, text, voice, rate):
+        self.calls += 1
+        await asyncio.sleep(self.first_delay)
+        if self.fail:
+            raise ConnectionError(f"{self.name} unreachable")
+        yield f"{self.name}:{text}".encode()
+        yield b"|tail"
+
+    async def health(self):
+        return self.ok
+
+async def _collect(stream):
+    t0 = time.perf_counter()
+    first_t, out = None, []
+    async for chunk in stream:
+        first_t = first_t or time.perf_counter() - t0
+        out.append(chunk)
+    return b"".join(out), first_t
+
+class TestEngineSelector(unittest.TestCase):
+    def test_prefers_online_when_fast(self):
+        edge, local = _FakeEngine("edge", 0.01, True), _FakeEngine("offline", 0.0, False)
+        sel = EngineSelector([edge, local], budget_s=0.5)
+        data, _ = asyncio.run(_collect(sel.stream("你好")))
+        self.assertEqual(data, b"edge:\xe4\xbd\xa0\xe5\xa5\xbd|tail")
+        self.assertEqual(sel.stats()["edge"]["served"], 1)
+
+    def test_budget_falls_back_and_skips_unhealthy(self):
+        edge, local = _FakeEngine("edge", 2.0, True), _FakeEngine("offline", 0.02, False)
+        sel = EngineSelector([edge, local], budget_s=0.4)
+        stream = sel.stream("开始导航")
+        data, first_t = asyncio.run(_collect(stream))
+        self.assertTrue(data.startswith(b"offline:"))
+        self.assertLess(first_t, 0.4)
+        self.assertFalse(stream.cacheable)
+        self.assertFalse(sel.stats()["edge"]["healthy"])
+        # edge 已标记不健康：下一句直接走离线，不再等预算
+        _, first_t = asyncio.run(_collect(sel.stream("请重试")))
+        self.assertLess(first_t, 0.1)
+        self.assertEqual(edge.calls, 1)
+
+    def test_error_falls_back_and_probe_recovers(self):
+        edge, local = _FakeEngine("edge", 0.0, True, fail=True), _FakeEngine("offline", 0.0, False)
+        sel = EngineSelector([edge, local], budget_s=0.5, health_ttl_s=0.0)
+        data, _ = asyncio.run(_collect(sel.stream("a")))
+        self.assertTrue(data.startswith(b"offline:"))
+        edge.fail = False
+
+        async def twice():
+            await _collect(sel.stream("b"))        # 这一句触发后台探活
+            await asyncio.sleep(0.01)
+            return await _collect(sel.stream("c"))
+        data, _ = asyncio.run(twice())
+        self.assertTrue(data.startswith(b"edge:"))
+
+    def test_all_engines_fail(self):
+        sel = EngineSelector([_FakeEngine("edge", 0.0, True, fail=True)], budget_s=0.2)
+        with self.assertRaises(RuntimeError):
+            asyncio.run(_collect(sel.stream("x")))
+
+class TestServiceWithSelector(unittest.TestCase):
+    def test_offline_audio_not_cached(self):
+        class Player:
+            streaming = True
+            async def start(self): pass
+            async def write(self, data): pass
+            async def finish(self): pass
+            async def kill(self): pass
+
+        with tempfile.TemporaryDirectory() as d:
+            cache = TtsCache(d, synth=None)
+            sel = EngineSelector([_FakeEngine("edge", 0.0, True, fail=True), _FakeEngine("offline", 0.0, False)])
+            svc = TtsService(sel.stream, Player, cache)
+            try:
+                job = svc.say("断网提示")
+                self.assertTrue(job.wait(2))
+            finally:
+                svc.stop()
+            self.assertEqual((job.status, job.engine), ("done", "offline"))
+            self.assertIsNone(cache.get("断网提示"))
+
+    def test_start_checks_engine_health(self):
+        class Player:
+            streaming = True
+            async def start(self): pass
+            async def write(self, data): pass
+            async def finish(self): pass
+            async def kill(self): pass
+
+        with tempfile.TemporaryDirectory() as d:
+            sel = EngineSelector([_FakeEngine("edge", 0.0, True, healthy=False), _FakeEngine("offline", 0.0, False)])
+            svc = TtsService(sel.stream, Player, TtsCache(d, synth=None)).start()
+            try:
+                for _ in range(50):
+                    if not sel.stats()["edge"]["healthy"]:
+                        break
+                    time.sleep(0.01)
+                self.assertFalse(sel.stats()["edge"]["healthy"])
+                job = svc.say("你好")
+                self.assertTrue(job.wait(2))
+                self.assertEqual(job.engine, "offline")
+            finally:
+                svc.stop()
+
+if __name__ == "__main__":
+    unittest.main()
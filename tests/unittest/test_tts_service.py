@@ -0,0 +1,122 @@
+import os, sys, asyncio, tempfile, threading, time, unittest
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(__file__))))
+
+from nlp.tts_cache import TtsCache
+from nlp.tts_service import PRIORITY_ALERT, FilePlayer, TtsService
+
+class _FakePlayer:
+    """记录写入的块；finish 时按 play_s 模拟播放时长。"""
+    streaming = True
+    played = []
+    threads = set()
+
+    def __init__(self, play_s=0.02):
+        self.play_s = play_s
+        self.chunks = []
+        self.killed = False
+
+    async def start(self):
+        type(self).threads.add(threading.current_thread().name)
+
+    async def write(self, data):
+        self.chunks.append(data)
+
+    async def finish(self):
+        await asyncio.sleep(self.play_s)
+        type(self).played.append(b"".join(self.chunks))
+
+    async def kill(self):
+        self.killed = True
+
+class TestTtsService(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.synth_calls = []
+        _FakePlayer.played, _FakePlayer.threads = [], set()
+
+        async def synth(text, voice, rate):
+            self.synth_calls.append(text)
+            for i in range(3):
+                await asyncio.sleep(0.03)
+                yield f"{text}|{i};".encode()
+
+        self.play_s = 0.02
+        self.cache = TtsCache(self.tmp.name, synth=None)
+        self.svc = TtsService(synth, lambda: _FakePlayer(self.play_s), self.cache)
+
+    def tearDown(self):
+        self.svc.stop()
+        self.tmp.cleanup()
+
+    def test_streams_then_plays_from_cache(self):
+        job = self.svc.say("开始导航")
+        self.assertTrue(job.wait(2))
+        self.assertEqual(job.status, "done")
+        self.assertFalse(job.cached)
+        # 第一块到达就开始播，不等三块都合成完
+        self.assertLess(job.ttfa_s, 0.08)
+        self.assertEqual(_FakePlayer.played[-1], "开始导航|0;开始导航|1;开始导航|2;".encode())
+
+        again = self.svc.say("开始导航")
+        self.assertTrue(again.wait(2))
+        self.assertTrue(again.cached)
+        self.assertEqual(self.synth_calls, ["开始导航"])
+        self.assertEqual(_FakePlayer.threads, {"tts-service"})
+        self.assertEqual(self.svc.stats()["done"], 2)
+
+    def test_new_prompt_supersedes_stale(self):
+        self.play_s = 0.5
+        first = self.svc.say("第一句")
+        queued = self.svc.say("第二句", supersede=False)
+        latest = self.svc.say("第三句")
+        self.assertTrue(latest.wait(3))
+        self.assertEqual((first.status, queued.status, latest.status), ("cancelled", "cancelled", "done"))
+        self.assertIsNone(self.cache.get("第一句"))
+        self.assertEqual(len(_FakePlayer.played), 1)
+
+    def test_priority_order(self):
+        self.play_s = 0.1
+        blocker = self.svc.say("占着播放器")
+        normal = self.svc.say("普通提示", supersede=False)
+        alert = self.svc.say("紧急提示", priority=PRIORITY_ALERT, supersede=False)
+        self.assertTrue(normal.wait(3))
+        self.assertEqual([blocker.status, alert.status], ["done", "done"])
+        self.assertLess(alert.first_audio_t, normal.first_audio_t)
+
+class _SleepPlayer(FilePlayer):
+    """用一个睡 5 秒的子进程代替 playsound。"""
+    cmd = [sys.executable, "-c", "import time; time.sleep(5)"]
+    created = []
+
+    def __init__(self):
+        super().__init__()
+        type(self).created.append(self)
+
+class TestFilePlayerSupersede(unittest.TestCase):
+    def test_supersede_kills_fallback_playback(self):
+        async def synth(text, voice, rate):
+            yield text.encode()
+
+        with tempfile.TemporaryDirectory() as d:
+            _SleepPlayer.created = []
+            svc = TtsService(synth, _SleepPlayer, TtsCache(d, synth=None))
+            try:
+                first = svc.say("第一句")
+                deadline = time.time() + 3
+                while not (_SleepPlayer.created and _SleepPlayer.created[0].proc) and time.time() < deadline:
+                    time.sleep(0.01)
+                t0 = time.perf_counter()
+                second = svc.say("第二句")
+                self.assertTrue(first.wait(2))
+                self.assertLess(time.perf_counter() - t0, 2)
+                self.assertEqual(first.status, "cancelled")
+                # 被顶替的播放子进程已经结束，不会和下一句叠在一起
+                self.assertIsNotNone(_SleepPlayer.created[0].proc.returncode)
+            finally:
+                svc.stop()
+                for p in _SleepPlayer.created:
+                    if p.proc and p.proc.returncode is None:
+                        p.proc.kill()
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,4 +1,4 @@
-import os, sys, unittest, time
+import os, sys, unittest
 sys.path.append(os.path.dirname(os.path.dirname(__file__)))
 
 # Qt 相关（headless 环境建议设置 QT_QPA_PLATFORM=offscreen）
@@ -17,17 +17,12 @@ class TestTTSWrapper(unittest.TestCase):
         if QApplication.instance() is None:
             app = QApplication([])
 
-    @patch("ui.ui_window.asyncio.run")
-    @patch("ui.ui_window.speak")
-    def test_tts_runs_in_thread(self, mock_speak, mock_asyncio_run):
+    @patch("ui.ui_window.get_tts_service")
+    def test_tts_queues_on_service(self, mock_service):
         dlg = VoiceInputDialog()
-        dlg.tts("测试播报")  # 内部应起新线程并调用 asyncio.run(speak(...))
+        dlg.tts("测试播报")  # 不再每句起线程，而是交给常驻播报服务排队
 
-        # 给线程一点时间启动
-        time.sleep(0.1)
-
-        self.assertTrue(mock_speak.called)
-        self.assertTrue(mock_asyncio_run.called)
+        mock_service.return_value.say.assert_called_once_with("测试播报", voice="zh-CN-XiaoxiaoNeural")
 
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,65 @@
+import os, sys, threading, time, unittest
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(__file__))))
+
+t0 = time.perf_counter()
+from nlp import speech_recognizer
+IMPORT_S = time.perf_counter() - t0
+from nlp.speech_recognizer import WhisperModelHolder
+
+class _SlowLoader:
+    """假的 whisper.load_model：计数并故意慢一点，放大并发竞争。"""
+    def __init__(self, delay=0.05):
+        self.delay = delay
+        self.calls = []
+
+    def __call__(self, name, device=None, threads=0):
+        self.calls.append((name, device, threads))
+        time.sleep(self.delay)
+        return object()
+
+class TestWhisperModelHolder(unittest.TestCase):
+    def test_import_does_not_load(self):
+        self.assertLess(IMPORT_S, 1.0)
+        self.assertNotIn("whisper", sys.modules)
+        self.assertFalse(speech_recognizer.whisper_model.is_loaded)
+
+    def test_concurrent_get_loads_once(self):
+        loader = _SlowLoader()
+        holder = WhisperModelHolder("tiny", "cpu", 2, loader=loader)
+        self.assertFalse(holder.is_loaded)
+        got = []
+        threads = [threading.Thread(target=lambda: got.append(holder.get())) for _ in range(8)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        self.assertEqual(loader.calls, [("tiny", "cpu", 2)])
+        self.assertEqual(len({id(m) for m in got}), 1)
+        self.assertGreaterEqual(holder.load_time_s, 0.05)
+
+    def test_background_warm_up(self):
+        loader = _SlowLoader(delay=0.2)
+        holder = WhisperModelHolder(loader=loader)
+        t0 = time.perf_counter()
+        t = holder.warm_up()
+        self.assertLess(time.perf_counter() - t0, 0.1)
+        self.assertTrue(holder.wait(timeout=2))
+        t.join()
+        holder.get()
+        self.assertEqual(len(loader.calls), 1)
+
+    def test_failed_load_can_retry(self):
+        attempts = []
+        def flaky(name, device=None, threads=0):
+            attempts.append(name)
+            if len(attempts) == 1:
+                raise RuntimeError("no weights")
+            return "model"
+        holder = WhisperModelHolder(loader=flaky)
+        holder.warm_up(background=False)
+        self.assertFalse(holder.is_loaded)
+        self.assertEqual(holder.get(), "model")
+        self.assertEqual(len(attempts), 2)
+
+if __name__ == "__main__":
+    unittest.main()
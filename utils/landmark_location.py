@@ -5,25 +5,13 @@ sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 import carla
 from utils.connect_to_carla import connect_to_carla
+from nlp.landmark_catalog import get_catalog
 
 
 def define_landmarks(world):
 
-    map = world.get_map()
-    spawn_points = map.get_spawn_points()
-
-    landmarks = {
-        "home": spawn_points[109],
-        "cottageArea": spawn_points[72],
-        "hospital": spawn_points[235],
-        "school": spawn_points[51],
-        "market": spawn_points[283],
-        "officeParking": spawn_points[219],
-        "shoppingMall": spawn_points[27],
-        "office": spawn_points[258],
-        "parking": spawn_points[21],
-        "railway": spawn_points[138],
-    }
+    # spawn 下标统一写在 nlp/landmarks.json；同一个 world 只取一次 spawn 点
+    landmarks = get_catalog().transforms(world)
 
     for name, transform in landmarks.items():
         loc = transform.location
@@ -17,6 +17,15 @@ import carla
 
 #     print(f"Total traffic signs found: {len(signs)}")
 
+def get_map_signals(carla_map):
+    """OpenDRIVE 信号/标志 -> [(name, type, value, x, y, z)]，给 control.signal_index 建索引用。"""
+    signals = []
+    for lm in carla_map.get_all_landmarks():
+        loc = lm.transform.location
+        signals.append((lm.name, lm.type, lm.value, loc.x, loc.y, loc.z))
+    return signals
+
+
 def draw_opendrive_signals(world):
     carla_map = world.get_map()
     landmarks = carla_map.get_all_landmarks()